@@ -29,7 +29,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Метрики — самым первым, чтобы время ответа включало все остальные middleware
+    'main.metrics.MetricsMiddleware',
+    # Журнал медленных запросов: имя view и запись в базу после ответа
+    'main.slowlog.SlowQueryMiddleware',
+    # Сжатие — первым после метрик, чтобы видеть итоговое тело ответа
+    'main.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Статика и медиа без DEBUG (до сессий: файлам они не нужны)
+    'main.staticserve.StaticMediaMiddleware',
+    # Анонимные GET информационных страниц отдаются до загрузки сессии
+    'main.prerender.PrerenderedPageMiddleware',
+    # Чтение с основной базы до конца запроса (и несколько секунд после) при записи
+    'main.routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -69,6 +81,60 @@ DATABASES = {
     }
 }
 
+# Общий для всех процессов кеш: товары корзины, версии каталога, расписание экскурсий.
+# Сигналы сбрасывают записи в нем при правке, поэтому кеш в памяти процесса (LocMemCache)
+# не годится: остальные воркеры видели бы старые цены. HIVE_REDIS_URL — Redis (пакет redis),
+# иначе файловый кеш, общий для процессов одной машины
+if os.environ.get('HIVE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['HIVE_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'var' / 'cache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Реплики для чтения каталога и отчетов (см. main.routers.ReplicaRouter)
+DATABASE_ROUTERS = ['main.routers.ReplicaRouter']
+DATABASE_REPLICAS = []
+
+# Локально реплику изображает копия SQLite, которую обновляет
+# python manage.py refresh_sqlite_replica --interval 30
+SQLITE_REPLICA_PATH = BASE_DIR / 'db.replica.sqlite3'
+if os.environ.get('HIVE_SQLITE_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{SQLITE_REPLICA_PATH}?mode=ro',
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+
+# Прогрев шаблонов, URL, ORM и кешей каталога при загрузке WSGI-приложения (main.warmup)
+WARMUP_ON_STARTUP = bool(os.environ.get('HIVE_WARMUP'))
+
+# Метрики Prometheus на /metrics (main.metrics). При нескольких процессах-воркерах
+# нужен общий каталог: каждый процесс пишет туда свои значения, /metrics их суммирует.
+# Каталог очищают при развертывании, чтобы не копились файлы завершившихся процессов
+METRICS_DIR = os.environ.get('HIVE_METRICS_DIR') or None
+# Адреса без токена — только если приложение доступно без прокси (за nginx все запросы идут с 127.0.0.1)
+METRICS_ALLOWED_IPS = []
+METRICS_TOKEN = os.environ.get('HIVE_METRICS_TOKEN') or None
+
+# Журнал медленных запросов (main.slowlog, Админка → «Медленные запросы»)
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_LOG_INTERVAL = 60
+
+# Пользователь сессии загружается вместе с профилем и корзиной одним запросом
+AUTHENTICATION_BACKENDS = ['main.backends.ProfileModelBackend']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -111,10 +177,32 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# collectstatic добавляет в имена хеш содержимого (такие файлы кешируются навсегда)
+# и кладет рядом сжатые .gz/.br версии (brotli — если установлен)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'main.compression.PrecompressedManifestStaticFilesStorage',
+    },
+}
+
+# Pre-rendered info pages (python manage.py prerender_pages)
+PRERENDERED_PAGES_DIR = BASE_DIR / 'prerendered'
+
 # Media files (user uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Отдачу файлов можно передать nginx/Apache: 'x-accel-redirect' или 'x-sendfile'
+STATIC_SENDFILE = None
+# Для X-Accel-Redirect: internal location в nginx -> каталог на диске
+STATIC_ACCEL_REDIRECT_PREFIXES = {
+    '/_protected/static/': STATIC_ROOT,
+    '/_protected/media/': MEDIA_ROOT,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
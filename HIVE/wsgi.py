@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HIVE.settings')
 
 application = get_wsgi_application()
+
+# Прогрев до первого запроса при HIVE_WARMUP=1. Модуль может загружаться и до fork
+# (gunicorn --preload), поэтому соединения с базой после прогрева закрываются.
+from main.warmup import warm_up_if_enabled  # noqa: E402
+
+warm_up_if_enabled(pre_fork=True)
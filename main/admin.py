@@ -1,11 +1,21 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import HoneyProduct, WaxCandle, UserProfile, Cart, CartItem, Order, OrderItem
+from .archive import restore_orders
+from .excursions import BookingError, cancel_booking
+from .exports import EXPORT_FORMATS
+from .fulfillment import bulk_transition
+from .models import (
+    HoneyProduct, WaxCandle, UserProfile, Cart, CartItem, Order, OrderItem, OrderStatusLog, ArchivedOrder, ArchivedOrderItem,
+    RestockForecast, Task, DeliveryZone, DeliveryTariff, ExcursionSlot, ExcursionBooking, SlowQuery,
+    recalculate_cart_totals,
+)
 
 @admin.register(HoneyProduct)
 class HoneyProductAdmin(admin.ModelAdmin):
-    list_display = ['title', 'price', 'weight', 'is_active', 'is_featured', 'image_preview']
-    list_filter = ['is_active', 'is_featured', 'created_at']
+    list_display = ['title', 'price', 'weight', 'weight_grams', 'price_per_kg', 'is_active', 'is_featured', 'image_preview']
+    list_filter = ['is_active', 'is_featured', ('weight_grams', admin.EmptyFieldListFilter), 'created_at']
     search_fields = ['title', 'short_description']
     list_editable = ['is_active', 'is_featured']
 
@@ -14,7 +24,7 @@ class HoneyProductAdmin(admin.ModelAdmin):
             'fields': ('title', 'short_description', 'detailed_description')
         }),
         ('Цена и вес', {
-            'fields': ('price', 'weight')
+            'fields': ('price', 'weight', 'weight_grams', 'price_per_kg')
         }),
         ('Изображение', {
             'fields': ('image', 'image_display')
@@ -24,7 +34,7 @@ class HoneyProductAdmin(admin.ModelAdmin):
         }),
     )
 
-    readonly_fields = ['image_display']
+    readonly_fields = ['image_display', 'weight_grams', 'price_per_kg']
 
     def image_preview(self, obj):
         if obj.image:
@@ -50,8 +60,8 @@ class HoneyProductAdmin(admin.ModelAdmin):
 
 @admin.register(WaxCandle)
 class WaxCandleAdmin(admin.ModelAdmin):
-    list_display = ['title', 'price', 'weight', 'is_active', 'is_featured', 'image_preview']
-    list_filter = ['is_active', 'is_featured', 'created_at']
+    list_display = ['title', 'price', 'weight', 'weight_grams', 'price_per_kg', 'is_active', 'is_featured', 'image_preview']
+    list_filter = ['is_active', 'is_featured', ('weight_grams', admin.EmptyFieldListFilter), 'created_at']
     search_fields = ['title', 'short_description']
     list_editable = ['is_active', 'is_featured']
 
@@ -60,7 +70,7 @@ class WaxCandleAdmin(admin.ModelAdmin):
             'fields': ('title', 'short_description', 'detailed_description')
         }),
         ('Цена и вес', {
-            'fields': ('price', 'weight')
+            'fields': ('price', 'weight', 'weight_grams', 'price_per_kg')
         }),
         ('Изображение', {
             'fields': ('image', 'image_display')
@@ -70,7 +80,7 @@ class WaxCandleAdmin(admin.ModelAdmin):
         }),
     )
 
-    readonly_fields = ['image_display']
+    readonly_fields = ['image_display', 'weight_grams', 'price_per_kg']
 
     def image_preview(self, obj):
         if obj.image:
@@ -118,40 +128,363 @@ class UserProfileAdmin(admin.ModelAdmin):
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ['user', 'created_at', 'updated_at']
+    list_display = ['user', 'items_count', 'subtotal', 'created_at', 'updated_at']
     search_fields = ['user__username', 'user__email']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['items_count', 'subtotal', 'created_at', 'updated_at']
+    actions = ['recalculate_totals']
+
+    @admin.action(description='Пересчитать итоги')
+    def recalculate_totals(self, request, queryset):
+        updated = recalculate_cart_totals(queryset)
+        self.message_user(request, f'Итоги пересчитаны: {updated}')
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ['cart', 'product', 'quantity', 'line_total']
     search_fields = ['cart__user__username', 'product__title']
 
+    # Правка позиций в обход методов корзины: итоги пересчитываются целиком
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recalculate_cart_totals(Cart.objects.filter(pk=obj.cart_id))
+        if change and 'cart' in form.changed_data:
+            recalculate_cart_totals(Cart.objects.filter(pk=form.initial['cart']))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recalculate_cart_totals(Cart.objects.filter(pk=obj.cart_id))
+
+    def delete_queryset(self, request, queryset):
+        cart_ids = list(queryset.values_list('cart_id', flat=True))
+        super().delete_queryset(request, queryset)
+        recalculate_cart_totals(Cart.objects.filter(pk__in=cart_ids))
+
+def _streaming_export(queryset, fmt):
+    """Потоковая выгрузка заказов: файл формируется по мере чтения из базы"""
+    generator, content_type = EXPORT_FORMATS[fmt]
+    response = StreamingHttpResponse(generator([queryset]), content_type=content_type)
+    filename = f"orders-{timezone.localtime():%Y%m%d-%H%M%S}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+class OrderStatusLogInline(admin.TabularInline):
+    model = OrderStatusLog
+    fields = ['created_at', 'from_status', 'to_status', 'user', 'packer', 'comment']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+def _transition_action(to_status, description):
+    """Действие админки: перевести выбранные заказы в to_status по правилам main.fulfillment"""
+    def action(modeladmin, request, queryset):
+        moved, skipped = bulk_transition(queryset, to_status, user=request.user)
+        message = f'Переведено заказов: {moved}'
+        if skipped:
+            message += f', пропущено (переход не разрешен): {skipped}'
+        modeladmin.message_user(request, message, messages.WARNING if skipped else messages.SUCCESS)
+    action.__name__ = f'mark_{to_status}'
+    return admin.action(description=description, permissions=['change'])(action)
+
+class DeliveryTariffInline(admin.TabularInline):
+    model = DeliveryTariff
+    fields = ['max_weight_grams', 'price', 'updated_at']
+    readonly_fields = ['updated_at']
+    extra = 1
+
+@admin.register(DeliveryZone)
+class DeliveryZoneAdmin(admin.ModelAdmin):
+    """Изменения сразу сбрасывают индекс доставки в памяти (см. main.delivery)"""
+    list_display = ['name', 'postal_prefixes', 'tariffs_display', 'free_from', 'eta_min_days', 'eta_max_days', 'is_active']
+    list_filter = ['is_active']
+    search_fields = ['name', 'postal_prefixes']
+    list_editable = ['is_active']
+    readonly_fields = ['updated_at']
+    inlines = [DeliveryTariffInline]
+
+    fieldsets = (
+        ('Основная информация', {
+            'fields': ('name', 'postal_prefixes', 'is_active')
+        }),
+        ('Условия', {
+            'fields': ('free_from', 'eta_min_days', 'eta_max_days', 'updated_at')
+        }),
+    )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('tariffs')
+
+    @admin.display(description='Тарифы')
+    def tariffs_display(self, obj):
+        return '; '.join(
+            f'до {tariff.max_weight_grams} г — {tariff.price}₽' if tariff.max_weight_grams else f'тяжелее — {tariff.price}₽'
+            for tariff in sorted(obj.tariffs.all(), key=lambda t: (t.max_weight_grams is None, t.max_weight_grams or 0))
+        )
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['order_number', 'user', 'status', 'total_amount', 'created_at']
+    list_display = ['order_number', 'user', 'status', 'packer', 'total_amount', 'created_at']
     list_filter = ['status', 'created_at']
-    search_fields = ['order_number', 'user__username', 'user__email', 'phone']
-    readonly_fields = ['order_number', 'created_at', 'updated_at']
+    search_fields = ['order_number', 'user__username', 'user__email', 'phone', 'packer']
+    # Статус меняется только переходами (действия ниже), а не правкой поля
+    readonly_fields = ['order_number', 'status', 'packer', 'claimed_at', 'created_at', 'updated_at']
     ordering = ['-created_at']
+    inlines = [OrderStatusLogInline]
+    actions = [
+        _transition_action('processing', 'Перевести в обработку'),
+        _transition_action('shipped', 'Отметить отправленными'),
+        _transition_action('delivered', 'Отметить доставленными'),
+        _transition_action('cancelled', 'Отменить'),
+        _transition_action('pending', 'Вернуть в очередь сборки'),
+        'export_csv',
+        'export_jsonl',
+    ]
     
     fieldsets = (
         ('Основная информация', {
             'fields': ('order_number', 'user', 'status', 'total_amount')
         }),
+        ('Сборка', {
+            'fields': ('packer', 'claimed_at')
+        }),
         ('Контактная информация', {
             'fields': ('phone', 'email')
         }),
         ('Адрес доставки', {
-            'fields': ('address', 'city', 'postal_code')
+            'fields': ('address', 'city', 'postal_code', 'delivery_zone', 'delivery_cost', 'delivery_eta')
         }),
         ('Дополнительно', {
             'fields': ('comment', 'created_at', 'updated_at')
         }),
     )
 
+    @admin.action(description='Выгрузить выбранные заказы в CSV')
+    def export_csv(self, request, queryset):
+        return _streaming_export(queryset, 'csv')
+
+    @admin.action(description='Выгрузить выбранные заказы в JSONL')
+    def export_jsonl(self, request, queryset):
+        return _streaming_export(queryset, 'jsonl')
+
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'product', 'quantity', 'price', 'line_total']
     list_filter = ['order__status']
-    search_fields = ['order__order_number', 'product__title']
\ No newline at end of file
+    search_fields = ['order__order_number', 'product__title']
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    fields = ['product', 'quantity', 'price']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Архив только для чтения; вернуть заказ в работу — действием «Восстановить»"""
+    list_display = ['order_number', 'user', 'status', 'total_amount', 'created_at', 'archived_at']
+    list_filter = ['status', 'created_at', 'archived_at']
+    search_fields = ['order_number', 'user__username', 'user__email', 'phone']
+    ordering = ['-created_at']
+    inlines = [ArchivedOrderItemInline]
+    actions = ['restore', 'export_csv', 'export_jsonl']
+
+    fieldsets = OrderAdmin.fieldsets + (
+        ('Архив', {
+            'fields': ('archived_at',)
+        }),
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description='Восстановить в рабочие заказы', permissions=['delete'])
+    def restore(self, request, queryset):
+        restored = restore_orders(queryset)
+        self.message_user(request, f'Восстановлено заказов: {restored}')
+
+    @admin.action(description='Выгрузить выбранные заказы в CSV')
+    def export_csv(self, request, queryset):
+        return _streaming_export(queryset, 'csv')
+
+    @admin.action(description='Выгрузить выбранные заказы в JSONL')
+    def export_jsonl(self, request, queryset):
+        return _streaming_export(queryset, 'jsonl')
+
+@admin.register(RestockForecast)
+class RestockForecastAdmin(admin.ModelAdmin):
+    """Отчет о заготовке; пересчитывается командой forecast_demand"""
+    list_display = ['product', 'recommended', 'forecast_units', 'safety_units', 'daily_7', 'daily_28',
+                    'daily_91', 'trend_display', 'seasonality_display', 'last_sale', 'computed_at']
+    list_select_related = ['product']
+    search_fields = ['product__title']
+    list_filter = ['last_sale']
+    ordering = ['-recommended', 'product__title']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Прогноз, шт', ordering='forecast')
+    def forecast_units(self, obj):
+        return f'{obj.forecast:.1f} за {obj.horizon_days} дн.'
+
+    @admin.display(description='Запас, шт', ordering='safety_stock')
+    def safety_units(self, obj):
+        return f'{obj.safety_stock:.1f}'
+
+    @admin.display(description='7 дней, шт/день', ordering='avg_7')
+    def daily_7(self, obj):
+        return f'{obj.avg_7:.2f}'
+
+    @admin.display(description='28 дней, шт/день', ordering='avg_28')
+    def daily_28(self, obj):
+        return f'{obj.avg_28:.2f}'
+
+    @admin.display(description='91 день, шт/день', ordering='avg_91')
+    def daily_91(self, obj):
+        return f'{obj.avg_91:.2f}'
+
+    @admin.display(description='Тренд', ordering='trend')
+    def trend_display(self, obj):
+        return f'{obj.trend:+.3f}'
+
+    @admin.display(description='Сезонность', ordering='seasonality')
+    def seasonality_display(self, obj):
+        return f'×{obj.seasonality:.2f}'
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'priority', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'locked_by']
+    readonly_fields = ['created_at', 'locked_at', 'finished_at', 'last_error']
+    actions = ['requeue']
+
+    @admin.action(description='Вернуть в очередь')
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status=Task.STATUS_RUNNING).update(
+            status=Task.STATUS_QUEUED, attempts=0, run_at=timezone.now(), locked_by='', locked_at=None,
+        )
+        self.message_user(request, f'Возвращено в очередь: {updated}')
+
+class ExcursionBookingInline(admin.TabularInline):
+    model = ExcursionBooking
+    fields = ['user', 'seats', 'phone', 'comment', 'status', 'created_at']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(ExcursionSlot)
+class ExcursionSlotAdmin(admin.ModelAdmin):
+    """Занятые места меняют только запись и отмена (main.excursions), в форме они только для чтения"""
+    list_display = ['starts_at', 'title', 'capacity', 'seats_booked', 'price', 'is_active']
+    list_filter = ['is_active', 'starts_at']
+    search_fields = ['title']
+    list_editable = ['is_active']
+    readonly_fields = ['seats_booked', 'updated_at']
+    date_hierarchy = 'starts_at'
+    inlines = [ExcursionBookingInline]
+
+    fieldsets = (
+        ('Основная информация', {
+            'fields': ('title', 'starts_at', 'duration_minutes', 'price', 'is_active')
+        }),
+        ('Места', {
+            'fields': ('capacity', 'seats_booked', 'updated_at')
+        }),
+    )
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            # Сохраняем только правленые поля: seats_booked из формы мог устареть, пока ее заполняли
+            obj.save(update_fields=[*form.changed_data, 'updated_at'])
+        else:
+            super().save_model(request, obj, form, change)
+
+@admin.register(ExcursionBooking)
+class ExcursionBookingAdmin(admin.ModelAdmin):
+    list_display = ['slot', 'user', 'seats', 'phone', 'status', 'created_at']
+    list_filter = ['status', 'slot__starts_at']
+    search_fields = ['user__username', 'user__email', 'phone']
+    list_select_related = ['slot', 'user']
+    readonly_fields = ['slot', 'user', 'seats', 'phone', 'status', 'created_at', 'cancelled_at']
+    fields = ['slot', 'user', 'seats', 'phone', 'comment', 'status', 'created_at', 'cancelled_at']
+    actions = ['cancel']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # Удаление не вернуло бы места; вместо него — отмена
+        return False
+
+    @admin.action(description='Отменить записи и вернуть места', permissions=['change'])
+    def cancel(self, request, queryset):
+        cancelled = 0
+        for booking in queryset.filter(status=ExcursionBooking.STATUS_CONFIRMED).select_related('slot'):
+            try:
+                cancelled += cancel_booking(booking, force=True)
+            except BookingError as e:
+                self.message_user(request, f'{booking}: {e}', messages.ERROR)
+        self.message_user(request, f'Отменено записей: {cancelled}')
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """Медленные запросы по суммарному времени; пишет main.slowlog, удаление сбрасывает статистику"""
+    list_display = ['short_sql', 'calls', 'total_display', 'avg_display', 'max_display', 'view', 'origin', 'last_seen']
+    list_filter = ['database', 'last_seen']
+    search_fields = ['sql', 'view', 'origin']
+    ordering = ['-total_ms']
+    fieldsets = (
+        ('Запрос', {
+            'fields': ('sql', 'params_shape', 'database', 'fingerprint')
+        }),
+        ('Статистика', {
+            'fields': ('calls', 'total_ms', 'max_ms', 'last_ms', 'first_seen', 'last_seen')
+        }),
+        ('Откуда', {
+            'fields': ('view', 'origin', 'stack')
+        }),
+        ('План', {
+            'fields': ('plan_display',)
+        }),
+    )
+    readonly_fields = ['sql', 'params_shape', 'database', 'fingerprint', 'calls', 'total_ms', 'max_ms', 'last_ms',
+                       'first_seen', 'last_seen', 'view', 'origin', 'stack', 'plan_display']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Запрос')
+    def short_sql(self, obj):
+        return obj.sql if len(obj.sql) <= 120 else obj.sql[:117] + '...'
+
+    @admin.display(description='Всего', ordering='total_ms')
+    def total_display(self, obj):
+        return f'{obj.total_ms / 1000:.1f} с' if obj.total_ms >= 1000 else f'{obj.total_ms:.0f} мс'
+
+    @admin.display(description='В среднем')
+    def avg_display(self, obj):
+        return f'{obj.total_ms / obj.calls:.0f} мс' if obj.calls else '—'
+
+    @admin.display(description='Максимум', ordering='max_ms')
+    def max_display(self, obj):
+        return f'{obj.max_ms:.0f} мс'
+
+    @admin.display(description='План запроса')
+    def plan_display(self, obj):
+        return format_html('<pre style="margin:0">{}</pre>', obj.plan or 'нет (снимается только для SELECT)')
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        # Регистрируем обработчики сигналов и фоновые задачи (воркер ищет их по имени),
+        # журнал медленных запросов подключается к каждому новому соединению с базой
+        from . import signals, slowlog, tasks  # noqa: F401
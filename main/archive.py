@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .retention import RETENTION_BATCH_PAUSE, PurgeResult, run_in_batches
+
+# Закрытый заказ уходит в архив через столько месяцев после последнего изменения
+ORDER_ARCHIVE_AFTER_MONTHS = getattr(settings, 'ORDER_ARCHIVE_AFTER_MONTHS', 6)
+ORDER_ARCHIVE_BATCH_SIZE = getattr(settings, 'ORDER_ARCHIVE_BATCH_SIZE', 200)
+
+ORDER_FIELDS = [field.attname for field in Order._meta.concrete_fields]
+ITEM_FIELDS = [field.attname for field in OrderItem._meta.concrete_fields]
+
+
+def _copy(rows, model, fields, **extra):
+    return model.objects.bulk_create([model(**{name: row[name] for name in fields}, **extra) for row in rows])
+
+
+def _move(source_order, source_item, target_order, target_item, order_ids, **extra):
+    """Перенести заказы с позициями между рабочими и архивными таблицами, вернуть число заказов"""
+    orders = list(source_order.objects.filter(pk__in=order_ids).values(*ORDER_FIELDS))
+    items = list(source_item.objects.filter(order_id__in=order_ids).values(*ITEM_FIELDS))
+    _copy(orders, target_order, ORDER_FIELDS, **extra)
+    _copy(items, target_item, ITEM_FIELDS)
+    source_item.objects.filter(order_id__in=order_ids)._raw_delete(connection.alias)
+    return source_order.objects.filter(pk__in=order_ids)._raw_delete(connection.alias)
+
+
+def archive_orders(months=ORDER_ARCHIVE_AFTER_MONTHS, batch_size=ORDER_ARCHIVE_BATCH_SIZE,
+                   pause=RETENTION_BATCH_PAUSE, result=None):
+    """Перенести закрытые заказы старше months месяцев в архив пачками по batch_size"""
+    result = result or PurgeResult()
+    cutoff = timezone.now() - timedelta(days=30 * months)
+    archived_at = timezone.now()
+
+    def archive_batch(size):
+        order_ids = list(
+            Order.objects
+            .filter(status__in=Order.CLOSED_STATUSES, updated_at__lt=cutoff)
+            .select_for_update()
+            .order_by('pk')
+            .values_list('pk', flat=True)[:size]
+        )
+        if not order_ids:
+            return 0
+        moved = _move(Order, OrderItem, ArchivedOrder, ArchivedOrderItem, order_ids, archived_at=archived_at)
+        result.add(Order._meta.db_table, moved)
+        return moved
+
+    run_in_batches(result, archive_batch, batch_size, pause)
+    return result
+
+
+def restore_orders(archived_orders):
+    """
+    Вернуть архивные заказы (queryset или список) в рабочие таблицы.
+
+    Дата обновления становится текущей, чтобы заказ не ушел в архив при следующем запуске;
+    дату создания, которую bulk_create перезаписывает (auto_now_add), возвращаем отдельным UPDATE.
+    """
+    created = {order.pk: order.created_at for order in archived_orders}
+    if not created:
+        return 0
+    with transaction.atomic():
+        restored = _move(ArchivedOrder, ArchivedOrderItem, Order, OrderItem, list(created))
+        Order.objects.filter(pk__in=created).update(created_at=Case(
+            *[When(pk=pk, then=Value(created_at)) for pk, created_at in created.items()],
+        ))
+    return restored
+
+
+def user_orders(user):
+    """Все заказы пользователя, рабочие и архивные, от новых к старым"""
+    orders = list(Order.objects.filter(user=user).prefetch_related('items__product'))
+    orders += ArchivedOrder.objects.filter(user=user).prefetch_related('items__product')
+    return sorted(orders, key=lambda order: order.created_at, reverse=True)
@@ -0,0 +1,132 @@
+import base64
+import binascii
+import hashlib
+import json
+
+from django.conf import settings
+
+from .conditional import catalog_version
+from .images import derivative_urls
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него тот же ответ кодирует стандартный json
+    orjson = None
+
+API_VERSION = 1
+# Товаров на странице по умолчанию и максимум (?limit=)
+CATALOG_API_PAGE_SIZE = getattr(settings, 'CATALOG_API_PAGE_SIZE', 50)
+CATALOG_API_PAGE_SIZE_MAX = 200
+# Каталог публичный: ответ можно кешировать в CDN и у клиента
+CATALOG_API_CACHE_CONTROL = getattr(settings, 'CATALOG_API_CACHE_CONTROL', 'public, max-age=60')
+
+# Поле API -> поле модели
+API_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'short_description': 'short_description',
+    'description': 'detailed_description',
+    'price': 'price',
+    'weight': 'weight',
+    'weight_grams': 'weight_grams',
+    'price_per_kg': 'price_per_kg',
+    'is_featured': 'is_featured',
+    'image': 'image',
+    'updated_at': 'updated_at',
+}
+# Подробное описание — самое тяжелое поле, отдается только по fields=
+DEFAULT_FIELDS = tuple(name for name in API_FIELDS if name != 'description')
+
+ENCODER = 'orjson' if orjson is not None else 'json'
+
+
+class ApiError(Exception):
+    pass
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(f'{API_VERSION}:{last_id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """id, после которого продолжать; курсор непрозрачен для клиента"""
+    try:
+        version, last_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split(':')
+        if int(version) != API_VERSION:
+            raise ValueError
+        return int(last_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ApiError('Некорректный cursor')
+
+
+def parse_params(query):
+    """(поля, id после курсора, limit) из строки запроса или ApiError"""
+    fields = DEFAULT_FIELDS
+    if query.get('fields'):
+        fields = tuple(dict.fromkeys(name.strip() for name in query['fields'].split(',') if name.strip()))
+        unknown = [name for name in fields if name not in API_FIELDS]
+        if unknown or not fields:
+            raise ApiError(f'Неизвестные поля: {", ".join(unknown)}; доступны: {", ".join(API_FIELDS)}')
+    after = decode_cursor(query['cursor']) if query.get('cursor') else 0
+    try:
+        limit = int(query.get('limit', CATALOG_API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError('limit должен быть целым числом')
+    if not 1 <= limit <= CATALOG_API_PAGE_SIZE_MAX:
+        raise ApiError(f'limit — от 1 до {CATALOG_API_PAGE_SIZE_MAX}')
+    return fields, after, limit
+
+
+def page_etag(model, fields, after, limit):
+    """
+    ETag страницы без ее сборки: версия каталога и параметры однозначно задают тело.
+
+    Кодировщик входит в ETag, потому что json и orjson дают разные байты. Сильным
+    остается только несжатый ответ: CompressionMiddleware делает ETag сжатого слабым
+    (у gzip случайная длина заголовка), а If-None-Match сравнивает слабо, и 304 приходит в обоих случаях.
+    """
+    last_modified, count = catalog_version(model)
+    parts = [str(API_VERSION), ENCODER, model._meta.label_lower, last_modified.isoformat() if last_modified else '',
+             str(count), ','.join(fields), str(after), str(limit)]
+    return hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def _convert(name, value):
+    if value is None:
+        return None
+    if name in ('price', 'price_per_kg'):
+        # Деньги — строкой, чтобы клиент не терял точность на float
+        return str(value)
+    if name == 'updated_at':
+        return value.isoformat()
+    if name == 'image':
+        return derivative_urls(value)
+    return value
+
+
+def catalog_page(model, fields, after, limit):
+    """
+    Страница активных товаров по возрастанию id, начиная после after.
+
+    Одна выборка values() без создания объектов модели; лишняя строка показывает,
+    есть ли следующая страница.
+    """
+    columns = ['id'] + [API_FIELDS[name] for name in fields if name != 'id']
+    rows = list(
+        model.objects.filter(is_active=True, pk__gt=after).order_by('pk').values_list(*columns)[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    position = {name: columns.index(API_FIELDS[name]) for name in fields}
+    data = [{name: _convert(name, row[position[name]]) for name in fields} for row in rows]
+    return {
+        'api_version': API_VERSION,
+        'data': data,
+        'next_cursor': encode_cursor(rows[-1][0]) if has_more else None,
+    }
+
+
+def encode(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
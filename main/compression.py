@@ -0,0 +1,204 @@
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, StaticFilesStorage
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него остается только gzip
+    brotli = None
+
+# Ответы меньше этого размера не сжимаем: выигрыш меньше заголовков
+COMPRESSION_MIN_SIZE = getattr(settings, 'COMPRESSION_MIN_SIZE', 512)
+# Качество brotli для динамических ответов (для статики при collectstatic — максимум)
+BROTLI_DYNAMIC_QUALITY = getattr(settings, 'BROTLI_DYNAMIC_QUALITY', 5)
+
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(json|javascript|x-javascript|xml|x-ndjson|manifest\+json)|image/svg\+xml)'
+)
+
+# Расширение файла-двойника для каждой кодировки
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def parse_accept_encoding(header):
+    """{кодировка: q} из заголовка Accept-Encoding"""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(request):
+    """Кодировка с наибольшим q; при равном q brotli предпочтительнее gzip"""
+    supported = ['br', 'gzip'] if brotli is not None else ['gzip']
+    accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    best, best_q = None, 0.0
+    for coding in supported:
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def brotli_sequence(sequence, quality=BROTLI_DYNAMIC_QUALITY):
+    """Потоковое сжатие brotli: каждый кусок сбрасывается сразу, первый байт не ждет конца"""
+    compressor = brotli.Compressor(quality=quality)
+    for item in sequence:
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def _static_sibling(request, encoding):
+    """Заранее сжатый файл из STATIC_ROOT для запроса к статике, если он есть и не устарел"""
+    static_url = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+    if not request.path.startswith(static_url) or not settings.STATIC_ROOT:
+        return None
+    root = Path(settings.STATIC_ROOT).resolve()
+    original = (root / request.path[len(static_url):]).resolve()
+    if root not in original.parents:
+        return None
+    sibling = original.with_name(original.name + ENCODING_SUFFIXES[encoding])
+    try:
+        if sibling.stat().st_mtime < original.stat().st_mtime:
+            return None
+    except FileNotFoundError:
+        return None
+    return sibling
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов gzip или brotli по Accept-Encoding.
+
+    Пропускает маленькие, уже сжатые и несжимаемые (изображения) ответы,
+    потоковые ответы сжимает по кускам. Для статики отдает .br/.gz-двойники,
+    созданные при collectstatic, вместо сжатия на лету.
+    """
+
+    # Как в GZipMiddleware: случайная длина заголовка gzip против BREACH
+    max_random_bytes = 100
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if (
+            response.status_code != 200
+            or response.has_header('Content-Encoding')
+            or not COMPRESSIBLE_TYPES.match(response.get('Content-Type', ''))
+        ):
+            return response
+        if not response.streaming and len(response.content) < COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request)
+        if encoding is None:
+            return response
+
+        sibling = _static_sibling(request, encoding)
+        accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if sibling is None and encoding == 'br' and accepted.get('gzip', 0.0) > 0:
+            # Готовый .gz дешевле, чем brotli на лету
+            sibling = _static_sibling(request, 'gzip')
+            if sibling is not None:
+                encoding = 'gzip'
+        if sibling is not None:
+            if hasattr(response, 'close'):
+                response.close()
+            precompressed = FileResponse(sibling.open('rb'), content_type=response['Content-Type'])
+            for header in ('Last-Modified', 'Cache-Control', 'ETag', 'Vary'):
+                if response.has_header(header):
+                    precompressed[header] = response[header]
+            response = precompressed
+        elif response.streaming:
+            if response.is_async:
+                # Асинхронные потоки оставляем как есть
+                return response
+            if encoding == 'br':
+                response.streaming_content = brotli_sequence(response.streaming_content)
+            else:
+                response.streaming_content = compress_sequence(
+                    response.streaming_content, max_random_bytes=self.max_random_bytes,
+                )
+            del response.headers['Content-Length']
+        else:
+            if encoding == 'br':
+                compressed = brotli.compress(response.content, quality=BROTLI_DYNAMIC_QUALITY)
+            else:
+                compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # Сжатое тело отличается побайтно: сильный ETag становится слабым (RFC 9110 8.8.1)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+class PrecompressMixin:
+    """Для хранилищ статики: при collectstatic положить рядом .gz и .br версии файлов"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        parent = getattr(super(), 'post_process', None)
+        if parent is not None:
+            yield from parent(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        # У манифестного хранилища сжимаем и хешированные копии — именно их запрашивают браузеры
+        names = list(paths) + list(getattr(self, 'hashed_files', {}).values())
+        for name in dict.fromkeys(names):
+            content_type, _ = mimetypes.guess_type(name)
+            if not content_type or not COMPRESSIBLE_TYPES.match(content_type):
+                continue
+            path = self.path(name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < COMPRESSION_MIN_SIZE:
+                continue
+            variants = {'.gz': compress_string(data)}
+            if brotli is not None:
+                variants['.br'] = brotli.compress(data, quality=11)
+            for suffix, compressed in variants.items():
+                if len(compressed) < len(data):
+                    tmp_path = f'{path}{suffix}.tmp'
+                    with open(tmp_path, 'wb') as f:
+                        f.write(compressed)
+                    os.replace(tmp_path, path + suffix)
+            yield name, name, True
+
+
+class PrecompressedStaticFilesStorage(PrecompressMixin, StaticFilesStorage):
+    pass
+
+
+class PrecompressedManifestStaticFilesStorage(PrecompressMixin, ManifestStaticFilesStorage):
+    """Имена с хешем содержимого (для immutable-кеширования) плюс сжатые двойники"""
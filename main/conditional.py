@@ -0,0 +1,116 @@
+import hashlib
+import os
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.template.loader import get_template
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .metrics import cache_result
+
+# Сколько секунд версия каталога живет в кеше. Сигналы сбрасывают ее сразу,
+# таймаут лишь страхует от сброса, который не дошел до кеша.
+CATALOG_VERSION_CACHE_TIMEOUT = getattr(settings, 'CATALOG_VERSION_CACHE_TIMEOUT', 30)
+
+
+def catalog_version_key(model):
+    return f'catalog-version:{model._meta.label_lower}'
+
+
+def catalog_version(model):
+    """
+    (последнее изменение, число строк) для модели каталога.
+
+    Одна агрегатная выборка по индексу updated_at, результат кешируется.
+    Число строк нужно, чтобы удаление товара тоже меняло версию.
+    """
+    key = catalog_version_key(model)
+    version = cache.get(key)
+    cache_result('catalog_version', version is not None)
+    if version is None:
+        # С основной базы: версию сбрасывают после коммита, и пересчитанная с отстающей
+        # реплики она закешировала бы старое состояние на CATALOG_VERSION_CACHE_TIMEOUT
+        stats = model.objects.using('default').aggregate(last_modified=Max('updated_at'), count=Count('id'))
+        version = (stats['last_modified'], stats['count'])
+        cache.set(key, version, CATALOG_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def invalidate_catalog_version(model):
+    """Сбросить версию сразу и еще раз после коммита: до коммита ее мог перечитать и закешировать другой запрос"""
+    key = catalog_version_key(model)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def _constant_name(expression):
+    # {% include 'имя' %} без фильтров; имя из переменной заранее не узнать
+    return expression.var if isinstance(expression.var, str) and not expression.filters else None
+
+
+@lru_cache(maxsize=None)
+def _template_paths(template_name):
+    """Файлы шаблона и всех шаблонов, которые он расширяет или включает с постоянным именем"""
+    template = get_template(template_name).template
+    paths = {template.origin.name}
+    for node in template.nodelist.get_nodes_by_type((ExtendsNode, IncludeNode)):
+        name = _constant_name(node.parent_name if isinstance(node, ExtendsNode) else node.template)
+        if name is not None:
+            paths |= _template_paths(name)
+    return frozenset(paths)
+
+
+def templates_last_modified(*template_names):
+    """Самое позднее время изменения файлов шаблонов вместе с включаемыми (stat, без рендеринга)"""
+    paths = set().union(*(_template_paths(name) for name in template_names))
+    mtime = max(os.stat(path).st_mtime for path in paths)
+    return datetime.fromtimestamp(int(mtime), tz=dt_timezone.utc)
+
+
+def _has_pending_messages(request):
+    # len() не помечает сообщения прочитанными, в отличие от итерации
+    storage = getattr(request, '_messages', None)
+    return storage is not None and len(storage) > 0
+
+
+def conditional_page(template_name, *models):
+    """
+    ETag/Last-Modified для страницы, зависящей от шаблона, каталога и входа в систему.
+
+    При совпадении валидатора отдается 304 без вызова view и рендеринга.
+    Шапка отличается для вошедших пользователей, поэтому id пользователя входит в ETag,
+    а Last-Modified отдается только анонимам. Пока в запросе есть непоказанные
+    сообщения (например, «Товар добавлен в корзину»), условный ответ не используется.
+    """
+    def last_modified(request, *args, **kwargs):
+        if _has_pending_messages(request):
+            return None
+        # Вместе с base.html и включаемыми карточками и фильтрами каталога
+        stamps = [templates_last_modified(template_name)]
+        stamps += [catalog_version(model)[0] for model in models]
+        return max(stamp for stamp in stamps if stamp is not None)
+
+    def last_modified_anonymous(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        return last_modified(request, *args, **kwargs)
+
+    def etag(request, *args, **kwargs):
+        stamp = last_modified(request, *args, **kwargs)
+        if stamp is None:
+            return None
+        # Строка запроса входит в ETag: сортировка и фильтры меняют страницу
+        parts = [template_name, stamp.isoformat(), str(request.user.pk or 'anon'), request.META.get('QUERY_STRING', '')]
+        parts += [str(catalog_version(model)[1]) for model in models]
+        return hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified_anonymous)(view)
+        return wraps(view)(cache_control(private=True, no_cache=True)(conditional_view))
+    return decorator
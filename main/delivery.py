@@ -0,0 +1,138 @@
+import threading
+import time
+from bisect import bisect_left
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import transaction
+
+from .conditional import catalog_version, invalidate_catalog_version
+from .models import DeliveryTariff, DeliveryZone
+
+# Как часто (секунд) процесс сверяет версию тарифов с общим кешем (CACHES). Сигнал сбрасывает
+# индекс сразу в своем процессе, в остальных он устаревает не дольше этого интервала
+DELIVERY_INDEX_CHECK_INTERVAL = getattr(settings, 'DELIVERY_INDEX_CHECK_INTERVAL', 1)
+# Вес единицы товара, у которого фасовку не удалось разобрать
+DELIVERY_UNKNOWN_ITEM_GRAMS = getattr(settings, 'DELIVERY_UNKNOWN_ITEM_GRAMS', 1000)
+POSTAL_CODE_LENGTH = 6
+FALLBACK_PREFIX = '*'
+
+
+class Quote(NamedTuple):
+    zone: str
+    cost: Decimal
+    eta_min_days: int
+    eta_max_days: int
+    free_from: Decimal | None
+
+    @property
+    def eta(self):
+        if self.eta_min_days == self.eta_max_days:
+            return f'{self.eta_min_days} дн.'
+        return f'{self.eta_min_days}–{self.eta_max_days} дн.'
+
+
+class _Zone(NamedTuple):
+    name: str
+    free_from: Decimal | None
+    eta_min_days: int
+    eta_max_days: int
+    weights: tuple  # верхние границы веса по возрастанию, без ограничения — в конце
+    prices: tuple
+
+
+class DeliveryIndex:
+    """
+    Зоны доставки в памяти: префикс индекса -> зона с тарифами.
+
+    Поиск — не больше семи обращений к dict (префиксы длиной 6..1 и «*»)
+    и bisect по весовым границам тарифов, без запросов к базе.
+    """
+
+    def __init__(self, zones):
+        self.prefixes = {}
+        for zone in zones:
+            tariffs = sorted(zone.tariffs.all(), key=lambda t: (t.max_weight_grams is None, t.max_weight_grams or 0))
+            entry = _Zone(
+                zone.name, zone.free_from, zone.eta_min_days, zone.eta_max_days,
+                tuple(t.max_weight_grams if t.max_weight_grams is not None else float('inf') for t in tariffs),
+                tuple(t.price for t in tariffs),
+            )
+            for prefix in zone.prefixes():
+                self.prefixes[prefix] = entry
+
+    def zone_for(self, postal_code):
+        prefixes = self.prefixes
+        for length in range(min(len(postal_code), POSTAL_CODE_LENGTH), 0, -1):
+            zone = prefixes.get(postal_code[:length])
+            if zone is not None:
+                return zone
+        return prefixes.get(FALLBACK_PREFIX)
+
+    def quote(self, postal_code, subtotal, grams):
+        """Quote или None, если индекс не обслуживается или заказ тяжелее всех тарифов зоны"""
+        zone = self.zone_for(postal_code)
+        if zone is None:
+            return None
+        position = bisect_left(zone.weights, grams)
+        if position == len(zone.weights):
+            return None
+        cost = zone.prices[position]
+        if zone.free_from is not None and subtotal >= zone.free_from:
+            cost = Decimal('0.00')
+        return Quote(zone.name, cost, zone.eta_min_days, zone.eta_max_days, zone.free_from)
+
+
+_state = {'index': None, 'version': None, 'checked_at': 0.0}
+_lock = threading.Lock()
+
+
+def _version():
+    return catalog_version(DeliveryZone), catalog_version(DeliveryTariff)
+
+
+def delivery_index():
+    """Индекс процесса; версия сверяется с кешем не чаще DELIVERY_INDEX_CHECK_INTERVAL"""
+    now = time.monotonic()
+    index = _state['index']
+    if index is not None and now - _state['checked_at'] < DELIVERY_INDEX_CHECK_INTERVAL:
+        return index
+    with _lock:
+        version = _version()
+        if _state['index'] is None or _state['version'] != version:
+            zones = DeliveryZone.objects.filter(is_active=True).prefetch_related('tariffs')
+            _state['index'] = DeliveryIndex(zones)
+            _state['version'] = version
+        _state['checked_at'] = time.monotonic()
+        return _state['index']
+
+
+def _expire_local_index():
+    _state['checked_at'] = 0.0
+
+
+def invalidate_delivery_index():
+    """Сбросить версию тарифов в общем кеше и индекс своего процесса (сразу и после коммита)"""
+    invalidate_catalog_version(DeliveryZone)
+    invalidate_catalog_version(DeliveryTariff)
+    _expire_local_index()
+    transaction.on_commit(_expire_local_index)
+
+
+def normalize_postal_code(value):
+    code = ''.join(ch for ch in value or '' if ch.isdigit())
+    return code if len(code) == POSTAL_CODE_LENGTH else None
+
+
+def order_weight_grams(items):
+    """Вес позиций корзины (с присоединенными товарами) в граммах"""
+    return sum((item.product.weight_grams or DELIVERY_UNKNOWN_ITEM_GRAMS) * item.quantity for item in items)
+
+
+def quote(postal_code, subtotal, grams):
+    """Стоимость и срок доставки или None, если их назовет менеджер"""
+    code = normalize_postal_code(postal_code)
+    if code is None:
+        return None
+    return delivery_index().quote(code, Decimal(subtotal), grams)
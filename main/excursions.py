@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .metrics import cache_result
+from .models import ExcursionBooking, ExcursionSlot
+
+# Сколько дней расписания показывать
+EXCURSION_LISTING_DAYS = getattr(settings, 'EXCURSION_LISTING_DAYS', 60)
+# Список времен в общем кеше (CACHES): запись и отмена в любом процессе сбрасывают его
+# после коммита, таймаут — страховка
+EXCURSION_LISTING_CACHE_TIMEOUT = getattr(settings, 'EXCURSION_LISTING_CACHE_TIMEOUT', 5 * 60)
+# За сколько минут до начала закрывается запись и отмена
+EXCURSION_BOOKING_CUTOFF_MINUTES = getattr(settings, 'EXCURSION_BOOKING_CUTOFF_MINUTES', 60)
+EXCURSION_MAX_SEATS_PER_BOOKING = getattr(settings, 'EXCURSION_MAX_SEATS_PER_BOOKING', 10)
+
+EXCURSION_LISTING_CACHE_KEY = 'excursion-slots:v1'
+
+
+class BookingError(Exception):
+    """Записать или отменить нельзя; текст показывается пользователю"""
+
+
+def _cutoff(now=None):
+    return (now or timezone.now()) + timedelta(minutes=EXCURSION_BOOKING_CUTOFF_MINUTES)
+
+
+def upcoming_slots():
+    """
+    Ближайшие времена с открытой записью.
+
+    Список кешируется целиком; начавшиеся за время жизни кеша времена отсекаются при чтении.
+    """
+    slots = cache.get(EXCURSION_LISTING_CACHE_KEY)
+    cache_result('excursion_slots', slots is not None)
+    if slots is None:
+        now = timezone.now()
+        slots = list(ExcursionSlot.objects.filter(
+            is_active=True, starts_at__gt=now, starts_at__lt=now + timedelta(days=EXCURSION_LISTING_DAYS),
+        ))
+        cache.set(EXCURSION_LISTING_CACHE_KEY, slots, EXCURSION_LISTING_CACHE_TIMEOUT)
+    cutoff = _cutoff()
+    return [slot for slot in slots if slot.starts_at > cutoff]
+
+
+def invalidate_slot_listing():
+    cache.delete(EXCURSION_LISTING_CACHE_KEY)
+
+
+def _refusal(slot_id, seats, now):
+    """Почему условное обновление не забронировало места"""
+    slot = ExcursionSlot.objects.filter(pk=slot_id).first()
+    if slot is None or not slot.is_active:
+        return 'Запись на это время закрыта'
+    if slot.starts_at <= _cutoff(now):
+        return 'Запись на это время уже закончилась'
+    if not slot.seats_free:
+        return 'Свободных мест не осталось'
+    return f'Осталось мест: {slot.seats_free}, а вы выбрали {seats}'
+
+
+def book_slot(user, slot_id, seats, phone, comment=''):
+    """
+    Записать пользователя на seats мест.
+
+    Места занимает одно условное UPDATE ... SET seats_booked = seats_booked + n
+    WHERE seats_booked <= capacity - n: база сериализует конкурирующие обновления строки,
+    и из двух претендентов на последние места условие выполнится только у одного.
+    Если запись не создалась (повторная запись), транзакция вернет места.
+    """
+    if not 1 <= seats <= EXCURSION_MAX_SEATS_PER_BOOKING:
+        raise BookingError(f'Можно записать от 1 до {EXCURSION_MAX_SEATS_PER_BOOKING} человек')
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            reserved = ExcursionSlot.objects.filter(
+                pk=slot_id, is_active=True, starts_at__gt=_cutoff(now), seats_booked__lte=F('capacity') - seats,
+            ).update(seats_booked=F('seats_booked') + seats, updated_at=now)
+            if not reserved:
+                raise BookingError(_refusal(slot_id, seats, now))
+            booking = ExcursionBooking.objects.create(
+                slot_id=slot_id, user=user, seats=seats, phone=phone, comment=comment,
+            )
+    except IntegrityError:
+        raise BookingError('Вы уже записаны на это время; чтобы изменить число мест, отмените запись')
+    transaction.on_commit(invalidate_slot_listing)
+    return booking
+
+
+def cancel_booking(booking, force=False):
+    """Отменить запись и вернуть места; False, если она уже отменена. force — без проверки срока (админка)"""
+    now = timezone.now()
+    if not force and booking.slot.starts_at <= _cutoff(now):
+        raise BookingError('Отменить запись можно не позже чем за '
+                           f'{EXCURSION_BOOKING_CUTOFF_MINUTES} мин. до начала, позвоните нам')
+    with transaction.atomic():
+        # Статус меняется условно: повторная отмена не вернет места дважды
+        cancelled = ExcursionBooking.objects.filter(pk=booking.pk, status=ExcursionBooking.STATUS_CONFIRMED).update(
+            status=ExcursionBooking.STATUS_CANCELLED, cancelled_at=now,
+        )
+        if cancelled:
+            ExcursionSlot.objects.filter(pk=booking.slot_id).update(
+                seats_booked=F('seats_booked') - booking.seats, updated_at=now,
+            )
+    if cancelled:
+        transaction.on_commit(invalidate_slot_listing)
+    return bool(cancelled)
@@ -0,0 +1,169 @@
+import csv
+import json
+
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .routers import reporting_alias
+
+# Сколько заказов забираем из базы за один запрос
+EXPORT_CHUNK_SIZE = 2000
+
+ORDER_FIELDS = [
+    'id', 'order_number', 'created_at', 'status', 'user__username',
+    'email', 'phone', 'city', 'postal_code', 'address', 'comment', 'delivery_zone', 'delivery_cost',
+    'total_amount',
+]
+ITEM_FIELDS = ['order_id', 'product_id', 'product__title', 'quantity', 'price']
+
+# Позиции рабочих и архивных заказов (main.archive) лежат в разных таблицах
+ITEM_MODELS = {Order: OrderItem, ArchivedOrder: ArchivedOrderItem}
+
+CSV_HEADER = [
+    'order_number', 'created_at', 'status', 'username', 'email', 'phone',
+    'city', 'postal_code', 'address', 'comment', 'delivery_zone', 'delivery_cost', 'total_amount',
+    'product_id', 'product_title', 'quantity', 'price', 'line_total',
+]
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи"""
+    def write(self, value):
+        return value
+
+
+def filter_orders(queryset=None, status=None, date_from=None, date_to=None):
+    """Отфильтровать заказы по статусу и диапазону дат (включительно)"""
+    if queryset is None:
+        queryset = Order.objects.all()
+    if status:
+        queryset = queryset.filter(status=status)
+    if date_from:
+        queryset = queryset.filter(created_at__date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(created_at__date__lte=date_to)
+    return queryset
+
+
+def export_querysets(status=None, date_from=None, date_to=None, archived=True):
+    """
+    Заказы для выгрузки: сначала архивные, затем рабочие.
+
+    Закрытые заказы старше ORDER_ARCHIVE_AFTER_MONTHS переносит в архив
+    archive_orders; без архива выгрузка за прошлые периоды была бы неполной.
+    """
+    models = [ArchivedOrder, Order] if archived else [Order]
+    return [filter_orders(model.objects.all(), status, date_from, date_to) for model in models]
+
+
+def iter_order_chunks(querysets, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Отдавать заказы пачками вместе с их позициями.
+
+    querysets — список выборок Order или ArchivedOrder (см. export_querysets),
+    выгружаются по очереди. Пагинация по первичному ключу (keyset) вместо
+    OFFSET: каждая пачка — один запрос заказов и один запрос позиций, память
+    не зависит от объема выгрузки. Читает с реплики, если она настроена.
+    """
+    for queryset in querysets:
+        yield from _iter_model_chunks(queryset, chunk_size)
+
+
+def _iter_model_chunks(queryset, chunk_size):
+    db = reporting_alias()
+    item_model = ITEM_MODELS[queryset.model]
+    queryset = queryset.using(db).order_by('pk')
+    last_pk = 0
+    while True:
+        orders = list(queryset.filter(pk__gt=last_pk).values(*ORDER_FIELDS)[:chunk_size])
+        if not orders:
+            return
+        last_pk = orders[-1]['id']
+
+        items_by_order = {}
+        items = (item_model.objects.using(db)
+                 .filter(order_id__in=[order['id'] for order in orders])
+                 .order_by('order_id', 'pk')
+                 .values_list(*ITEM_FIELDS))
+        for order_id, product_id, title, quantity, price in items:
+            items_by_order.setdefault(order_id, []).append({
+                'product_id': product_id,
+                'product_title': title,
+                'quantity': quantity,
+                'price': price,
+                'line_total': quantity * price,
+            })
+
+        yield [(order, items_by_order.get(order['id'], [])) for order in orders]
+
+
+def _order_row(order):
+    return [
+        order['order_number'],
+        timezone.localtime(order['created_at']).isoformat(),
+        order['status'],
+        order['user__username'],
+        order['email'],
+        order['phone'],
+        order['city'],
+        order['postal_code'],
+        order['address'],
+        order['comment'],
+        order['delivery_zone'],
+        order['delivery_cost'],
+        order['total_amount'],
+    ]
+
+
+def iter_orders_csv(querysets, chunk_size=EXPORT_CHUNK_SIZE):
+    """CSV построчно: одна строка на позицию заказа (заказ без позиций — одна строка)"""
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow(CSV_HEADER)  # BOM, чтобы Excel понял UTF-8
+    for chunk in iter_order_chunks(querysets, chunk_size):
+        rows = []
+        for order, items in chunk:
+            base = _order_row(order)
+            if not items:
+                rows.append(writer.writerow(base + [''] * 5))
+            for item in items:
+                rows.append(writer.writerow(base + [
+                    item['product_id'], item['product_title'],
+                    item['quantity'], item['price'], item['line_total'],
+                ]))
+        yield ''.join(rows)
+
+
+def _json_default(value):
+    # Decimal и прочие не-JSON типы выгружаем строкой, чтобы не терять точность
+    return str(value)
+
+
+def iter_orders_jsonl(querysets, chunk_size=EXPORT_CHUNK_SIZE):
+    """JSON Lines: один заказ со списком позиций на строку"""
+    for chunk in iter_order_chunks(querysets, chunk_size):
+        lines = []
+        for order, items in chunk:
+            record = {
+                'order_number': order['order_number'],
+                'created_at': timezone.localtime(order['created_at']).isoformat(),
+                'status': order['status'],
+                'username': order['user__username'],
+                'email': order['email'],
+                'phone': order['phone'],
+                'city': order['city'],
+                'postal_code': order['postal_code'],
+                'address': order['address'],
+                'comment': order['comment'],
+                'delivery_zone': order['delivery_zone'],
+                'delivery_cost': order['delivery_cost'],
+                'total_amount': order['total_amount'],
+                'items': items,
+            }
+            lines.append(json.dumps(record, ensure_ascii=False, default=_json_default) + '\n')
+        yield ''.join(lines)
+
+
+EXPORT_FORMATS = {
+    'csv': (iter_orders_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (iter_orders_jsonl, 'application/x-ndjson; charset=utf-8'),
+}
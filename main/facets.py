@@ -0,0 +1,172 @@
+import threading
+from typing import NamedTuple
+
+from django.db.models import Q
+
+from .conditional import catalog_version
+from .metrics import cache_result
+from .models import HoneyProduct, WaxCandle
+
+
+class FacetValue(NamedTuple):
+    slug: str
+    label: str
+    lookups: dict  # фильтр ORM: {'price__gte': 500, 'price__lt': 1000}
+
+
+class Facet(NamedTuple):
+    name: str  # параметр строки запроса
+    label: str
+    values: tuple
+
+
+def _bands(field, bounds, unit):
+    """Полосы [до a), [a, b), ..., [от z) по границам bounds"""
+    values = [FacetValue(f'lt{bounds[0]}', f'до {bounds[0]} {unit}', {f'{field}__lt': bounds[0]})]
+    for low, high in zip(bounds, bounds[1:]):
+        values.append(FacetValue(f'{low}-{high}', f'{low}–{high} {unit}', {f'{field}__gte': low, f'{field}__lt': high}))
+    values.append(FacetValue(f'gte{bounds[-1]}', f'от {bounds[-1]} {unit}', {f'{field}__gte': bounds[-1]}))
+    return tuple(values)
+
+
+FEATURED_FACET = Facet('featured', 'Подборка', (FacetValue('1', 'Рекомендуемые', {'is_featured': True}),))
+
+CATALOG_FACETS = {
+    HoneyProduct: (
+        Facet('price', 'Цена', _bands('price', (500, 1000), '₽')),
+        Facet('weight', 'Фасовка', _bands('weight_grams', (300, 700), 'г')),
+        FEATURED_FACET,
+    ),
+    WaxCandle: (
+        Facet('price', 'Цена', _bands('price', (300, 600), '₽')),
+        Facet('weight', 'Вес', _bands('weight_grams', (100, 200), 'г')),
+        FEATURED_FACET,
+    ),
+}
+
+
+def _matches(row, lookups):
+    """Та же проверка, что и фильтр ORM по lookups, для строки в памяти (None не входит в полосы)"""
+    for lookup, expected in lookups.items():
+        field, _, op = lookup.partition('__')
+        value = row[field]
+        if op == 'gte':
+            ok = value is not None and value >= expected
+        elif op == 'lt':
+            ok = value is not None and value < expected
+        else:
+            ok = value == expected
+        if not ok:
+            return False
+    return True
+
+
+class FacetIndex:
+    """
+    Битовые маски активных товаров по значениям фасетов.
+
+    Бит i маски — i-й товар снимка. Число товаров для значения при текущем выборе —
+    popcount(маска значения & выбор в остальных фасетах): несколько целочисленных
+    операций на значение вместо COUNT-запроса, независимо от числа товаров.
+    """
+
+    def __init__(self, facets, rows):
+        self.facets = facets
+        self.size = len(rows)
+        self.all = (1 << self.size) - 1
+        self.masks = {}
+        for facet in facets:
+            for value in facet.values:
+                # Строка битов от старшего к младшему: int(..., 2) собирает маску за линейное время
+                bits = ''.join('1' if _matches(row, value.lookups) else '0' for row in reversed(rows))
+                self.masks[facet.name, value.slug] = int(bits or '0', 2)
+
+    def _facet_mask(self, facet, slugs):
+        """Товары, подходящие под любое из выбранных значений фасета (без выбора — все)"""
+        if not slugs:
+            return self.all
+        mask = 0
+        for slug in slugs:
+            mask |= self.masks[facet.name, slug]
+        return mask
+
+    def counts(self, selection):
+        """{фасет: {значение: число товаров}} с учетом выбора в остальных фасетах"""
+        facet_masks = {facet.name: self._facet_mask(facet, selection.get(facet.name)) for facet in self.facets}
+        counts = {}
+        for facet in self.facets:
+            others = self.all
+            for name, mask in facet_masks.items():
+                if name != facet.name:
+                    others &= mask
+            counts[facet.name] = {
+                value.slug: (self.masks[facet.name, value.slug] & others).bit_count() for value in facet.values
+            }
+        return counts
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def facet_index(model):
+    """Индекс фасетов модели; перестраивается, когда меняется версия каталога (сигналы сбрасывают ее при правке)"""
+    version = catalog_version(model)
+    cached = _indexes.get(model)
+    if cached is not None and cached[0] == version:
+        cache_result('facet_index', True)
+        return cached[1]
+    cache_result('facet_index', False)
+    with _lock:
+        cached = _indexes.get(model)
+        if cached is None or cached[0] != version:
+            facets = CATALOG_FACETS[model]
+            fields = sorted({lookup.partition('__')[0] for facet in facets for value in facet.values for lookup in value.lookups})
+            # Индекс привязан к версии каталога, поэтому строится с той же основной базы
+            rows = list(model.objects.using('default').filter(is_active=True).order_by().values(*fields))
+            cached = (version, FacetIndex(facets, rows))
+            _indexes[model] = cached
+    return cached[1]
+
+
+def parse_selection(model, query):
+    """Выбранные значения фасетов из QueryDict: {фасет: [значения]}, неизвестные отбрасываются"""
+    selection = {}
+    for facet in CATALOG_FACETS[model]:
+        known = {value.slug for value in facet.values}
+        slugs = [slug for slug in dict.fromkeys(query.getlist(facet.name)) if slug in known]
+        if slugs:
+            selection[facet.name] = slugs
+    return selection
+
+
+def filter_queryset(queryset, model, selection):
+    """Применить выбор: ИЛИ внутри фасета, И между фасетами"""
+    for facet in CATALOG_FACETS[model]:
+        slugs = selection.get(facet.name)
+        if not slugs:
+            continue
+        condition = Q()
+        for value in facet.values:
+            if value.slug in slugs:
+                condition |= Q(**value.lookups)
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+def facet_context(model, selection):
+    """Фасеты для шаблона: [{name, label, values: [{slug, label, count, selected}]}]"""
+    counts = facet_index(model).counts(selection)
+    facets = []
+    for facet in CATALOG_FACETS[model]:
+        chosen = selection.get(facet.name, ())
+        facets.append({
+            'name': facet.name,
+            'label': facet.label,
+            'values': [
+                {'slug': value.slug, 'label': value.label, 'count': counts[facet.name][value.slug],
+                 'selected': value.slug in chosen}
+                for value in facet.values
+            ],
+        })
+    return facets
@@ -0,0 +1,177 @@
+import math
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+import numpy as np
+
+from .models import ArchivedOrderItem, HoneyProduct, OrderItem, RestockForecast
+
+# Сколько дней истории брать: для годовой сезонности нужен хотя бы год с запасом
+FORECAST_HISTORY_DAYS = getattr(settings, 'FORECAST_HISTORY_DAYS', 730)
+# На сколько дней вперед заготавливать
+FORECAST_HORIZON_DAYS = getattr(settings, 'FORECAST_HORIZON_DAYS', 28)
+# Годовая сезонность сравнивает горизонт с теми же днями год назад, поэтому он не длиннее года
+FORECAST_MAX_HORIZON_DAYS = 365
+# Срок изготовления партии: страховой запас покрывает колебания спроса за это время
+FORECAST_LEAD_DAYS = getattr(settings, 'FORECAST_LEAD_DAYS', 7)
+# Квантиль нормального распределения для страхового запаса (1.65 — 95%)
+FORECAST_SERVICE_Z = getattr(settings, 'FORECAST_SERVICE_Z', 1.65)
+# Сколько штук продаж «весит» предположение об отсутствии сезонности:
+# у редко продаваемых товаров коэффициенты тянутся к 1
+FORECAST_SEASONAL_PRIOR = 20.0
+# Коэффициент годовой сезонности ограничен, чтобы один крупный заказ год назад не раздувал прогноз
+FORECAST_SEASONALITY_RANGE = (0.25, 4.0)
+WEEKDAY_WEEKS = 12
+
+
+def daily_sales(product_ids, start, end):
+    """
+    Матрица товар x день проданных штук за [start, end) по рабочим и архивным заказам.
+
+    День заказа считается один раз на заказ, позиции приходят сырыми тройками
+    (заказ, товар, штук) и раскладываются по матрице numpy без циклов: группировка
+    по дате в SQLite вызывала бы Python-функцию приведения даты на каждую позицию.
+    """
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    days = (end - start).days
+    sales = np.zeros((len(product_ids), days))
+    tz = timezone.get_current_timezone()
+    since = datetime.combine(start, datetime.min.time(), tzinfo=tz)
+    until = datetime.combine(end, datetime.min.time(), tzinfo=tz)
+    for item_model in (OrderItem, ArchivedOrderItem):
+        order_model = item_model._meta.get_field('order').related_model
+        orders = (order_model.objects
+                  .filter(created_at__gte=since, created_at__lt=until)
+                  .exclude(status='cancelled')
+                  .order_by('pk')
+                  .values_list('pk', 'created_at'))
+        orders = [(pk, (timezone.localtime(created_at, tz).date() - start).days) for pk, created_at in orders]
+        if not orders or not len(product_ids):
+            continue
+        order_ids, order_days = np.array(orders, dtype=np.int64).T
+        items = (item_model.objects
+                 .filter(order__created_at__gte=since, order__created_at__lt=until)
+                 .exclude(order__status='cancelled')
+                 .values_list('order_id', 'product_id', 'quantity')
+                 .order_by())
+        items = np.array(list(items), dtype=np.int64).reshape(-1, 3)
+        item_orders, item_products, quantities = items.T
+        # Оба списка id отсортированы: позиции находит searchsorted. Позиции неактивных товаров
+        # и заказов, отмененных между двумя выборками, отбрасываются
+        rows = np.searchsorted(product_ids, item_products).clip(max=len(product_ids) - 1)
+        order_index = np.searchsorted(order_ids, item_orders).clip(max=len(order_ids) - 1)
+        known = (product_ids[rows] == item_products) & (order_ids[order_index] == item_orders)
+        np.add.at(sales, (rows[known], order_days[order_index[known]]), quantities[known])
+    return sales
+
+
+def _window_mean(cumulative, end_offset, width):
+    """Среднее по дням [T - end_offset - width, T - end_offset) для всех товаров сразу"""
+    total = cumulative.shape[1] - 1
+    hi = min(max(total - end_offset, 0), total)
+    lo = max(hi - width, 0)
+    return (cumulative[:, hi] - cumulative[:, lo]) / width
+
+
+def _shrink(observed, expected, weight):
+    """Коэффициент observed/expected, стянутый к 1 тем сильнее, чем меньше продаж"""
+    prior = FORECAST_SEASONAL_PRIOR
+    return (observed * weight + prior) / (expected * weight + prior)
+
+
+def forecast_demand(sales, first_day, horizon=FORECAST_HORIZON_DAYS, lead_days=FORECAST_LEAD_DAYS,
+                    z=FORECAST_SERVICE_Z):
+    """
+    Прогноз по матрице продаж товар x день, без циклов по товарам.
+
+    Уровень — скользящее среднее за 28 дней с трендом (разница с предыдущими 28 днями),
+    умноженное на годовую сезонность (те же дни год назад к 28 дням перед ними)
+    и на недельный профиль за последние 12 недель. Возвращает dict массивов по товарам.
+    """
+    products, days = sales.shape
+    cumulative = np.zeros((products, days + 1))
+    np.cumsum(sales, axis=1, out=cumulative[:, 1:])
+
+    avg_7 = _window_mean(cumulative, 0, 7)
+    avg_28 = _window_mean(cumulative, 0, 28)
+    avg_91 = _window_mean(cumulative, 0, 91)
+    trend = (avg_28 - _window_mean(cumulative, 28, 28)) / 28
+    # Тренд гасим вдвое: по короткой истории он шумный
+    trend *= 0.5
+
+    seasonality = np.ones(products)
+    if days >= 365 + 28:
+        ahead = _window_mean(cumulative, 365 - horizon, horizon)
+        before = _window_mean(cumulative, 365, 28)
+        seasonality = np.clip(_shrink(ahead, before, 28), *FORECAST_SEASONALITY_RANGE)
+
+    weeks = min(WEEKDAY_WEEKS, days // 7)
+    weekday = np.ones((products, 7))
+    if weeks:
+        recent = sales[:, days - weeks * 7:]
+        by_weekday = recent.reshape(products, weeks, 7).sum(axis=1)
+        mean = by_weekday.mean(axis=1, keepdims=True)
+        profile = _shrink(by_weekday, np.broadcast_to(mean, by_weekday.shape), 1)
+        # Столбец k соответствует дню недели (first_day + days - weeks*7 + k)
+        shift = (first_day + timedelta(days=days - weeks * 7)).weekday()
+        weekday = np.roll(profile, shift, axis=1)
+        weekday /= weekday.mean(axis=1, keepdims=True)
+
+    steps = np.arange(1, horizon + 1)
+    future_weekdays = (first_day.weekday() + days + steps - 1) % 7
+    daily = np.maximum(avg_28[:, None] + trend[:, None] * steps, 0)
+    daily = daily * seasonality[:, None] * weekday[:, future_weekdays]
+    forecast = daily.sum(axis=1)
+
+    safety_stock = z * sales[:, -28:].std(axis=1) * math.sqrt(lead_days)
+    recommended = np.ceil(forecast + safety_stock - 1e-9).astype(int)
+
+    sold = sales > 0
+    last_sale = np.where(sold.any(axis=1), days - 1 - sold[:, ::-1].argmax(axis=1), -1)
+    return {
+        'avg_7': avg_7, 'avg_28': avg_28, 'avg_91': avg_91, 'trend': trend,
+        'seasonality': seasonality, 'forecast': forecast, 'safety_stock': safety_stock,
+        'recommended': recommended, 'last_sale': last_sale,
+    }
+
+
+def build_restock_report(history_days=FORECAST_HISTORY_DAYS, horizon=FORECAST_HORIZON_DAYS, today=None):
+    """Пересчитать отчет о заготовке для всех активных товаров; вернуть {этап: секунды} и число строк"""
+    if not 1 <= horizon <= FORECAST_MAX_HORIZON_DAYS:
+        raise ValueError(f'Горизонт прогноза — от 1 до {FORECAST_MAX_HORIZON_DAYS} дней')
+    timings = {}
+    today = today or timezone.localdate()
+    first_day = today - timedelta(days=history_days)
+
+    start = time.perf_counter()
+    product_ids = list(HoneyProduct.objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True))
+    # Сегодняшний день не закончился — в историю не входит
+    sales = daily_sales(product_ids, first_day, today)
+    timings['выборка'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = forecast_demand(sales, first_day, horizon=horizon)
+    timings['расчет'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns = {name: values.tolist() for name, values in result.items()}
+    rows = []
+    for i, product_id in enumerate(product_ids):
+        last_sale = columns['last_sale'][i]
+        rows.append(RestockForecast(
+            product_id=product_id,
+            avg_7=columns['avg_7'][i], avg_28=columns['avg_28'][i], avg_91=columns['avg_91'][i],
+            trend=columns['trend'][i], seasonality=columns['seasonality'][i],
+            forecast=columns['forecast'][i], safety_stock=columns['safety_stock'][i],
+            recommended=columns['recommended'][i], horizon_days=horizon,
+            last_sale=first_day + timedelta(days=last_sale) if last_sale >= 0 else None,
+        ))
+    with transaction.atomic():
+        RestockForecast.objects.all().delete()
+        RestockForecast.objects.bulk_create(rows, batch_size=1000)
+    timings['запись'] = time.perf_counter() - start
+    return timings, len(rows)
@@ -2,7 +2,8 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from .models import UserProfile, Order
+from .excursions import EXCURSION_MAX_SEATS_PER_BOOKING
+from .models import ExcursionBooking, UserProfile, Order
 
 class UserRegistrationForm(UserCreationForm):
     """Форма регистрации пользователя"""
@@ -81,11 +82,9 @@ class UserRegistrationForm(UserCreationForm):
         user.last_name = self.cleaned_data['last_name']
         if commit:
             user.save()
-            # Создаем профиль пользователя
-            UserProfile.objects.create(
-                user=user,
-                phone=self.cleaned_data.get('phone')
-            )
+            # Профиль создан сигналом при сохранении пользователя, заполняем телефон
+            user.userprofile.phone = self.cleaned_data.get('phone')
+            user.userprofile.save(update_fields=['phone'])
         return user
 
 class UserLoginForm(AuthenticationForm):
@@ -236,3 +235,22 @@ class OrderForm(forms.ModelForm):
             if not re.match(r'^\d{6}$', postal_code):
                 raise ValidationError('Почтовый индекс должен содержать 6 цифр')
         return postal_code
+
+
+class ExcursionBookingForm(forms.ModelForm):
+    """Форма записи на экскурсию"""
+    class Meta:
+        model = ExcursionBooking
+        fields = ('seats', 'phone', 'comment')
+        labels = {'seats': 'Сколько человек'}
+        widgets = {
+            'seats': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'max': EXCURSION_MAX_SEATS_PER_BOOKING}),
+            'phone': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '+7 (999) 999-99-99'}),
+            'comment': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Например: с нами двое детей'}),
+        }
+
+    def clean_seats(self):
+        seats = self.cleaned_data['seats']
+        if not 1 <= seats <= EXCURSION_MAX_SEATS_PER_BOOKING:
+            raise ValidationError(f'Можно записать от 1 до {EXCURSION_MAX_SEATS_PER_BOOKING} человек')
+        return seats
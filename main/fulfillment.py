@@ -0,0 +1,154 @@
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderStatusLog
+
+# Допустимые переходы статуса заказа
+TRANSITIONS = {
+    'pending': ('processing', 'cancelled'),
+    # processing -> pending: упаковщик вернул заказ в очередь
+    'processing': ('shipped', 'cancelled', 'pending'),
+    'shipped': ('delivered',),
+    'delivered': (),
+    'cancelled': (),
+}
+
+# Сколько кандидатов рассматривать на каждый захватываемый заказ: упаковщики,
+# пришедшие одновременно, выбирают случайные заказы из окна и реже сталкиваются
+CLAIM_WINDOW_FACTOR = getattr(settings, 'FULFILLMENT_CLAIM_WINDOW_FACTOR', 4)
+CLAIM_ATTEMPTS = 3
+# Сколько заказов упаковщик берет за раз по умолчанию и максимум
+FULFILLMENT_CLAIM_LIMIT = getattr(settings, 'FULFILLMENT_CLAIM_LIMIT', 5)
+FULFILLMENT_CLAIM_LIMIT_MAX = 50
+
+STATUS_LABELS = dict(Order.ORDER_STATUS_CHOICES)
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, ())
+
+
+def sources_for(to_status):
+    """Статусы, из которых можно перейти в to_status"""
+    return [status for status, targets in TRANSITIONS.items() if to_status in targets]
+
+
+def _status_updates(to_status, now, packer=None):
+    updates = {'status': to_status, 'updated_at': now}
+    if to_status == 'pending':
+        updates.update(packer='', claimed_at=None)
+    elif packer is not None:
+        updates.update(packer=packer, claimed_at=now)
+    return updates
+
+
+def _log(order_ids, from_status, to_status, user=None, packer='', comment=''):
+    OrderStatusLog.objects.bulk_create([
+        OrderStatusLog(
+            order_id=order_id, from_status=from_status, to_status=to_status,
+            user=user, packer=packer, comment=comment,
+        )
+        for order_id in order_ids
+    ])
+
+
+def transition(order, to_status, user=None, comment=''):
+    """
+    Перевести заказ в to_status.
+
+    Условный UPDATE (status = текущий) не даст перезаписать статус,
+    который успел изменить кто-то другой: тогда InvalidTransition.
+    """
+    from_status = order.status
+    if not can_transition(from_status, to_status):
+        raise InvalidTransition(
+            f'Заказ #{order.order_number}: нельзя перейти из «{STATUS_LABELS[from_status]}» '
+            f'в «{STATUS_LABELS.get(to_status, to_status)}»'
+        )
+    now = timezone.now()
+    updates = _status_updates(to_status, now)
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order.pk, status=from_status).update(**updates):
+            raise InvalidTransition(f'Статус заказа #{order.order_number} уже изменен')
+        _log([order.pk], from_status, to_status, user=user, packer=order.packer, comment=comment)
+    for name, value in updates.items():
+        setattr(order, name, value)
+    return order
+
+
+def bulk_transition(queryset, to_status, user=None, comment=''):
+    """
+    Перевести все подходящие заказы queryset в to_status.
+
+    На каждый исходный статус — один условный UPDATE; свои строки потом находятся
+    по отметке updated_at этого вызова. Возвращает (переведено, пропущено).
+    """
+    # Упаковщик нужен для журнала, а при возврате в очередь UPDATE его сотрет
+    packers = dict(queryset.values_list('pk', 'packer'))
+    remaining = set(packers)
+    now = timezone.now()
+    with transaction.atomic():
+        for from_status in sources_for(to_status):
+            if not Order.objects.filter(pk__in=remaining, status=from_status).update(**_status_updates(to_status, now)):
+                continue
+            changed = set(
+                Order.objects.filter(pk__in=remaining, status=to_status, updated_at=now).values_list('pk', flat=True)
+            )
+            OrderStatusLog.objects.bulk_create([
+                OrderStatusLog(order_id=pk, from_status=from_status, to_status=to_status,
+                               user=user, packer=packers[pk], comment=comment)
+                for pk in sorted(changed)
+            ])
+            remaining -= changed
+    return len(packers) - len(remaining), len(remaining)
+
+
+def claim_orders(packer, limit=FULFILLMENT_CLAIM_LIMIT):
+    """
+    Взять в сборку до limit самых старых заказов в статусе pending.
+
+    Как в очереди задач: кандидаты выбираются без блокировок, захват — условный
+    UPDATE (status = pending). Заказ, который уже забрал другой упаковщик, UPDATE
+    не затронет, поэтому два упаковщика один заказ не получат.
+    """
+    claimed = []
+    for _ in range(CLAIM_ATTEMPTS):
+        wanted = limit - len(claimed)
+        window = list(
+            Order.objects.filter(status='pending')
+            .order_by('created_at', 'id')
+            .values_list('pk', flat=True)[:wanted * CLAIM_WINDOW_FACTOR]
+        )
+        if not window:
+            break
+        candidates = random.sample(window, min(wanted, len(window)))
+        now = timezone.now()
+        with transaction.atomic():
+            updated = Order.objects.filter(pk__in=candidates, status='pending').update(
+                **_status_updates('processing', now, packer=packer),
+            )
+            if updated:
+                batch = list(Order.objects.filter(packer=packer, claimed_at=now, status='processing'))
+                _log([order.pk for order in batch], 'pending', 'processing', packer=packer)
+                claimed += batch
+        if len(claimed) >= limit:
+            break
+    return sorted(claimed, key=lambda order: (order.created_at, order.pk))
+
+
+def packer_orders(packer):
+    """Заказы, которые упаковщик собирает сейчас"""
+    return Order.objects.filter(packer=packer, status='processing').order_by('claimed_at', 'id')
+
+
+def release_orders(packer, user=None):
+    """Вернуть в очередь все незавершенные заказы упаковщика"""
+    moved, _ = bulk_transition(packer_orders(packer), 'pending', user=user, comment='Возврат в очередь')
+    return moved
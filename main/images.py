@@ -0,0 +1,79 @@
+import os
+import tempfile
+from functools import lru_cache
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image
+
+# Ширины уменьшенных копий: половина, карточка (369px) и карточка на экранах 2x
+IMAGE_DERIVATIVE_WIDTHS = tuple(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (184, 369, 738)))
+IMAGE_DERIVATIVES_DIR = 'derivatives'
+
+
+@lru_cache(maxsize=None)
+def _url_prefix(width):
+    return reverse('image_derivative', args=[width, 'x'])[:-1]
+
+
+def derivative_url(name, width):
+    """URL копии шириной width; сама копия создается при первом запросе"""
+    return _url_prefix(width) + quote(name)
+
+
+def derivative_urls(name):
+    """{'original': URL, '<ширина>': URL, ...} для изображения или None"""
+    if not name:
+        return None
+    urls = {'original': default_storage.url(name)}
+    for width in IMAGE_DERIVATIVE_WIDTHS:
+        urls[str(width)] = derivative_url(name, width)
+    return urls
+
+
+def source_name(name):
+    """
+    Имя исходника в каноническом виде или None, если делать копию нельзя.
+
+    Копии копий (derivatives/...) и другие написания того же пути («./a.jpg», «b/../a.jpg»)
+    отклоняются: иначе каждый такой запрос создавал бы на диске новый файл.
+    """
+    normalized = os.path.normpath(name).replace(os.sep, '/')
+    if normalized != name or normalized.split('/', 1)[0] in (IMAGE_DERIVATIVES_DIR, '..'):
+        return None
+    return normalized
+
+
+def derivative_path(name, width):
+    return os.path.join(settings.MEDIA_ROOT, IMAGE_DERIVATIVES_DIR, str(width), name)
+
+
+def ensure_derivative(source, name, width):
+    """
+    Путь к копии шириной width (без увеличения), пересоздается, если исходник новее.
+
+    Запись в уникальный временный файл и os.replace: параллельный запрос или поток
+    не увидит недописанный файл и не пишет в тот же временный.
+    """
+    path = derivative_path(name, width)
+    try:
+        if os.stat(path).st_mtime >= os.stat(source).st_mtime:
+            return path
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as tmp:
+        tmp_path = tmp.name
+    try:
+        with Image.open(source) as image:
+            image_format = image.format
+            if image.width > width:
+                image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            image.save(tmp_path, format=image_format, optimize=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
@@ -0,0 +1,123 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from .forms import OrderForm
+from .models import Order, OrderItem, allocate_order_numbers
+from .productcache import products
+
+# Максимальный размер пачки за один запрос/транзакцию
+BULK_ORDERS_MAX_BATCH = getattr(settings, 'BULK_ORDERS_MAX_BATCH', 1000)
+
+
+class BatchValidationError(Exception):
+    """Пачка отклонена целиком; errors — {индекс заказа: {поле: [ошибки]}}"""
+    def __init__(self, errors):
+        super().__init__('Пачка заказов не прошла проверку')
+        self.errors = errors
+
+
+def _parse_items(raw_items):
+    """Разобрать позиции заказа в [(product_id, quantity)] и список ошибок"""
+    if not isinstance(raw_items, list) or not raw_items:
+        return [], ['Заказ должен содержать хотя бы одну позицию']
+    items, errors = [], []
+    for position, raw in enumerate(raw_items):
+        try:
+            product_id = int(raw['product_id'])
+            quantity = int(raw.get('quantity', 1))
+        except (TypeError, KeyError, ValueError):
+            errors.append(f'Позиция {position}: нужны целые product_id и quantity')
+            continue
+        if quantity < 1:
+            errors.append(f'Позиция {position}: количество должно быть положительным')
+            continue
+        items.append((product_id, quantity))
+    return items, errors
+
+
+def validate_batch(batch):
+    """
+    Проверить всю пачку сразу.
+
+    Поля заказа проверяются той же OrderForm, что и на сайте, а все товары
+    пачки берутся из кеша товаров (промахи — одним запросом). Возвращает
+    [(cleaned_data, items)] с ценами из каталога или бросает BatchValidationError.
+    """
+    if not isinstance(batch, list) or not batch:
+        raise BatchValidationError({'batch': ['Ожидается непустой список заказов']})
+    if len(batch) > BULK_ORDERS_MAX_BATCH:
+        raise BatchValidationError({'batch': [f'Не больше {BULK_ORDERS_MAX_BATCH} заказов за раз']})
+
+    errors = {}
+    parsed = []
+    product_ids = set()
+    for index, raw in enumerate(batch):
+        if not isinstance(raw, dict):
+            errors[index] = {'__all__': ['Заказ должен быть объектом']}
+            continue
+        form = OrderForm(data=raw)
+        items, item_errors = _parse_items(raw.get('items'))
+        order_errors = {} if form.is_valid() else {
+            field: list(messages) for field, messages in form.errors.items()
+        }
+        if item_errors:
+            order_errors['items'] = item_errors
+        if order_errors:
+            errors[index] = order_errors
+            continue
+        parsed.append((index, form.cleaned_data, items))
+        product_ids.update(product_id for product_id, _ in items)
+
+    prices = {pk: product.price for pk, product in products.get_many_active(product_ids).items()}
+
+    validated = []
+    for index, cleaned_data, items in parsed:
+        missing = sorted({product_id for product_id, _ in items if product_id not in prices})
+        if missing:
+            errors[index] = {'items': [f'Товар не найден или неактивен: {product_id}' for product_id in missing]}
+            continue
+        validated.append((cleaned_data, [
+            (product_id, quantity, prices[product_id]) for product_id, quantity in items
+        ]))
+
+    if errors:
+        raise BatchValidationError(errors)
+    return validated
+
+
+def ingest_orders(batch, user):
+    """
+    Создать заказы пачкой от имени user.
+
+    Вся пачка — одна транзакция: номера выделяются одним диапазоном,
+    заказы и позиции вставляются через bulk_create. Возвращает список заказов.
+    """
+    validated = validate_batch(batch)
+
+    with transaction.atomic():
+        numbers = allocate_order_numbers(len(validated))
+        orders = []
+        for order_number, (cleaned_data, items) in zip(numbers, validated):
+            orders.append(Order(
+                user=user,
+                order_number=order_number,
+                total_amount=sum((quantity * price for _, quantity, price in items), Decimal('0')),
+                **cleaned_data,
+            ))
+        Order.objects.bulk_create(orders, batch_size=500)
+
+        if orders and orders[0].pk is None:
+            # Бэкенды без RETURNING: подтягиваем id по уникальным номерам
+            ids = dict(Order.objects.filter(order_number__in=numbers).values_list('order_number', 'id'))
+            for order in orders:
+                order.pk = ids[order.order_number]
+
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, quantity=quantity, price=price)
+            for order, (_, items) in zip(orders, validated)
+            for product_id, quantity, price in items
+        ], batch_size=1000)
+
+    return orders
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.archive import ORDER_ARCHIVE_AFTER_MONTHS, ORDER_ARCHIVE_BATCH_SIZE, archive_orders, restore_orders
+from main.models import ArchivedOrder, Order
+from main.retention import RETENTION_BATCH_PAUSE
+
+
+class Command(BaseCommand):
+    help = (
+        'Перенести закрытые (доставленные и отмененные) заказы старше N месяцев в архивные таблицы '
+        'или вернуть заказы из архива (--restore)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=ORDER_ARCHIVE_AFTER_MONTHS)
+        parser.add_argument('--batch-size', type=int, default=ORDER_ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=RETENTION_BATCH_PAUSE, help='Пауза между пачками, сек')
+        parser.add_argument('--restore', nargs='+', metavar='ORDER_NUMBER',
+                            help='Номера заказов, которые нужно вернуть из архива')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            archived = ArchivedOrder.objects.filter(order_number__in=options['restore'])
+            missing = set(options['restore']) - {order.order_number for order in archived}
+            if missing:
+                raise CommandError(f'В архиве нет заказов: {", ".join(sorted(missing))}')
+            self.stdout.write(f'Восстановлено заказов: {restore_orders(archived)}')
+            return
+
+        if options['months'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--months и --batch-size должны быть положительными')
+        result = archive_orders(options['months'], options['batch_size'], options['pause'])
+        self.stdout.write(
+            f'В архив перенесено заказов: {result.deleted.get(Order._meta.db_table, 0)} '
+            f'(пачек: {result.batches}, самая долгая транзакция: {result.longest_batch * 1000:.1f} мс)'
+        )
+        self.stdout.write(f'В рабочей таблице: {Order.objects.count()}, в архиве: {ArchivedOrder.objects.count()}')
@@ -0,0 +1,104 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.utils.text import compress_string
+
+from main.compression import BROTLI_DYNAMIC_QUALITY, brotli
+from main.conditional import invalidate_catalog_version
+from main.models import HoneyProduct, WaxCandle
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Замерить размер ответа и время рендеринга страниц каталога '
+        'на синтетическом каталоге (данные откатываются после замера)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--products', type=int, default=500)
+        parser.add_argument('-r', '--repeat', type=int, default=20)
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='URL для замера (можно несколько), по умолчанию /products/ и /candles/')
+
+    def _fill_catalog(self, count):
+        for model in (HoneyProduct, WaxCandle):
+            products = [
+                model(
+                    title=f'Товар {n}',
+                    short_description='Натуральный продукт с пасеки',
+                    detailed_description='Описание ' * 20,
+                    price=300 + n % 700,
+                    weight=f'{250 * (1 + n % 4)}г',
+                    image=f'bench/{n}.png',
+                    is_featured=n % 10 == 0,
+                )
+                for n in range(count)
+            ]
+            # bulk_create не вызывает save(), вес нормализуем сами
+            for product in products:
+                product.normalize_weight()
+            model.objects.bulk_create(products, batch_size=500)
+
+    def _measure(self, client, path, repeat, encoding):
+        timings = []
+        response = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(path, HTTP_ACCEPT_ENCODING=encoding)
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{path}: статус {response.status_code}')
+        body = response.getvalue() if response.streaming else response.content
+        return body, response.get('Content-Encoding', 'identity'), timings
+
+    def _compression_cost(self, body, repeat=10):
+        """Чистое время CPU на сжатие тела теми же параметрами, что у CompressionMiddleware"""
+        compressors = {'gzip': compress_string}
+        if brotli is not None:
+            compressors['br'] = lambda data: brotli.compress(data, quality=BROTLI_DYNAMIC_QUALITY)
+        for name, compress in compressors.items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                compress(body)
+            self.stdout.write(f'{"":<24} сжатие {name}: {(time.perf_counter() - start) * 1000 / repeat:.2f} мс CPU')
+
+    def handle(self, *args, **options):
+        if options['products'] < 1 or options['repeat'] < 1:
+            raise CommandError('--products и --repeat должны быть положительными')
+        paths = options['paths'] or ['/products/', '/candles/']
+        # Размер «на проводе» и цена сжатия: разница медиан с identity
+        encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+
+        try:
+            with transaction.atomic():
+                self._fill_catalog(options['products'])
+                # Host из ALLOWED_HOSTS: с testserver по умолчанию каждый ответ — 400
+                client = Client(HTTP_HOST='localhost')
+                user = User.objects.create_user('bench-catalog')
+                for label, login in (('аноним', False), ('вошедший', True)):
+                    if login:
+                        client.force_login(user)
+                    for path in paths:
+                        for encoding in encodings:
+                            body, used, timings = self._measure(client, path, options['repeat'], encoding)
+                            self.stdout.write(
+                                f'{path:<14} {label:<9} {used:<8} {len(body):>9} байт  '
+                                f'медиана {statistics.median(timings):7.1f} мс  '
+                                f'p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:7.1f} мс'
+                            )
+                            if used == 'identity':
+                                self._compression_cost(body)
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            for model in (HoneyProduct, WaxCandle):
+                invalidate_catalog_version(model)
@@ -0,0 +1,134 @@
+import multiprocessing
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+BENCH_USERNAME_PREFIX = 'bench-excursion-'
+BENCH_SLOT_TITLE = 'Замер записи на экскурсии'
+
+
+def booker_process(user_id, slot_ids, max_seats, start, results):
+    """Покупатель в отдельном процессе: по сигналу пытается записаться на каждое время"""
+    import django
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.db import OperationalError
+    from main.excursions import BookingError, book_slot
+
+    user = User.objects.get(pk=user_id)
+    rng = random.Random(user_id)
+    booked = refused = errors = 0
+    start.wait()
+    for slot_id in slot_ids:
+        seats = rng.randint(1, max_seats)
+        while True:
+            try:
+                book_slot(user, slot_id, seats, '+70000000000')
+                booked += seats
+            except BookingError:
+                refused += 1
+            except OperationalError:
+                # SQLite: database is locked — повторяем, как повторил бы пользователь
+                errors += 1
+                continue
+            break
+    results.put((user_id, booked, refused, errors))
+
+
+class Command(BaseCommand):
+    help = 'Проверить запись на экскурсии под нагрузкой: много покупателей одновременно разбирают последние места'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-b', '--bookers', type=int, default=32, help='Покупателей (процессов)')
+        parser.add_argument('-s', '--slots', type=int, default=3)
+        parser.add_argument('-c', '--capacity', type=int, default=20, help='Мест на каждое время')
+        parser.add_argument('--max-seats', type=int, default=3, help='Мест в одной записи: случайно от 1 до N')
+        parser.add_argument('--yes', action='store_true',
+                            help='Подтвердить запуск на рабочей базе (без DEBUG): команда создает и удаляет пользователей и времена')
+
+    def handle(self, *args, **options):
+        from datetime import timedelta
+
+        from django.conf import settings
+        from django.contrib.auth.models import User
+        from django.db import connections
+        from django.utils import timezone
+        from main.excursions import EXCURSION_LISTING_DAYS, EXCURSION_MAX_SEATS_PER_BOOKING
+        from main.models import ExcursionBooking, ExcursionSlot
+
+        if not settings.DEBUG and not options['yes']:
+            raise CommandError('Команда пишет в настроенную базу; вне DEBUG запустите с --yes')
+        if min(options['bookers'], options['slots'], options['capacity'], options['max_seats']) < 1:
+            raise CommandError('Все параметры должны быть положительными')
+        if options['max_seats'] > EXCURSION_MAX_SEATS_PER_BOOKING:
+            raise CommandError(f'--max-seats не больше {EXCURSION_MAX_SEATS_PER_BOOKING}')
+
+        # Времена прерванного запуска. Пользователей по имени не удаляем: под шаблон
+        # мог попасть настоящий аккаунт; удаляются только созданные этим запуском
+        ExcursionBooking.objects.filter(slot__title=BENCH_SLOT_TITLE).delete()
+        ExcursionSlot.objects.filter(title=BENCH_SLOT_TITLE).delete()
+
+        # Дальше горизонта расписания: времена замера не попадают на страницу экскурсий
+        starts_at = timezone.now() + timedelta(days=EXCURSION_LISTING_DAYS + 1)
+        slots = ExcursionSlot.objects.bulk_create([
+            ExcursionSlot(title=BENCH_SLOT_TITLE, starts_at=starts_at + timedelta(hours=n), capacity=options['capacity'])
+            for n in range(options['slots'])
+        ])
+        slot_ids = [slot.pk for slot in slots]
+        run = uuid.uuid4().hex[:8]
+        users = [User.objects.create(username=f'{BENCH_USERNAME_PREFIX}{run}-{n}') for n in range(options['bookers'])]
+        try:
+            connections.close_all()
+            start = multiprocessing.Event()
+            results = multiprocessing.Queue()
+            processes = [
+                multiprocessing.Process(
+                    target=booker_process,
+                    # Каждый идет по временам в своем порядке, чтобы конкурировать за все сразу
+                    args=(user.pk, random.Random(user.pk).sample(slot_ids, len(slot_ids)), options['max_seats'],
+                          start, results),
+                )
+                for user in users
+            ]
+            for process in processes:
+                process.start()
+            # Даем процессам подняться, чтобы все начали одновременно
+            time.sleep(1)
+            began = time.perf_counter()
+            start.set()
+            stats = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - began
+
+            attempts = options['bookers'] * options['slots']
+            booked = sum(row[1] for row in stats)
+            refused = sum(row[2] for row in stats)
+            errors = sum(row[3] for row in stats)
+            self.stdout.write(
+                f'Попыток записи {attempts} за {elapsed:.2f} с ({attempts / elapsed:,.0f}/с): '
+                f'занято мест {booked}, отказов {refused}, повторов из-за блокировки {errors}'
+            )
+
+            problems = []
+            for slot in ExcursionSlot.objects.filter(pk__in=slot_ids).order_by('pk'):
+                confirmed = (ExcursionBooking.objects.filter(slot=slot, status=ExcursionBooking.STATUS_CONFIRMED)
+                             .aggregate(seats=Sum('seats'))['seats'] or 0)
+                self.stdout.write(f'Время #{slot.pk}: мест {slot.capacity}, занято {slot.seats_booked}, в записях {confirmed}')
+                if slot.seats_booked > slot.capacity:
+                    problems.append(f'#{slot.pk} перебронировано')
+                if slot.seats_booked != confirmed:
+                    problems.append(f'#{slot.pk}: счетчик мест расходится с записями')
+            if booked != sum(slot.seats_booked for slot in ExcursionSlot.objects.filter(pk__in=slot_ids)):
+                problems.append('покупатели получили не столько мест, сколько занято')
+            if problems:
+                raise CommandError('; '.join(problems))
+            self.stdout.write(self.style.SUCCESS('Перебронирования нет, счетчики мест совпадают с записями'))
+        finally:
+            ExcursionBooking.objects.filter(slot_id__in=slot_ids).delete()
+            ExcursionSlot.objects.filter(pk__in=slot_ids).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
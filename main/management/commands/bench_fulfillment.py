@@ -0,0 +1,92 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+BENCH_USERNAME = 'bench-fulfillment'
+
+
+def packer_process(packer, batch_size, results):
+    """Упаковщик в отдельном процессе: берет заказы, пока очередь не опустеет"""
+    import django
+    django.setup()
+
+    from django.db import OperationalError
+    from main.fulfillment import claim_orders
+
+    claimed = claims = errors = 0
+    while True:
+        try:
+            batch = claim_orders(packer, batch_size)
+        except OperationalError:
+            # SQLite: database is locked — повторяем, как сделал бы клиент API
+            errors += 1
+            continue
+        if not batch:
+            break
+        claims += 1
+        claimed += len(batch)
+    results.put((packer, claimed, claims, errors))
+
+
+class Command(BaseCommand):
+    help = 'Замерить очередь сборки: N упаковщиков одновременно разбирают заказы, каждый заказ — ровно одному'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--orders', type=int, default=2000)
+        parser.add_argument('-p', '--packers', type=int, default=8)
+        parser.add_argument('--batch-size', type=int, default=5)
+
+    def handle(self, *args, **options):
+        from django.contrib.auth.models import User
+        from django.db import connections
+        from main.models import Order, OrderStatusLog, allocate_order_numbers
+
+        if min(options['orders'], options['packers'], options['batch_size']) < 1:
+            raise CommandError('--orders, --packers и --batch-size должны быть положительными')
+        if Order.objects.filter(status='pending').exists():
+            raise CommandError('В очереди сборки есть настоящие заказы — запускайте замер на пустой очереди')
+
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME)
+        orders = Order.objects.filter(user=user)
+        try:
+            numbers = allocate_order_numbers(options['orders'])
+            Order.objects.bulk_create([
+                Order(user=user, order_number=number, phone='+70000000000', email='bench@example.com',
+                      address='—', city='—', postal_code='000000', total_amount=0)
+                for number in numbers
+            ], batch_size=500)
+
+            connections.close_all()
+            results = multiprocessing.Queue()
+            processes = [
+                multiprocessing.Process(target=packer_process, args=(f'bench-{n}', options['batch_size'], results))
+                for n in range(options['packers'])
+            ]
+            start = time.perf_counter()
+            for process in processes:
+                process.start()
+            stats = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - start
+
+            for packer, claimed, claims, errors in sorted(stats):
+                self.stdout.write(f'{packer:<10} заказов {claimed:>6}, захватов {claims:>5}, повторов из-за блокировки {errors}')
+            total = sum(row[1] for row in stats)
+            self.stdout.write(
+                f'Всего {total} из {options["orders"]} за {elapsed:.2f} с ({total / elapsed:,.0f} заказов/с)'
+            )
+
+            order_ids = orders.values('pk')
+            twice = (OrderStatusLog.objects.filter(order__in=order_ids, to_status='processing')
+                     .values('order').annotate(n=Count('id')).filter(n__gt=1).count())
+            left = orders.filter(status='pending').count()
+            if twice or left or total != options['orders']:
+                raise CommandError(f'Захвачено повторно: {twice}, осталось в очереди: {left}')
+            self.stdout.write(self.style.SUCCESS('Каждый заказ захвачен ровно одним упаковщиком'))
+        finally:
+            OrderStatusLog.objects.filter(order__in=orders.values('pk')).delete()
+            orders.delete()
+            user.delete()
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.models import Task
+from main.tasks import benchmark_noop
+from main.management.commands.runworker import start_workers
+
+
+class Command(BaseCommand):
+    help = 'Замерить пропускную способность очереди задач: постановка и выполнение'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--tasks', type=int, default=2000)
+        parser.add_argument('-w', '--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=50)
+
+    def _rate(self, label, count, seconds):
+        self.stdout.write(f'{label:<40} {count:>7} задач за {seconds:7.3f} с  ({count / seconds:,.0f}/с)')
+
+    def handle(self, *args, **options):
+        count = options['tasks']
+        if count < 1 or options['workers'] < 1:
+            raise CommandError('--tasks и --workers должны быть положительными')
+        if Task.objects.filter(status=Task.STATUS_QUEUED).exclude(name=benchmark_noop.name).exists():
+            raise CommandError('В очереди есть рабочие задачи — запускайте замер на пустой очереди')
+
+        benchmark = Task.objects.filter(name=benchmark_noop.name)
+        benchmark.delete()
+        try:
+            start = time.perf_counter()
+            for n in range(count):
+                benchmark_noop.delay(n)
+            self._rate('delay() по одной (autocommit)', count, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            with transaction.atomic():
+                for n in range(count):
+                    benchmark_noop.delay(n)
+            self._rate('delay() в одной транзакции', count, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            Task.objects.bulk_create([benchmark_noop.build((n,)) for n in range(count)], batch_size=500)
+            self._rate('bulk_create', count, time.perf_counter() - start)
+
+            total = benchmark.count()
+            start = time.perf_counter()
+            processes = start_workers(options['workers'], options['batch_size'], burst=True)
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - start
+
+            done = benchmark.filter(status=Task.STATUS_DONE).count()
+            if done != total:
+                self.stderr.write(f'Выполнено {done} из {total}')
+            # Каждая задача должна быть захвачена ровно один раз
+            duplicated = benchmark.filter(attempts__gt=1).count()
+            if duplicated:
+                self.stderr.write(f'Задач, захваченных повторно: {duplicated}')
+            self._rate(f"выполнение, воркеров: {options['workers']}", done, elapsed)
+        finally:
+            benchmark.delete()
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.recommendations import RECOMMENDATIONS_CHUNK_SIZE, update_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновить рекомендации «С этим покупают» по новым заказам '
+        'или пересчитать их с нуля по всем заказам, включая архив (--full)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Пересчитать все с нуля')
+        parser.add_argument('--chunk-size', type=int, default=RECOMMENDATIONS_CHUNK_SIZE,
+                            help='Заказов в одной пачке')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть положительным')
+        start = time.perf_counter()
+        stats = update_recommendations(full=options['full'], chunk_size=options['chunk_size'])
+        self.stdout.write(
+            f"Заказов: {stats['orders']}, вычтено отмененных: {stats['cancelled']} (пачек: {stats['chunks']}), "
+            f"товаров пересчитано: {stats['products']}, "
+            f"рекомендаций: {stats['recommendations']}"
+        )
+        self.stdout.write(f'Время: {time.perf_counter() - start:.2f} с')
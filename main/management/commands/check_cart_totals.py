@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+
+from main.models import Cart, cart_totals_expressions, recalculate_cart_totals
+
+
+class Command(BaseCommand):
+    help = 'Сверить сохраненные итоги корзин с позициями и текущими ценами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Пересчитать расходящиеся корзины')
+        parser.add_argument('--limit', type=int, default=50, help='Сколько расхождений вывести')
+
+    def handle(self, *args, **options):
+        expected = cart_totals_expressions()
+        mismatched = (Cart.objects
+                      .annotate(expected_count=expected['items_count'], expected_subtotal=expected['subtotal'])
+                      .filter(~Q(items_count=F('expected_count')) | ~Q(subtotal=F('expected_subtotal')))
+                      .order_by('pk'))
+
+        rows = list(mismatched.values_list(
+            'pk', 'user__username', 'items_count', 'expected_count', 'subtotal', 'expected_subtotal',
+        ))
+        for pk, username, count, expected_count, subtotal, expected_subtotal in rows[:options['limit']]:
+            self.stdout.write(
+                f'Корзина {pk} ({username}): товаров {count} вместо {expected_count}, '
+                f'сумма {subtotal} вместо {expected_subtotal:.2f}'
+            )
+        if not rows:
+            self.stdout.write(self.style.SUCCESS(f'Итоги всех корзин сходятся ({Cart.objects.count()})'))
+            return
+
+        if options['fix']:
+            fixed = recalculate_cart_totals(Cart.objects.filter(pk__in=[row[0] for row in rows]))
+            self.stdout.write(self.style.SUCCESS(f'Пересчитано корзин: {fixed}'))
+        else:
+            raise CommandError(f'Расхождений: {len(rows)} (запустите с --fix)')
@@ -0,0 +1,44 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_querysets
+from main.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить заказы с позициями в CSV или JSONL (потоково, постоянный расход памяти)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--status', choices=[code for code, _ in Order.ORDER_STATUS_CHOICES])
+        parser.add_argument('--date-from', type=date.fromisoformat, help='ГГГГ-ММ-ДД, включительно')
+        parser.add_argument('--date-to', type=date.fromisoformat, help='ГГГГ-ММ-ДД, включительно')
+        parser.add_argument('--no-archived', dest='archived', action='store_false',
+                            help='Только рабочие заказы, без перенесенных в архив (archive_orders)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+        parser.add_argument('-o', '--output', help='Файл для записи (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть положительным')
+
+        querysets = export_querysets(
+            status=options['status'],
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            archived=options['archived'],
+        )
+        generator, _ = EXPORT_FORMATS[options['format']]
+
+        if options['output']:
+            out = open(options['output'], 'w', encoding='utf-8', newline='')
+        else:
+            out = sys.stdout
+        try:
+            for chunk in generator(querysets, options['chunk_size']):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
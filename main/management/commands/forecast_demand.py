@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.forecast import FORECAST_HISTORY_DAYS, FORECAST_HORIZON_DAYS, FORECAST_MAX_HORIZON_DAYS, build_restock_report
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать прогноз спроса и отчет о заготовке (Админка → Отчет о заготовке)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history-days', type=int, default=FORECAST_HISTORY_DAYS, help='Дней истории продаж')
+        parser.add_argument('--horizon', type=int, default=FORECAST_HORIZON_DAYS, help='На сколько дней заготавливать')
+
+    def handle(self, *args, **options):
+        if options['history_days'] < 28 or not 1 <= options['horizon'] <= FORECAST_MAX_HORIZON_DAYS:
+            raise CommandError(f'--history-days должен быть не меньше 28, --horizon — от 1 до {FORECAST_MAX_HORIZON_DAYS}')
+        timings, rows = build_restock_report(options['history_days'], options['horizon'])
+        self.stdout.write(f'Товаров в отчете: {rows}')
+        self.stdout.write(', '.join(f'{stage} {seconds:.2f} с' for stage, seconds in timings.items()))
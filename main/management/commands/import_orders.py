@@ -0,0 +1,52 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from main.ingest import BULK_ORDERS_MAX_BATCH, BatchValidationError, ingest_orders
+
+
+def _read_orders(path):
+    """JSON-файл ({"orders": [...]} или список) либо JSON Lines — по заказу на строку"""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return payload.get('orders', []) if isinstance(payload, dict) else payload
+
+
+class Command(BaseCommand):
+    help = 'Загрузить оптовые/маркетплейс-заказы из файла пачками (одна транзакция на пачку)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON или JSONL с заказами')
+        parser.add_argument('--user', required=True, help='Логин, на который оформляются заказы')
+        parser.add_argument('--batch-size', type=int, default=BULK_ORDERS_MAX_BATCH)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if not 1 <= batch_size <= BULK_ORDERS_MAX_BATCH:
+            raise CommandError(f'--batch-size должен быть от 1 до {BULK_ORDERS_MAX_BATCH}')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден")
+
+        orders = _read_orders(options['path'])
+        created = 0
+        for start in range(0, len(orders), batch_size):
+            batch = orders[start:start + batch_size]
+            try:
+                created += len(ingest_orders(batch, user))
+            except BatchValidationError as e:
+                for index, errors in e.errors.items():
+                    position = start + index if isinstance(index, int) else index
+                    self.stderr.write(f'Заказ {position}: {errors}')
+                raise CommandError(
+                    f'Пачка с заказа {start} отклонена, загружено заказов: {created}'
+                )
+            self.stdout.write(f'Загружено {created}/{len(orders)}')
+
+        self.stdout.write(self.style.SUCCESS(f'Готово, создано заказов: {created}'))
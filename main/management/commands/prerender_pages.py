@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.prerender import prerender_all
+
+
+class Command(BaseCommand):
+    help = 'Отрендерить анонимные версии информационных страниц в статический HTML (запускать при деплое)'
+
+    def handle(self, *args, **options):
+        for path in prerender_all():
+            self.stdout.write(f'{path} ({path.stat().st_size} байт)')
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from main.retention import (
+    CART_RETENTION_DAYS, RETENTION_BATCH_PAUSE, RETENTION_BATCH_SIZE,
+    PurgeResult, purge_expired_sessions, purge_stale_carts, sqlite_space,
+)
+
+
+def _mb(size):
+    return f'{size / 1024 / 1024:.2f} МБ'
+
+
+class Command(BaseCommand):
+    help = (
+        'Удалить брошенные корзины и истекшие сессии небольшими пачками '
+        '(запускать по расписанию, например раз в сутки из cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=CART_RETENTION_DAYS,
+                            help='Возраст брошенной корзины в днях (по дате последнего изменения)')
+        parser.add_argument('--batch-size', type=int, default=RETENTION_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=RETENTION_BATCH_PAUSE,
+                            help='Пауза между пачками, сек')
+        parser.add_argument('--skip-carts', action='store_true')
+        parser.add_argument('--skip-sessions', action='store_true')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='SQLite: сжать файл базы после очистки (VACUUM блокирует базу целиком)')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--days и --batch-size должны быть положительными')
+
+        space_before = sqlite_space()
+        result = PurgeResult()
+        if not options['skip_carts']:
+            purge_stale_carts(options['days'], options['batch_size'], options['pause'], result)
+        if not options['skip_sessions']:
+            purge_expired_sessions(options['batch_size'], options['pause'], result)
+
+        for table, count in sorted(result.deleted.items()):
+            self.stdout.write(f'{table}: удалено {count}')
+        self.stdout.write(
+            f'Пачек: {result.batches}, самая долгая транзакция: {result.longest_batch * 1000:.1f} мс'
+        )
+
+        if space_before is None:
+            return
+        size_before, free_before = space_before
+        size_after, free_after = sqlite_space()
+        self.stdout.write(
+            f'Освобождено страниц: {_mb(free_after - free_before)} '
+            f'(переиспользуются базой, файл {_mb(size_after)})'
+        )
+        if options['vacuum']:
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+            size_vacuumed, _ = sqlite_space()
+            self.stdout.write(f'После VACUUM файл {_mb(size_vacuumed)}, возвращено {_mb(size_before - size_vacuumed)}')
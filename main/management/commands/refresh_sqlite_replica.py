@@ -0,0 +1,45 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Скопировать основную SQLite-базу в реплику для чтения (SQLITE_REPLICA_PATH). '
+        'С --interval обновляет копию периодически, как асинхронная репликация'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Период обновления в секундах; 0 — скопировать один раз')
+
+    def refresh(self, source, target):
+        """Онлайн-бэкап SQLite во временный файл и атомарная подмена копии"""
+        tmp_path = f'{target}.{os.getpid()}.tmp'
+        src = sqlite3.connect(f'file:{source}?mode=ro', uri=True)
+        dst = sqlite3.connect(tmp_path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        # Открытые соединения реплики дочитают старый файл, новые откроют свежий
+        os.replace(tmp_path, target)
+
+    def handle(self, *args, **options):
+        default = settings.DATABASES['default']
+        if default['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Команда нужна только для локальной SQLite-базы')
+        source = str(default['NAME'])
+        target = str(settings.SQLITE_REPLICA_PATH)
+
+        while True:
+            start = time.perf_counter()
+            self.refresh(source, target)
+            self.stdout.write(f'{target} обновлена за {(time.perf_counter() - start) * 1000:.0f} мс')
+            if options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,85 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Как часто главный процесс возвращает в очередь зависшие задачи
+STALE_CHECK_INTERVAL = 60
+
+
+def worker_process(worker_number, batch_size, poll_interval, burst):
+    """Точка входа дочернего процесса (модели импортируются уже после django.setup)"""
+    import django
+    django.setup()
+
+    from main.taskqueue import default_worker_id, work
+
+    stopping = []
+    def stop(signum, frame):
+        stopping.append(signum)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    work(
+        worker_id=f'{default_worker_id()}#{worker_number}',
+        batch_size=batch_size,
+        poll_interval=poll_interval,
+        burst=burst,
+        should_stop=lambda: bool(stopping),
+    )
+
+
+def start_workers(count, batch_size=10, poll_interval=1.0, burst=False):
+    """Запустить count процессов-воркеров; соединения с БД не наследуются"""
+    from django.db import connections
+    connections.close_all()
+
+    processes = []
+    for number in range(count):
+        process = multiprocessing.Process(
+            target=worker_process,
+            args=(number, batch_size, poll_interval, burst),
+            name=f'runworker-{number}',
+        )
+        process.start()
+        processes.append(process)
+    return processes
+
+
+class Command(BaseCommand):
+    help = 'Запустить N процессов, выполняющих фоновые задачи из очереди в базе данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-w', '--workers', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=10, help='Сколько задач брать за один захват')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Пауза при пустой очереди, сек')
+        parser.add_argument('--burst', action='store_true', help='Завершиться, когда очередь опустеет')
+
+    def handle(self, *args, **options):
+        from main.taskqueue import requeue_stale
+
+        if options['workers'] < 1:
+            raise CommandError('--workers должен быть положительным')
+
+        requeue_stale()
+        processes = start_workers(
+            options['workers'], options['batch_size'], options['poll_interval'], options['burst'],
+        )
+        self.stdout.write(f"Запущено воркеров: {len(processes)}")
+
+        last_stale_check = time.monotonic()
+        try:
+            while any(process.is_alive() for process in processes):
+                time.sleep(1)
+                if time.monotonic() - last_stale_check > STALE_CHECK_INTERVAL:
+                    requeue_stale()
+                    last_stale_check = time.monotonic()
+        except KeyboardInterrupt:
+            self.stdout.write('Останавливаем воркеров...')
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                process.join()
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from main.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Показать, куда уходит время холодного старта: этапы прогрева и время первых запросов. '
+        'Запустите с --no-warmup для сравнения с непрогретым процессом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-warmup', action='store_true', help='Не прогревать, только первые запросы')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='URL первого запроса (можно несколько)')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/', '/products/', '/candles/', '/about/']
+
+        if not options['no_warmup']:
+            report = warm_up()
+            total = sum(seconds for _, seconds, _ in report)
+            for name, seconds, detail in report:
+                share = seconds / total * 100 if total else 0
+                self.stdout.write(f'{name:<10} {seconds * 1000:8.1f} мс  {share:5.1f}%  {detail}')
+            self.stdout.write(f'{"итого":<10} {total * 1000:8.1f} мс')
+            self.stdout.write('')
+
+        # Host из ALLOWED_HOSTS: с testserver по умолчанию страницы отвечают 400
+        client = Client(HTTP_HOST='localhost')
+        for path in paths:
+            timings = []
+            for _ in range(2):
+                start = time.perf_counter()
+                response = client.get(path)
+                timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f'{path}: статус {response.status_code}')
+            self.stdout.write(
+                f'{path:<14} статус {response.status_code}  первый запрос {timings[0]:7.1f} мс, '
+                f'повторный {timings[1]:7.1f} мс'
+            )
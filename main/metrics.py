@@ -0,0 +1,311 @@
+import atexit
+import contextvars
+import glob
+import os
+import pickle
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+METRICS_ENABLED = getattr(settings, 'METRICS_ENABLED', True)
+# Каталог для режима нескольких процессов: каждый процесс сбрасывает туда свои значения,
+# /metrics суммирует файлы всех процессов. Пусто — считаются только значения своего процесса
+METRICS_DIR = getattr(settings, 'METRICS_DIR', None)
+# Как часто (секунд) процесс сбрасывает значения в файл
+METRICS_FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 1)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_registry = {}
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+
+
+class Counter:
+    """Счетчик с метками; значения — dict кортеж меток -> число"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        _registry[name] = self
+
+    def inc(self, labels=(), amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def merge(self, total, values):
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0) + value
+
+    def samples(self, values):
+        for labels, value in sorted(values.items()):
+            yield self.name, self.labelnames, labels, value
+
+
+class Histogram:
+    """
+    Гистограмма с метками: на каждый набор меток — счетчики корзин, сумма и число наблюдений.
+
+    Корзины хранятся не накопленными (bisect находит одну), накапливаются при выводе.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        _registry[name] = self
+
+    def observe(self, value, labels=()):
+        position = bisect_left(self.buckets, value)
+        with _lock:
+            row = self.values.get(labels)
+            if row is None:
+                # [корзины..., +Inf, сумма]; число наблюдений — сумма корзин
+                row = self.values[labels] = [0] * (len(self.buckets) + 2)
+            row[position] += 1
+            row[-1] += value
+
+    def merge(self, total, values):
+        for labels, row in values.items():
+            current = total.get(labels)
+            if current is None:
+                total[labels] = list(row)
+            else:
+                for i, value in enumerate(row):
+                    current[i] += value
+
+    def samples(self, values):
+        bucket_labelnames = self.labelnames + ('le',)
+        for labels, row in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), row):
+                cumulative += count
+                yield f'{self.name}_bucket', bucket_labelnames, labels + (_format_bound(bound),), cumulative
+            yield f'{self.name}_sum', self.labelnames, labels, row[-1]
+            yield f'{self.name}_count', self.labelnames, labels, cumulative
+
+
+def _format_bound(bound):
+    return bound if isinstance(bound, str) else repr(float(bound))
+
+
+REQUEST_SECONDS = Histogram(
+    'hive_http_request_duration_seconds', 'Время ответа до передачи тела', ('view', 'method', 'status'),
+)
+REQUEST_QUERIES = Histogram(
+    'hive_http_request_db_queries', 'Запросов к базе за HTTP-запрос', ('view',), QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    'hive_http_request_db_seconds', 'Время в базе за HTTP-запрос', ('view',), QUERY_BUCKETS + (2.5, 5),
+)
+QUERY_SECONDS = Histogram('hive_db_query_duration_seconds', 'Время одного запроса к базе', ('alias',), QUERY_BUCKETS)
+CACHE_REQUESTS = Counter('hive_cache_requests_total', 'Обращения к кешам приложения', ('cache', 'result'))
+ORDERS_CREATED = Counter('hive_orders_created_total', 'Созданные заказы', ('source',))
+CART_ADDS = Counter('hive_cart_adds_total', 'Добавления товара в корзину')
+LOGIN_FAILURES = Counter('hive_login_failures_total', 'Неудачные попытки входа')
+
+# Доступ к /metrics: с заголовком Authorization: Bearer <METRICS_TOKEN> или с этих адресов.
+# Адреса по умолчанию не разрешены: за прокси на той же машине все запросы приходят с 127.0.0.1
+METRICS_ALLOWED_IPS = tuple(getattr(settings, 'METRICS_ALLOWED_IPS', ()))
+METRICS_TOKEN = getattr(settings, 'METRICS_TOKEN', None)
+
+
+def cache_result(cache, hit, amount=1):
+    if amount:
+        CACHE_REQUESTS.inc((cache, 'hit' if hit else 'miss'), amount)
+
+
+# ------------------------- запросы к базе -------------------------
+# [число запросов, время] текущего HTTP-запроса; None вне запроса
+_request_db = contextvars.ContextVar('hive_request_db', default=None)
+
+
+def _observe_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        QUERY_SECONDS.observe(elapsed, (context['connection'].alias,))
+        stats = _request_db.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+
+def _install_query_wrapper(sender, connection, **kwargs):
+    # Обертка ставится один раз на объект соединения и переживает переподключения
+    if METRICS_ENABLED and _observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_observe_query)
+
+
+connection_created.connect(_install_query_wrapper)
+
+
+# ------------------------- несколько процессов -------------------------
+_process = {'file': None, 'flusher': None}
+
+
+def _snapshot():
+    with _lock:
+        return {
+            name: {labels: list(value) if isinstance(value, list) else value for labels, value in metric.values.items()}
+            for name, metric in _registry.items()
+        }
+
+
+def _process_file():
+    # pid и случайный суффикс: файл процесса с тем же pid после перезапуска не затирается
+    if _process['file'] is None:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        _process['file'] = os.path.join(METRICS_DIR, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.metrics')
+    return _process['file']
+
+
+def flush():
+    """Записать значения процесса в его файл (атомарно: читатель не увидит половину файла)"""
+    if not METRICS_DIR:
+        return
+    with _flush_lock:
+        path = _process_file()
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(_snapshot(), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def ensure_flusher():
+    """Фоновый поток сброса в файл: значения уходят, даже если процесс простаивает"""
+    if METRICS_DIR and _process['flusher'] is None:
+        with _lock:
+            if _process['flusher'] is None:
+                _process['flusher'] = threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True)
+                _process['flusher'].start()
+                atexit.register(flush)
+
+
+def _reset_after_fork():
+    # Значения, набранные до fork (gunicorn --preload, прогрев), уже учтены родителем.
+    # Блокировки создаются заново: в момент fork их мог держать другой поток
+    global _lock, _flush_lock
+    _lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    for metric in _registry.values():
+        metric.values = {}
+    _process.update(file=None, flusher=None)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def collect():
+    """{имя метрики: значения} — сумма по всем процессам (или значения своего процесса)"""
+    if not METRICS_DIR:
+        return _snapshot()
+    flush()
+    totals = {name: {} for name in _registry}
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.metrics')):
+        try:
+            with open(path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            continue
+        for name, values in snapshot.items():
+            if name in _registry:
+                _registry[name].merge(totals[name], values)
+    return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition():
+    """Текст в формате Prometheus (text exposition 0.0.4)"""
+    totals = collect()
+    lines = []
+    for name, metric in _registry.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for sample, labelnames, labels, value in metric.samples(totals.get(name, {})):
+            if labelnames:
+                pairs = ','.join(f'{key}="{_escape(val)}"' for key, val in zip(labelnames, labels))
+                lines.append(f'{sample}{{{pairs}}} {_format_value(value)}')
+            else:
+                lines.append(f'{sample} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# ------------------------- middleware -------------------------
+class MetricsMiddleware:
+    """
+    Время ответа, число запросов к базе и время в базе по имени URL и статусу.
+
+    Стоит первым, чтобы учитывать и ответы других middleware (статика, готовые страницы).
+    Ответы без URL-маршрута помечаются по тому, кто их отдал.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.static_prefixes = tuple(
+            (prefix, label) for prefix, label in ((settings.STATIC_URL, 'static'), (settings.MEDIA_URL, 'media'))
+            if prefix
+        )
+
+    def _view_label(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            return match.view_name
+        page = getattr(request, 'prerendered_page', None)
+        if page is not None:
+            return page
+        path = request.path_info
+        for prefix, label in self.static_prefixes:
+            if path.startswith(prefix):
+                return label
+        return 'unresolved'
+
+    def __call__(self, request):
+        if not METRICS_ENABLED:
+            return self.get_response(request)
+        ensure_flusher()
+        stats = [0, 0.0]
+        token = _request_db.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_db.reset(token)
+        view = self._view_label(request)
+        REQUEST_SECONDS.observe(elapsed, (view, request.method, str(response.status_code)))
+        REQUEST_QUERIES.observe(stats[0], (view,))
+        REQUEST_DB_SECONDS.observe(stats[1], (view,))
+        return response
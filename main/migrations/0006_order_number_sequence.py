@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:03
+
+from django.db import migrations, models
+
+
+def create_order_sequence(apps, schema_editor):
+    OrderNumberSequence = apps.get_model('main', 'OrderNumberSequence')
+    OrderNumberSequence.objects.get_or_create(name='order')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_order_orderitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumberSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Последовательность')),
+                ('last_value', models.BigIntegerField(default=0, verbose_name='Последнее значение')),
+            ],
+            options={
+                'verbose_name': 'Последовательность номеров',
+                'verbose_name_plural': 'Последовательности номеров',
+            },
+        ),
+        migrations.RunPython(create_order_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_cart_totals(apps, schema_editor):
+    # Итоги существующих корзин по позициям и текущим ценам
+    Cart = apps.get_model('main', 'Cart')
+    CartItem = apps.get_model('main', 'CartItem')
+    money = models.DecimalField(max_digits=12, decimal_places=2)
+    items = CartItem.objects.filter(cart=models.OuterRef('pk')).order_by().values('cart')
+    count = items.annotate(total=models.Sum('quantity')).values('total')
+    subtotal = items.annotate(
+        total=models.Sum(models.F('quantity') * models.F('product__price'), output_field=money),
+    ).values('total')
+    Cart.objects.update(
+        items_count=Coalesce(models.Subquery(count), 0),
+        subtotal=Coalesce(models.Subquery(subtotal), models.Value(Decimal('0')), output_field=money),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_catalog_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество товаров'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Сумма'),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_missing(apps, schema_editor):
+    # Раньше профиль и корзина создавались лениво при первом обращении
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserProfile = apps.get_model('main', 'UserProfile')
+    Cart = apps.get_model('main', 'Cart')
+    without_profile = User.objects.filter(userprofile__isnull=True).values_list('pk', flat=True)
+    UserProfile.objects.bulk_create([UserProfile(user_id=pk) for pk in without_profile.iterator()], batch_size=500)
+    without_cart = User.objects.filter(cart__isnull=True).values_list('pk', flat=True)
+    Cart.objects.bulk_create([Cart(user_id=pk) for pk in without_cart.iterator()], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_fulfillment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestockForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('avg_7', models.FloatField(verbose_name='Среднее за 7 дней, шт/день')),
+                ('avg_28', models.FloatField(verbose_name='Среднее за 28 дней, шт/день')),
+                ('avg_91', models.FloatField(verbose_name='Среднее за 91 день, шт/день')),
+                ('trend', models.FloatField(verbose_name='Тренд, шт/день за день')),
+                ('seasonality', models.FloatField(verbose_name='Сезонный коэффициент')),
+                ('forecast', models.FloatField(verbose_name='Прогноз на горизонт, шт')),
+                ('safety_stock', models.FloatField(verbose_name='Страховой запас, шт')),
+                ('recommended', models.PositiveIntegerField(verbose_name='Заготовить, шт')),
+                ('horizon_days', models.PositiveSmallIntegerField(verbose_name='Горизонт, дней')),
+                ('last_sale', models.DateField(blank=True, null=True, verbose_name='Последняя продажа')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Дата расчета')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='restock_forecast', to='main.honeyproduct', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Прогноз спроса',
+                'verbose_name_plural': 'Отчет о заготовке',
+                'ordering': ['-recommended'],
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:31
+
+from django.db import migrations, models
+
+from main.weights import parse_weight_grams, price_per_kg
+
+
+def backfill_weights(apps, schema_editor):
+    # Старые записи: разобрать текстовый вес, неразобранные значения вывести для ручной правки
+    for model_name in ('HoneyProduct', 'WaxCandle'):
+        model = apps.get_model('main', model_name)
+        products = list(model.objects.only('pk', 'title', 'weight', 'price'))
+        unparsed = []
+        for product in products:
+            product.weight_grams = parse_weight_grams(product.weight)
+            product.price_per_kg = price_per_kg(product.price, product.weight_grams)
+            if product.weight_grams is None:
+                unparsed.append(product)
+        model.objects.bulk_update(products, ['weight_grams', 'price_per_kg'], batch_size=500)
+        if unparsed:
+            print(f'\n  {model._meta.verbose_name_plural}: не удалось разобрать вес у {len(unparsed)} товаров:')
+            for product in unparsed:
+                print(f'    #{product.pk} «{product.title}»: {product.weight!r}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_restock_forecast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='honeyproduct',
+            name='price_per_kg',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Цена за кг'),
+        ),
+        migrations.AddField(
+            model_name='honeyproduct',
+            name='weight_grams',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Вычисляется из поля «Вес»; пусто, если вес не удалось разобрать', null=True, verbose_name='Вес, г'),
+        ),
+        migrations.AddField(
+            model_name='waxcandle',
+            name='price_per_kg',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Цена за кг'),
+        ),
+        migrations.AddField(
+            model_name='waxcandle',
+            name='weight_grams',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Вычисляется из поля «Вес»; пусто, если вес не удалось разобрать', null=True, verbose_name='Вес, г'),
+        ),
+        migrations.AddIndex(
+            model_name='honeyproduct',
+            index=models.Index(fields=['is_active', 'weight_grams'], name='honey_active_weight_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='honeyproduct',
+            index=models.Index(fields=['is_active', 'price_per_kg'], name='honey_active_ppkg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='waxcandle',
+            index=models.Index(fields=['is_active', 'weight_grams'], name='candle_active_weight_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='waxcandle',
+            index=models.Index(fields=['is_active', 'price_per_kg'], name='candle_active_ppkg_idx'),
+        ),
+        migrations.RunPython(backfill_weights, migrations.RunPython.noop),
+    ]
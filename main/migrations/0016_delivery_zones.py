@@ -0,0 +1,78 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_normalized_weight'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryZone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Название')),
+                ('postal_prefixes', models.TextField(help_text='Через запятую или пробел, например: 101, 102, 1405. Действует самый длинный совпавший префикс; * — все остальные индексы', verbose_name='Префиксы индексов')),
+                ('free_from', models.DecimalField(blank=True, decimal_places=2, help_text='Пусто — доставка всегда платная', max_digits=10, null=True, verbose_name='Бесплатно от суммы')),
+                ('eta_min_days', models.PositiveSmallIntegerField(default=1, verbose_name='Срок от, дней')),
+                ('eta_max_days', models.PositiveSmallIntegerField(default=3, verbose_name='Срок до, дней')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активна')),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Зона доставки',
+                'verbose_name_plural': 'Зоны доставки',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='delivery_cost',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Входит в общую сумму', max_digits=10, verbose_name='Стоимость доставки'),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='delivery_eta',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Срок доставки'),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='delivery_zone',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Зона доставки'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_cost',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Входит в общую сумму', max_digits=10, verbose_name='Стоимость доставки'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_eta',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Срок доставки'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_zone',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Зона доставки'),
+        ),
+        migrations.CreateModel(
+            name='DeliveryTariff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_weight_grams', models.PositiveIntegerField(blank=True, help_text='Пусто — без ограничения веса', null=True, verbose_name='Вес до, г')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена')),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата обновления')),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tariffs', to='main.deliveryzone', verbose_name='Зона')),
+            ],
+            options={
+                'verbose_name': 'Тариф доставки',
+                'verbose_name_plural': 'Тарифы доставки',
+                'ordering': ['zone', 'max_weight_grams'],
+                'constraints': [models.UniqueConstraint(fields=('zone', 'max_weight_grams'), name='delivery_tariff_unique')],
+            },
+        ),
+    ]
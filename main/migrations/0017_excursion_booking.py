@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:40
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_delivery_zones'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExcursionSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(default='Экскурсия на пасеку', max_length=200, verbose_name='Название')),
+                ('starts_at', models.DateTimeField(verbose_name='Начало')),
+                ('duration_minutes', models.PositiveSmallIntegerField(default=90, verbose_name='Длительность, мин')),
+                ('capacity', models.PositiveSmallIntegerField(verbose_name='Мест')),
+                ('seats_booked', models.PositiveSmallIntegerField(default=0, help_text='Меняется только записью и отменой', verbose_name='Занято мест')),
+                ('price', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Цена за человека')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Запись открыта')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Время экскурсии',
+                'verbose_name_plural': 'Расписание экскурсий',
+                'ordering': ['starts_at'],
+                'indexes': [models.Index(fields=['is_active', 'starts_at'], name='excursion_slot_upcoming_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('seats_booked__lte', models.F('capacity'))), name='excursion_slot_not_overbooked')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExcursionBooking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seats', models.PositiveSmallIntegerField(verbose_name='Мест')),
+                ('phone', models.CharField(max_length=17, validators=[django.core.validators.RegexValidator(message="Номер телефона должен быть в формате: '+999999999'. До 15 цифр.", regex='^\\+?1?\\d{9,15}$')], verbose_name='Телефон')),
+                ('comment', models.CharField(blank=True, max_length=255, verbose_name='Комментарий')),
+                ('status', models.CharField(choices=[('confirmed', 'Подтверждена'), ('cancelled', 'Отменена')], default='confirmed', max_length=10, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата записи')),
+                ('cancelled_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата отмены')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='excursion_bookings', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('slot', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='bookings', to='main.excursionslot', verbose_name='Экскурсия')),
+            ],
+            options={
+                'verbose_name': 'Запись на экскурсию',
+                'verbose_name_plural': 'Записи на экскурсии',
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'confirmed')), fields=('slot', 'user'), name='excursion_booking_one_per_user')],
+            },
+        ),
+    ]
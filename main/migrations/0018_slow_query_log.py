@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_excursion_booking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True, verbose_name='Отпечаток')),
+                ('sql', models.TextField(help_text='Литералы и параметры заменены на ?', verbose_name='Запрос')),
+                ('database', models.CharField(max_length=50, verbose_name='База')),
+                ('calls', models.PositiveIntegerField(default=0, verbose_name='Медленных вызовов')),
+                ('total_ms', models.FloatField(db_index=True, default=0, verbose_name='Всего, мс')),
+                ('max_ms', models.FloatField(default=0, verbose_name='Максимум, мс')),
+                ('last_ms', models.FloatField(default=0, verbose_name='Последний, мс')),
+                ('params_shape', models.CharField(blank=True, max_length=255, verbose_name='Параметры')),
+                ('view', models.CharField(blank=True, max_length=200, verbose_name='View')),
+                ('origin', models.CharField(blank=True, max_length=255, verbose_name='Место вызова')),
+                ('stack', models.TextField(blank=True, verbose_name='Стек')),
+                ('plan', models.TextField(blank=True, verbose_name='План запроса')),
+                ('first_seen', models.DateTimeField(auto_now_add=True, verbose_name='Впервые')),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ['-total_ms'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:18
+
+from django.db import migrations, models
+
+
+def reset_pair_counts(apps, schema_editor):
+    # По отметке id нельзя точно сказать, какие заказы учтены: счетчики считаются
+    # заново первым же build_recommendations, готовые рекомендации остаются до него
+    apps.get_model('main', 'ProductPairCount').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_slow_query_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='in_recommendations',
+            field=models.BooleanField(db_index=True, default=False, editable=False, verbose_name='Учтен в рекомендациях'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='in_recommendations',
+            field=models.BooleanField(db_index=True, default=False, editable=False, verbose_name='Учтен в рекомендациях'),
+        ),
+        migrations.RunPython(reset_pair_counts, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='JobWatermark',
+        ),
+    ]
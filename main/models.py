@@ -1,8 +1,14 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from decimal import Decimal
 
+from .weights import parse_weight_grams, price_per_kg
+
 class UserProfile(models.Model):
     """Профиль пользователя"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, verbose_name="Пользователь")
@@ -41,7 +47,22 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"Профиль {self.user.username}"
 
-class HoneyProduct(models.Model):
+class NormalizedWeightMixin:
+    """Вес в граммах и цена за кг, выведенные из текстового веса; обновляются при save()"""
+    DERIVED_FIELDS = ('weight_grams', 'price_per_kg')
+
+    def normalize_weight(self):
+        self.weight_grams = parse_weight_grams(self.weight)
+        self.price_per_kg = price_per_kg(self.price, self.weight_grams)
+
+    def save(self, *args, **kwargs):
+        self.normalize_weight()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'weight', 'price'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, *self.DERIVED_FIELDS}
+        super().save(*args, **kwargs)
+
+class HoneyProduct(NormalizedWeightMixin, models.Model):
     # Основная информация
     title = models.CharField(max_length=200, verbose_name="Название продукта")
     short_description = models.CharField(
@@ -67,6 +88,21 @@ class HoneyProduct(models.Model):
         default="1000P",
         help_text="Например: 500г, 1кг, 1000P"
     )
+    weight_grams = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Вес, г",
+        help_text="Вычисляется из поля «Вес»; пусто, если вес не удалось разобрать"
+    )
+    price_per_kg = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Цена за кг"
+    )
 
     # Изображение
     image = models.ImageField(
@@ -79,16 +115,22 @@ class HoneyProduct(models.Model):
     is_active = models.BooleanField(default=True, verbose_name="Активный товар")
     is_featured = models.BooleanField(default=False, verbose_name="Рекомендуемый товар")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Дата обновления")
 
     class Meta:
         verbose_name = "Медовая продукция"
         verbose_name_plural = "Медовая продукция"
         ordering = ['-created_at']
+        indexes = [
+            # Сортировка и фильтр витрины по весу и цене за кг среди активных товаров
+            models.Index(fields=['is_active', 'weight_grams'], name='honey_active_weight_idx'),
+            models.Index(fields=['is_active', 'price_per_kg'], name='honey_active_ppkg_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.weight}"
 
-class WaxCandle(models.Model):
+class WaxCandle(NormalizedWeightMixin, models.Model):
     # Основная информация
     title = models.CharField(max_length=200, verbose_name="Название свечи")
     short_description = models.CharField(
@@ -114,6 +156,21 @@ class WaxCandle(models.Model):
         default="100г",
         help_text="Например: 50г, 100г, 200г"
     )
+    weight_grams = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Вес, г",
+        help_text="Вычисляется из поля «Вес»; пусто, если вес не удалось разобрать"
+    )
+    price_per_kg = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Цена за кг"
+    )
 
     # Изображение
     image = models.ImageField(
@@ -126,11 +183,17 @@ class WaxCandle(models.Model):
     is_active = models.BooleanField(default=True, verbose_name="Активная свеча")
     is_featured = models.BooleanField(default=False, verbose_name="Рекомендуемая свеча")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Дата обновления")
 
     class Meta:
         verbose_name = "Восковая свеча"
         verbose_name_plural = "Восковые свечи"
         ordering = ['-created_at']
+        indexes = [
+            # Сортировка и фильтр витрины по весу и цене за кг среди активных товаров
+            models.Index(fields=['is_active', 'weight_grams'], name='candle_active_weight_idx'),
+            models.Index(fields=['is_active', 'price_per_kg'], name='candle_active_ppkg_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.weight}"
@@ -138,6 +201,9 @@ class WaxCandle(models.Model):
 class Cart(models.Model):
     """Корзина пользователя"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, verbose_name="Пользователь")
+    # Итоги хранятся в корзине и меняются тем же UPDATE, что и позиции (см. методы ниже)
+    items_count = models.PositiveIntegerField(default=0, verbose_name="Количество товаров")
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Сумма")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
 
@@ -148,6 +214,69 @@ class Cart(models.Model):
     def __str__(self):
         return f"Корзина {self.user.username}"
 
+    def _apply_delta(self, product_id, delta):
+        """Сдвинуть итоги на delta штук товара одним UPDATE; цена берется из базы в том же запросе"""
+        if not delta:
+            return
+        price = Subquery(HoneyProduct.objects.filter(pk=product_id).values('price')[:1])
+        Cart.objects.filter(pk=self.pk).update(
+            items_count=F('items_count') + delta,
+            subtotal=F('subtotal') + ExpressionWrapper(Value(delta) * price, output_field=MONEY_FIELD),
+            updated_at=timezone.now(),
+        )
+
+    def add_product(self, product_id, quantity=1):
+        """Добавить товар (или увеличить его количество) вместе с итогами в одной транзакции"""
+        with transaction.atomic():
+            item, created = CartItem.objects.get_or_create(
+                cart=self, product_id=product_id, defaults={'quantity': quantity},
+            )
+            if not created:
+                CartItem.objects.filter(pk=item.pk).update(
+                    quantity=F('quantity') + quantity, updated_at=timezone.now(),
+                )
+            self._apply_delta(product_id, quantity)
+
+    def set_quantity(self, product_id, quantity):
+        """Установить количество товара (позиция создается при необходимости)"""
+        with transaction.atomic():
+            item = CartItem.objects.select_for_update().filter(cart=self, product_id=product_id).first()
+            if item is None:
+                CartItem.objects.create(cart=self, product_id=product_id, quantity=quantity)
+                old_quantity = 0
+            else:
+                CartItem.objects.filter(pk=item.pk).update(quantity=quantity, updated_at=timezone.now())
+                old_quantity = item.quantity
+            self._apply_delta(product_id, quantity - old_quantity)
+
+    def change_quantity(self, product_id, delta):
+        """Изменить количество на delta, но не меньше 1; False, если товара нет в корзине"""
+        with transaction.atomic():
+            item = CartItem.objects.select_for_update().filter(cart=self, product_id=product_id).first()
+            if item is None:
+                return False
+            quantity = max(1, item.quantity + delta)
+            CartItem.objects.filter(pk=item.pk).update(quantity=quantity, updated_at=timezone.now())
+            self._apply_delta(product_id, quantity - item.quantity)
+        return True
+
+    def remove_product(self, product_id):
+        with transaction.atomic():
+            item = CartItem.objects.select_for_update().filter(cart=self, product_id=product_id).first()
+            if item is not None:
+                item.delete()
+                self._apply_delta(product_id, -item.quantity)
+
+    def remove_items(self, item_ids):
+        """Удалить позиции (например, оформленные в заказ) и пересчитать итоги по оставшимся"""
+        with transaction.atomic():
+            CartItem.objects.filter(cart=self, pk__in=item_ids).delete()
+            self.recalculate()
+
+    def recalculate(self):
+        recalculate_cart_totals(Cart.objects.filter(pk=self.pk))
+        self.refresh_from_db(fields=['items_count', 'subtotal', 'updated_at'])
+
 class CartItem(models.Model):
     """Элемент корзины"""
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items', verbose_name="Корзина")
@@ -169,8 +298,67 @@ class CartItem(models.Model):
         """Общая стоимость элемента корзины"""
         return self.quantity * self.product.price
 
-class Order(models.Model):
-    """Заказ пользователя"""
+MONEY_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+
+def cart_totals_expressions():
+    """Итоги корзины, посчитанные заново по позициям и текущим ценам (для UPDATE/annotate)"""
+    items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    count = items.annotate(total=Sum('quantity')).values('total')
+    subtotal = items.annotate(
+        total=Sum(F('quantity') * F('product__price'), output_field=MONEY_FIELD),
+    ).values('total')
+    return {
+        'items_count': Coalesce(Subquery(count), 0),
+        'subtotal': Coalesce(Subquery(subtotal), Value(Decimal('0')), output_field=MONEY_FIELD),
+    }
+
+
+def recalculate_cart_totals(carts):
+    """Пересчитать итоги корзин из queryset одним UPDATE"""
+    return carts.update(**cart_totals_expressions())
+
+
+class OrderNumberSequence(models.Model):
+    """Счетчик номеров заказов (одна строка на последовательность)"""
+    name = models.CharField(max_length=50, primary_key=True, verbose_name="Последовательность")
+    last_value = models.BigIntegerField(default=0, verbose_name="Последнее значение")
+
+    class Meta:
+        verbose_name = "Последовательность номеров"
+        verbose_name_plural = "Последовательности номеров"
+
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
+
+
+ORDER_SEQUENCE_NAME = 'order'
+
+
+def format_order_number(value):
+    # Буква N не встречается в старых номерах (ORD- + hex), поэтому пересечений с ними нет
+    return f"ORD-N{value:09d}"
+
+
+def allocate_order_numbers(count=1):
+    """
+    Выделить count подряд идущих номеров заказов.
+
+    Счетчик увеличивается одним UPDATE ... SET last_value = last_value + count,
+    строка остается заблокированной до конца транзакции, поэтому два процесса
+    не получат один и тот же диапазон и повторять вставку при IntegrityError не нужно.
+    """
+    with transaction.atomic():
+        sequence = OrderNumberSequence.objects.filter(name=ORDER_SEQUENCE_NAME)
+        if not sequence.update(last_value=F('last_value') + count):
+            OrderNumberSequence.objects.get_or_create(name=ORDER_SEQUENCE_NAME)
+            sequence.update(last_value=F('last_value') + count)
+        last_value = sequence.values_list('last_value', flat=True).get()
+    return [format_order_number(value) for value in range(last_value - count + 1, last_value + 1)]
+
+
+class BaseOrder(models.Model):
+    """Общие поля рабочего и архивного заказа"""
     ORDER_STATUS_CHOICES = [
         ('pending', 'Ожидает обработки'),
         ('processing', 'В обработке'),
@@ -201,19 +389,47 @@ class Order(models.Model):
     
     # Стоимость
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Общая сумма")
+    delivery_cost = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, verbose_name="Стоимость доставки",
+        help_text="Входит в общую сумму"
+    )
+    delivery_zone = models.CharField(max_length=100, blank=True, verbose_name="Зона доставки")
+    delivery_eta = models.CharField(max_length=50, blank=True, verbose_name="Срок доставки")
+
+    # Сборка (см. main.fulfillment)
+    packer = models.CharField(max_length=100, blank=True, verbose_name="Упаковщик")
+    claimed_at = models.DateTimeField(null=True, blank=True, verbose_name="Взят в сборку")
+
+    # Позиции заказа учтены в совместных покупках (main.recommendations)
+    in_recommendations = models.BooleanField(default=False, db_index=True, editable=False,
+                                             verbose_name="Учтен в рекомендациях")
     
     class Meta:
-        verbose_name = "Заказ"
-        verbose_name_plural = "Заказы"
+        abstract = True
         ordering = ['-created_at']
     
     def __str__(self):
         return f"Заказ #{self.order_number} - {self.user.get_full_name()}"
+
+class Order(BaseOrder):
+    """Заказ пользователя"""
+    # Закрытые заказы, которые со временем переносятся в архив (main.archive)
+    CLOSED_STATUSES = ('delivered', 'cancelled')
+
+    class Meta(BaseOrder.Meta):
+        verbose_name = "Заказ"
+        verbose_name_plural = "Заказы"
+        indexes = [
+            # Выборка закрытых заказов для архивации
+            models.Index(fields=['status', 'updated_at'], name='order_status_updated_idx'),
+            # Очередь сборки: старые заказы в статусе pending
+            models.Index(fields=['status', 'created_at'], name='order_queue_idx'),
+            models.Index(fields=['packer', 'status'], name='order_packer_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.order_number:
-            import uuid
-            self.order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+            self.order_number = allocate_order_numbers(1)[0]
         super().save(*args, **kwargs)
 
 class OrderItem(models.Model):
@@ -233,4 +449,314 @@ class OrderItem(models.Model):
     @property
     def line_total(self):
         """Общая стоимость элемента заказа"""
-        return self.quantity * self.price
\ No newline at end of file
+        return self.quantity * self.price
+
+class DeliveryZone(models.Model):
+    """Зона доставки: почтовые индексы по префиксам (см. main.delivery)"""
+    name = models.CharField(max_length=100, verbose_name="Название")
+    postal_prefixes = models.TextField(
+        verbose_name="Префиксы индексов",
+        help_text="Через запятую или пробел, например: 101, 102, 1405. "
+                  "Действует самый длинный совпавший префикс; * — все остальные индексы"
+    )
+    free_from = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True,
+        verbose_name="Бесплатно от суммы", help_text="Пусто — доставка всегда платная"
+    )
+    eta_min_days = models.PositiveSmallIntegerField(default=1, verbose_name="Срок от, дней")
+    eta_max_days = models.PositiveSmallIntegerField(default=3, verbose_name="Срок до, дней")
+    is_active = models.BooleanField(default=True, verbose_name="Активна")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Зона доставки"
+        verbose_name_plural = "Зоны доставки"
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def prefixes(self):
+        return [prefix for prefix in self.postal_prefixes.replace(',', ' ').split() if prefix]
+
+    def clean(self):
+        prefixes = self.prefixes()
+        invalid = [prefix for prefix in prefixes if prefix != '*' and not (prefix.isdigit() and len(prefix) <= 6)]
+        if invalid:
+            raise ValidationError({'postal_prefixes': f'Префикс — от 1 до 6 цифр или *: {", ".join(invalid)}'})
+        if not prefixes:
+            raise ValidationError({'postal_prefixes': 'Укажите хотя бы один префикс'})
+        if self.eta_min_days > self.eta_max_days:
+            raise ValidationError({'eta_max_days': 'Срок «до» меньше срока «от»'})
+        if self.is_active:
+            taken = {}
+            for zone in DeliveryZone.objects.filter(is_active=True).exclude(pk=self.pk):
+                for prefix in zone.prefixes():
+                    taken[prefix] = zone.name
+            clashes = [f'{prefix} ({taken[prefix]})' for prefix in prefixes if prefix in taken]
+            if clashes:
+                raise ValidationError({'postal_prefixes': f'Префиксы уже заняты другими зонами: {", ".join(clashes)}'})
+
+class DeliveryTariff(models.Model):
+    """Цена доставки в зоне для заказа весом до max_weight_grams"""
+    zone = models.ForeignKey(DeliveryZone, on_delete=models.CASCADE, related_name='tariffs', verbose_name="Зона")
+    max_weight_grams = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name="Вес до, г", help_text="Пусто — без ограничения веса"
+    )
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Тариф доставки"
+        verbose_name_plural = "Тарифы доставки"
+        ordering = ['zone', 'max_weight_grams']
+        constraints = [
+            models.UniqueConstraint(fields=['zone', 'max_weight_grams'], name='delivery_tariff_unique'),
+        ]
+
+    def __str__(self):
+        limit = f"до {self.max_weight_grams} г" if self.max_weight_grams else "без ограничения"
+        return f"{self.zone}: {limit} — {self.price}₽"
+
+class OrderStatusLog(models.Model):
+    """Журнал переходов статуса заказа"""
+    # Без ограничения внешнего ключа: журнал переживает перенос заказа в архив и обратно
+    order = models.ForeignKey(
+        Order, on_delete=models.DO_NOTHING, db_constraint=False, related_name='status_log', verbose_name="Заказ",
+    )
+    from_status = models.CharField(max_length=20, choices=BaseOrder.ORDER_STATUS_CHOICES, verbose_name="Был статус")
+    to_status = models.CharField(max_length=20, choices=BaseOrder.ORDER_STATUS_CHOICES, verbose_name="Новый статус")
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Пользователь")
+    packer = models.CharField(max_length=100, blank=True, verbose_name="Упаковщик")
+    comment = models.CharField(max_length=255, blank=True, verbose_name="Комментарий")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата")
+
+    class Meta:
+        verbose_name = "Смена статуса заказа"
+        verbose_name_plural = "Журнал статусов заказов"
+        ordering = ['created_at', 'id']
+
+    def __str__(self):
+        return f"{self.order_id}: {self.from_status} → {self.to_status}"
+
+class ArchivedOrder(BaseOrder):
+    """Закрытый заказ, перенесенный из рабочей таблицы (id и даты сохраняются)"""
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    created_at = models.DateTimeField(db_index=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(verbose_name="Дата обновления")
+    archived_at = models.DateTimeField(default=timezone.now, verbose_name="Дата архивации")
+
+    class Meta(BaseOrder.Meta):
+        verbose_name = "Архивный заказ"
+        verbose_name_plural = "Архив заказов"
+
+class ArchivedOrderItem(models.Model):
+    """Позиция архивного заказа"""
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items', verbose_name="Заказ")
+    product = models.ForeignKey(HoneyProduct, on_delete=models.CASCADE, verbose_name="Товар")
+    quantity = models.PositiveIntegerField(verbose_name="Количество")
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена за единицу")
+
+    class Meta:
+        verbose_name = "Позиция архивного заказа"
+        verbose_name_plural = "Позиции архивных заказов"
+
+    def __str__(self):
+        return f"{self.product.title} x{self.quantity} в заказе {self.order.order_number}"
+
+    @property
+    def line_total(self):
+        return self.quantity * self.price
+
+class ProductPairCount(models.Model):
+    """Сколько заказов содержат оба товара; строка product = other — число заказов с товаром"""
+    product = models.ForeignKey(HoneyProduct, on_delete=models.CASCADE, related_name='+', verbose_name="Товар")
+    other = models.ForeignKey(HoneyProduct, on_delete=models.CASCADE, related_name='+', verbose_name="Другой товар")
+    orders = models.PositiveIntegerField(default=0, verbose_name="Заказов")
+
+    class Meta:
+        verbose_name = "Совместные покупки"
+        verbose_name_plural = "Совместные покупки"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='product_pair_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id}: {self.orders}"
+
+class ProductRecommendation(models.Model):
+    """Заранее посчитанная рекомендация «часто покупают вместе» (main.recommendations)"""
+    product = models.ForeignKey(HoneyProduct, on_delete=models.CASCADE, related_name='recommendations', verbose_name="Товар")
+    recommended = models.ForeignKey(HoneyProduct, on_delete=models.CASCADE, related_name='+', verbose_name="Рекомендуемый товар")
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+    score = models.FloatField(verbose_name="Сила связи")
+    together = models.PositiveIntegerField(verbose_name="Заказов вместе")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Дата расчета")
+
+    class Meta:
+        verbose_name = "Рекомендация"
+        verbose_name_plural = "Рекомендации «часто покупают вместе»"
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'recommended'], name='recommendation_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} → {self.recommended_id} ({self.score:.3f})"
+
+class RestockForecast(models.Model):
+    """Строка отчета о заготовке: прогноз спроса на товар (main.forecast)"""
+    product = models.OneToOneField(HoneyProduct, on_delete=models.CASCADE, related_name='restock_forecast', verbose_name="Товар")
+    avg_7 = models.FloatField(verbose_name="Среднее за 7 дней, шт/день")
+    avg_28 = models.FloatField(verbose_name="Среднее за 28 дней, шт/день")
+    avg_91 = models.FloatField(verbose_name="Среднее за 91 день, шт/день")
+    trend = models.FloatField(verbose_name="Тренд, шт/день за день")
+    seasonality = models.FloatField(verbose_name="Сезонный коэффициент")
+    forecast = models.FloatField(verbose_name="Прогноз на горизонт, шт")
+    safety_stock = models.FloatField(verbose_name="Страховой запас, шт")
+    recommended = models.PositiveIntegerField(verbose_name="Заготовить, шт")
+    horizon_days = models.PositiveSmallIntegerField(verbose_name="Горизонт, дней")
+    last_sale = models.DateField(null=True, blank=True, verbose_name="Последняя продажа")
+    computed_at = models.DateTimeField(auto_now=True, verbose_name="Дата расчета")
+
+    class Meta:
+        verbose_name = "Прогноз спроса"
+        verbose_name_plural = "Отчет о заготовке"
+        ordering = ['-recommended']
+
+    def __str__(self):
+        return f"{self.product_id}: {self.recommended} шт на {self.horizon_days} дн."
+
+class ExcursionSlot(models.Model):
+    """Время экскурсии с ограниченным числом мест (запись — main.excursions)"""
+    title = models.CharField(max_length=200, default="Экскурсия на пасеку", verbose_name="Название")
+    starts_at = models.DateTimeField(verbose_name="Начало")
+    duration_minutes = models.PositiveSmallIntegerField(default=90, verbose_name="Длительность, мин")
+    capacity = models.PositiveSmallIntegerField(verbose_name="Мест")
+    seats_booked = models.PositiveSmallIntegerField(
+        default=0, verbose_name="Занято мест", help_text="Меняется только записью и отменой"
+    )
+    price = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Цена за человека")
+    is_active = models.BooleanField(default=True, verbose_name="Запись открыта")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Время экскурсии"
+        verbose_name_plural = "Расписание экскурсий"
+        ordering = ['starts_at']
+        indexes = [
+            models.Index(fields=['is_active', 'starts_at'], name='excursion_slot_upcoming_idx'),
+        ]
+        constraints = [
+            # Последний рубеж против перебронирования, если кто-то обойдет main.excursions
+            models.CheckConstraint(condition=models.Q(seats_booked__lte=models.F('capacity')), name='excursion_slot_not_overbooked'),
+        ]
+
+    def __str__(self):
+        return f"{self.title}, {timezone.localtime(self.starts_at):%d.%m.%Y %H:%M}"
+
+    @property
+    def seats_free(self):
+        return max(self.capacity - self.seats_booked, 0)
+
+    def clean(self):
+        if self.capacity is not None and self.capacity < self.seats_booked:
+            raise ValidationError({'capacity': f'Уже занято мест: {self.seats_booked}'})
+
+class ExcursionBooking(models.Model):
+    """Запись пользователя на экскурсию"""
+    STATUS_CONFIRMED = 'confirmed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_CONFIRMED, 'Подтверждена'),
+        (STATUS_CANCELLED, 'Отменена'),
+    ]
+
+    slot = models.ForeignKey(ExcursionSlot, on_delete=models.PROTECT, related_name='bookings', verbose_name="Экскурсия")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='excursion_bookings', verbose_name="Пользователь")
+    seats = models.PositiveSmallIntegerField(verbose_name="Мест")
+    phone = models.CharField(max_length=17, validators=[UserProfile.phone_regex], verbose_name="Телефон")
+    comment = models.CharField(max_length=255, blank=True, verbose_name="Комментарий")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_CONFIRMED, verbose_name="Статус")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата записи")
+    cancelled_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата отмены")
+
+    class Meta:
+        verbose_name = "Запись на экскурсию"
+        verbose_name_plural = "Записи на экскурсии"
+        ordering = ['-created_at']
+        constraints = [
+            # Одна действующая запись пользователя на время; больше людей — больше мест в ней
+            models.UniqueConstraint(
+                fields=['slot', 'user'], condition=models.Q(status='confirmed'), name='excursion_booking_one_per_user',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} — {self.slot} ({self.seats} мест)"
+
+class SlowQuery(models.Model):
+    """Медленный запрос к базе, сгруппированный по нормализованному тексту (main.slowlog)"""
+    fingerprint = models.CharField(max_length=40, unique=True, verbose_name="Отпечаток")
+    sql = models.TextField(verbose_name="Запрос", help_text="Литералы и параметры заменены на ?")
+    database = models.CharField(max_length=50, verbose_name="База")
+    calls = models.PositiveIntegerField(default=0, verbose_name="Медленных вызовов")
+    total_ms = models.FloatField(default=0, db_index=True, verbose_name="Всего, мс")
+    max_ms = models.FloatField(default=0, verbose_name="Максимум, мс")
+    last_ms = models.FloatField(default=0, verbose_name="Последний, мс")
+    params_shape = models.CharField(max_length=255, blank=True, verbose_name="Параметры")
+    view = models.CharField(max_length=200, blank=True, verbose_name="View")
+    origin = models.CharField(max_length=255, blank=True, verbose_name="Место вызова")
+    stack = models.TextField(blank=True, verbose_name="Стек")
+    plan = models.TextField(blank=True, verbose_name="План запроса")
+    first_seen = models.DateTimeField(auto_now_add=True, verbose_name="Впервые")
+    last_seen = models.DateTimeField(default=timezone.now, verbose_name="Последний раз")
+
+    class Meta:
+        verbose_name = "Медленный запрос"
+        verbose_name_plural = "Медленные запросы"
+        ordering = ['-total_ms']
+
+    def __str__(self):
+        return f"{self.sql[:80]} ({self.calls}×, {self.total_ms:.0f} мс)"
+
+class Task(models.Model):
+    """Фоновая задача в очереди на базе данных"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Выполнена'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    name = models.CharField(max_length=200, verbose_name="Задача")
+    args = models.JSONField(default=list, blank=True, verbose_name="Аргументы")
+    kwargs = models.JSONField(default=dict, blank=True, verbose_name="Именованные аргументы")
+    priority = models.SmallIntegerField(default=0, verbose_name="Приоритет", help_text="Больше — раньше")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED, verbose_name="Статус")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name="Максимум попыток")
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Выполнить не раньше")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="Воркер")
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Взята в работу")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата завершения")
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ['-created_at']
+        indexes = [
+            # Выборка следующей задачи: status = queued, run_at <= now, по приоритету
+            models.Index(fields=['status', '-priority', 'run_at'], name='task_claim_idx'),
+            models.Index(fields=['locked_by'], name='task_locked_by_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.http import HttpResponse, HttpResponseNotModified
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.http import parse_etags
+
+from .conditional import templates_last_modified
+
+# Страницы, зависящие только от шаблона и состояния входа: имя URL -> шаблон.
+# Экскурсий здесь нет: на странице расписание со свободными местами
+PRERENDERED_PAGES = {
+    'home': 'main/index.html',
+    'about': 'main/about.html',
+    'delivery': 'main/delivery.html',
+    'contacts': 'main/contacts.html',
+}
+
+# Как часто (сек) проверять, не изменились ли шаблоны
+PRERENDER_CHECK_INTERVAL = getattr(settings, 'PRERENDER_CHECK_INTERVAL', 2)
+
+
+def output_dir():
+    return Path(getattr(settings, 'PRERENDERED_PAGES_DIR', settings.BASE_DIR / 'prerendered'))
+
+
+def page_path(url_name):
+    return output_dir() / f'{url_name}.html'
+
+
+def render_page(url_name):
+    """Анонимный вариант страницы — тот же HTML, что отдал бы view"""
+    return render_to_string(PRERENDERED_PAGES[url_name], {
+        'user': AnonymousUser(),
+        'messages': [],
+    })
+
+
+def write_page(url_name):
+    """Отрендерить страницу и атомарно заменить файл"""
+    path = page_path(url_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    tmp_path.write_text(render_page(url_name), encoding='utf-8')
+    os.replace(tmp_path, path)
+    return path
+
+
+def is_stale(url_name):
+    path = page_path(url_name)
+    try:
+        rendered_at = path.stat().st_mtime
+    except FileNotFoundError:
+        return True
+    sources = templates_last_modified(PRERENDERED_PAGES[url_name], 'base.html')
+    return sources.timestamp() > rendered_at
+
+
+def prerender_all():
+    return [write_page(url_name) for url_name in PRERENDERED_PAGES]
+
+
+class PrerenderedPageMiddleware:
+    """
+    Отдать заранее отрендеренную страницу анонимному GET-запросу.
+
+    Стоит до SessionMiddleware: без cookie сессии и сообщений пользователь заведомо
+    аноним, поэтому ни сессия, ни пользователь не загружаются и view не вызывается.
+    Если шаблон новее файла, страница перерендеривается на лету.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.paths = None
+        self.pages = {}  # url_name -> (mtime файла, тело, etag)
+        self.checked_at = {}
+        self.lock = threading.Lock()
+
+    def _resolve_paths(self):
+        if self.paths is None:
+            self.paths = {reverse(url_name): url_name for url_name in PRERENDERED_PAGES}
+        return self.paths
+
+    def _load(self, url_name):
+        now = time.monotonic()
+        if now - self.checked_at.get(url_name, 0) > PRERENDER_CHECK_INTERVAL:
+            with self.lock:
+                if is_stale(url_name):
+                    write_page(url_name)
+                self.checked_at[url_name] = now
+
+        path = page_path(url_name)
+        mtime = path.stat().st_mtime
+        cached = self.pages.get(url_name)
+        if cached is None or cached[0] != mtime:
+            body = path.read_bytes()
+            cached = (mtime, body, f'"{hashlib.md5(body, usedforsecurity=False).hexdigest()}"')
+            self.pages[url_name] = cached
+        return cached
+
+    def __call__(self, request):
+        url_name = self._resolve_paths().get(request.path_info)
+        if (
+            url_name is None
+            or request.method not in ('GET', 'HEAD')
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+            or CookieStorage.cookie_name in request.COOKIES
+        ):
+            return self.get_response(request)
+
+        request.prerendered_page = url_name  # метка для main.metrics
+        _, body, etag = self._load(url_name)
+        # Слабое сравнение: после CompressionMiddleware клиент присылает W/"..."
+        client_etags = [tag.removeprefix('W/') for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))]
+        if etag in client_etags:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='text/html; charset=utf-8')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        response['Vary'] = 'Cookie'
+        response['X-Frame-Options'] = getattr(settings, 'X_FRAME_OPTIONS', 'DENY')
+        return response
@@ -0,0 +1,150 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .metrics import cache_result
+from .models import HoneyProduct
+
+# Общий уровень: кеш Django, общий для всех процессов (CACHES: Redis или файловый кеш)
+PRODUCT_CACHE_ALIAS = getattr(settings, 'PRODUCT_CACHE_ALIAS', 'default')
+PRODUCT_CACHE_TIMEOUT = getattr(settings, 'PRODUCT_CACHE_TIMEOUT', 15 * 60)
+# Локальный уровень: LRU в памяти процесса. Сигнал сбрасывает запись только в своем
+# процессе, поэтому в остальных она живет не дольше PRODUCT_LOCAL_CACHE_TTL секунд.
+PRODUCT_LOCAL_CACHE_SIZE = getattr(settings, 'PRODUCT_LOCAL_CACHE_SIZE', 1024)
+PRODUCT_LOCAL_CACHE_TTL = getattr(settings, 'PRODUCT_LOCAL_CACHE_TTL', 5)
+
+# Номер схемы в ключе: после изменения полей модели старые записи просто не читаются
+PRODUCT_CACHE_VERSION = 1
+
+
+def product_cache_key(product_id):
+    return f'product:v{PRODUCT_CACHE_VERSION}:{product_id}'
+
+
+class LocalLRU:
+    """Потокобезопасный LRU с временем жизни записей"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()  # key -> (истекает, значение)
+        self.lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self.lock:
+            for key in keys:
+                entry = self.data.get(key)
+                if entry is None:
+                    continue
+                if entry[0] < now:
+                    del self.data[key]
+                    continue
+                self.data.move_to_end(key)
+                found[key] = entry[1]
+        return found
+
+    def set_many(self, mapping):
+        expires = time.monotonic() + self.ttl
+        with self.lock:
+            for key, value in mapping.items():
+                self.data[key] = (expires, value)
+                self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class ProductCache:
+    """
+    Поиск товаров для корзины и оформления заказа: LRU процесса -> общий кеш -> база.
+
+    Кешируются и неактивные товары (чтобы не ходить в базу за ними повторно),
+    отбирает активные вызывающий через get_active/get_many_active.
+    """
+
+    def __init__(self):
+        self.local = LocalLRU(PRODUCT_LOCAL_CACHE_SIZE, PRODUCT_LOCAL_CACHE_TTL)
+
+    @property
+    def shared(self):
+        return caches[PRODUCT_CACHE_ALIAS]
+
+    def get_many(self, ids):
+        """{id: HoneyProduct} для найденных товаров; одна выборка из базы на все промахи"""
+        ids = {int(product_id) for product_id in ids}
+        found = self.local.get_many(ids)
+        cache_result('product_local', True, len(found))
+
+        missing = ids - found.keys()
+        cache_result('product_local', False, len(missing))
+        if missing:
+            shared = self.shared.get_many([product_cache_key(product_id) for product_id in missing])
+            from_shared = {product.pk: product for product in shared.values()}
+            cache_result('product_shared', True, len(from_shared))
+            cache_result('product_shared', False, len(missing) - len(from_shared))
+            self.local.set_many(from_shared)
+            found.update(from_shared)
+            missing -= from_shared.keys()
+
+        if missing:
+            # С основной базы, а не с реплики: сразу после сброса отстающая реплика
+            # вернула бы старую цену, и она легла бы в общий кеш на PRODUCT_CACHE_TIMEOUT
+            from_db = HoneyProduct.objects.using('default').in_bulk(missing)
+            self.shared.set_many(
+                {product_cache_key(pk): product for pk, product in from_db.items()}, PRODUCT_CACHE_TIMEOUT,
+            )
+            self.local.set_many(from_db)
+            found.update(from_db)
+
+        # Копии: экземпляры в LRU общие для всех потоков процесса
+        return {pk: copy.copy(product) for pk, product in found.items()}
+
+    def get_many_active(self, ids):
+        return {pk: product for pk, product in self.get_many(ids).items() if product.is_active}
+
+    def get(self, product_id):
+        return self.get_many([product_id]).get(int(product_id))
+
+    def get_active(self, product_id):
+        product = self.get(product_id)
+        return product if product is not None and product.is_active else None
+
+    def invalidate(self, product_id):
+        self.local.delete(product_id)
+        self.shared.delete(product_cache_key(product_id))
+
+    def clear_local(self):
+        self.local.clear()
+
+
+products = ProductCache()
+
+
+def invalidate_product(product_id):
+    """Сбросить товар сразу и еще раз после коммита: до коммита его мог перечитать другой запрос"""
+    products.invalidate(product_id)
+    transaction.on_commit(lambda: products.invalidate(product_id))
+
+
+def attach_products(items):
+    """Подставить товары из кеша в CartItem/OrderItem вместо select_related('product')"""
+    items = list(items)
+    found = products.get_many(item.product_id for item in items)
+    for item in items:
+        if item.product_id in found:
+            item.product = found[item.product_id]
+    return items
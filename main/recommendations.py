@@ -0,0 +1,230 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+import numpy as np
+from scipy import sparse
+
+from .conditional import invalidate_catalog_version
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, HoneyProduct, Order, OrderItem,
+    ProductPairCount, ProductRecommendation,
+)
+
+# Сколько соседей хранить на товар
+RECOMMENDATIONS_TOP_K = getattr(settings, 'RECOMMENDATIONS_TOP_K', 8)
+# Пары, встретившиеся реже, считаются случайными
+RECOMMENDATIONS_MIN_SUPPORT = getattr(settings, 'RECOMMENDATIONS_MIN_SUPPORT', 2)
+# Заказов в пачке: память на пачку — позиции пачки и ненулевые пары
+RECOMMENDATIONS_CHUNK_SIZE = getattr(settings, 'RECOMMENDATIONS_CHUNK_SIZE', 5000)
+# Товаров за один пересчет соседей
+RECOMMENDATIONS_PRODUCT_BATCH = 500
+
+# Рабочие и архивные заказы: заказ, закрытый и перенесенный в архив до пересчета, тоже учитывается
+ORDER_SOURCES = [(ArchivedOrder, ArchivedOrderItem), (Order, OrderItem)]
+
+
+def _baskets(item_model, order_ids):
+    """[множество товаров заказа] для заказов order_ids"""
+    baskets = defaultdict(set)
+    for order_id, product_id in item_model.objects.filter(order_id__in=order_ids).values_list('order_id', 'product_id'):
+        baskets[order_id].add(product_id)
+    return list(baskets.values())
+
+
+def count_pairs(baskets):
+    """{(товар, товар): число заказов} для пачки, включая диагональ (товар, товар)"""
+    sizes = [len(basket) for basket in baskets]
+    if not sum(sizes):
+        return {}
+    items = np.fromiter((p for basket in baskets for p in basket), dtype=np.int64, count=sum(sizes))
+    products, cols = np.unique(items, return_inverse=True)
+    rows = np.repeat(np.arange(len(baskets)), sizes)
+    # Разреженная матрица заказ x товар (в заказе несколько товаров из всего каталога);
+    # совместная встречаемость — B^T B, в ней только пары, которые встречались
+    incidence = sparse.csr_matrix(
+        (np.ones(len(items), dtype=np.int64), (rows, cols)), shape=(len(baskets), len(products)),
+    )
+    cooccurrence = (incidence.T @ incidence).tocoo()
+    return dict(zip(
+        zip(products[cooccurrence.row].tolist(), products[cooccurrence.col].tolist()), cooccurrence.data.tolist(),
+    ))
+
+
+def add_pair_counts(deltas):
+    """Прибавить счетчики пачки (отрицательные — вычесть) к накопленным в ProductPairCount (upsert пачками)"""
+    if not deltas:
+        return
+    existing = {
+        (product_id, other_id): orders
+        for product_id, other_id, orders in ProductPairCount.objects
+        .filter(product_id__in={a for a, _ in deltas})
+        .values_list('product_id', 'other_id', 'orders')
+    }
+    ProductPairCount.objects.bulk_create(
+        [
+            # Не ниже нуля: счетчики, посчитанные до появления флага учета, могут не содержать заказ
+            ProductPairCount(product_id=a, other_id=b, orders=max(0, existing.get((a, b), 0) + count))
+            for (a, b), count in deltas.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['product', 'other'],
+        update_fields=['orders'],
+        batch_size=1000,
+    )
+
+
+def apply_orders(order_model, item_model, pending, sign, chunk_size=RECOMMENDATIONS_CHUNK_SIZE):
+    """
+    Прибавить (sign=1) или вычесть (sign=-1) пары заказов из выборки pending.
+
+    Каждая пачка — одна транзакция: счетчики меняются вместе с флагом
+    in_recommendations, прерванный пересчет продолжится с места остановки.
+    Строки заказов пачки блокируются, поэтому отмена, пришедшая во время
+    пересчета, дождется его и будет вычтена следующим запуском.
+    Возвращает (заказов, пачек, затронутые товары).
+    """
+    orders = chunks = 0
+    touched = set()
+    while True:
+        with transaction.atomic():
+            order_ids = list(
+                pending.select_for_update().order_by('pk').values_list('pk', flat=True)[:chunk_size]
+            )
+            if not order_ids:
+                return orders, chunks, touched
+            order_model.objects.filter(pk__in=order_ids).update(in_recommendations=sign > 0)
+            baskets = _baskets(item_model, order_ids)
+            deltas = {pair: sign * count for pair, count in count_pairs(baskets).items()}
+            add_pair_counts(deltas)
+        touched.update(a for a, _ in deltas)
+        orders += len(baskets)
+        chunks += 1
+
+
+def _top_neighbors(rows, totals, top_k, min_support):
+    """
+    [(товар, сосед, место, оценка, заказов вместе)] по строкам (товар, сосед, заказов вместе).
+
+    Оценка — косинусная мера (Очиаи): вместе / sqrt(заказов с товаром * заказов с соседом),
+    она не тянет в рекомендации просто самые популярные товары.
+    """
+    rows = [row for row in rows if row[0] != row[1] and row[2] >= min_support]
+    if not rows:
+        return []
+
+    data = np.array(rows, dtype=np.int64)
+    product_ids, other_ids, together = data[:, 0], data[:, 1], data[:, 2]
+    total_of = np.vectorize(totals.__getitem__, otypes=[np.float64])
+    scores = together / np.sqrt(total_of(product_ids) * total_of(other_ids))
+    # Сортировка по товару, внутри — по убыванию оценки; место = позиция внутри группы
+    order = np.lexsort((other_ids, -together, -scores, product_ids))
+    product_ids, other_ids, together, scores = product_ids[order], other_ids[order], together[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, product_ids[1:] != product_ids[:-1]])
+    ranks = np.arange(len(product_ids)) - np.repeat(starts, np.diff(np.r_[starts, len(product_ids)]))
+    keep = ranks < top_k
+    return list(zip(
+        product_ids[keep].tolist(), other_ids[keep].tolist(), ranks[keep].tolist(),
+        scores[keep].tolist(), together[keep].tolist(),
+    ))
+
+
+def rebuild_neighbors(product_ids, top_k=RECOMMENDATIONS_TOP_K, min_support=RECOMMENDATIONS_MIN_SUPPORT):
+    """Пересчитать top-K соседей для товаров пачками по RECOMMENDATIONS_PRODUCT_BATCH"""
+    product_ids = sorted(product_ids)
+    written = 0
+    for start in range(0, len(product_ids), RECOMMENDATIONS_PRODUCT_BATCH):
+        batch = product_ids[start:start + RECOMMENDATIONS_PRODUCT_BATCH]
+        rows = list(ProductPairCount.objects.filter(product_id__in=batch).values_list('product_id', 'other_id', 'orders'))
+        others = {other_id for _, other_id, _ in rows} | set(batch)
+        totals = dict(
+            ProductPairCount.objects.filter(product_id__in=others, other_id__in=others)
+            .filter(product_id=F('other_id')).values_list('product_id', 'orders')
+        )
+        neighbors = _top_neighbors(rows, totals, top_k, min_support)
+        with transaction.atomic():
+            ProductRecommendation.objects.filter(product_id__in=batch).delete()
+            ProductRecommendation.objects.bulk_create([
+                ProductRecommendation(product_id=product_id, recommended_id=other_id,
+                                      rank=rank, score=score, together=together)
+                for product_id, other_id, rank, score, together in neighbors
+            ], batch_size=1000)
+        written += len(neighbors)
+    return written
+
+
+def update_recommendations(full=False, chunk_size=RECOMMENDATIONS_CHUNK_SIZE):
+    """
+    Досчитать совместные покупки по новым заказам и обновить соседей затронутых товаров.
+
+    Учтенные заказы отмечены флагом in_recommendations, а не отметкой «до
+    какого id дошли»: заказ, чья транзакция зафиксировалась позже заказов с
+    большим id, не пропадает, а отмененный после учета вычитается. full=True
+    пересчитывает все с нуля. При инкрементальном пересчете оценки соседей,
+    не встретившихся в новых заказах, немного отстают — их выравнивает
+    периодический полный пересчет.
+    """
+    stats = {'orders': 0, 'cancelled': 0, 'chunks': 0, 'products': 0, 'recommendations': 0}
+    if full:
+        with transaction.atomic():
+            ProductPairCount.objects.all().delete()
+            for order_model, _ in ORDER_SOURCES:
+                order_model.objects.filter(in_recommendations=True).update(in_recommendations=False)
+
+    touched = set()
+    for order_model, item_model in ORDER_SOURCES:
+        steps = [
+            # Отмененные после учета — вычесть, затем новые — прибавить
+            ('cancelled', -1, order_model.objects.filter(in_recommendations=True, status='cancelled')),
+            ('orders', 1, order_model.objects.filter(in_recommendations=False).exclude(status='cancelled')),
+        ]
+        for stat, sign, pending in steps:
+            orders, chunks, products = apply_orders(order_model, item_model, pending, sign, chunk_size)
+            stats[stat] += orders
+            stats['chunks'] += chunks
+            touched |= products
+    ProductPairCount.objects.filter(orders=0).delete()
+
+    if full:
+        touched = set(HoneyProduct.objects.values_list('pk', flat=True))
+        ProductRecommendation.objects.exclude(product_id__in=touched).delete()
+    stats['products'] = len(touched)
+    stats['recommendations'] = rebuild_neighbors(touched)
+    invalidate_catalog_version(ProductRecommendation)
+    return stats
+
+
+# --------------------------- Чтение для страниц ---------------------------
+
+def recommendations_for_cart(product_ids, limit=4):
+    """Товары для блока «С этим покупают» в корзине: один запрос по готовой таблице"""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return []
+    best = {}
+    rows = (ProductRecommendation.objects
+            .filter(product_id__in=product_ids, recommended__is_active=True)
+            .exclude(recommended_id__in=product_ids)
+            .select_related('recommended'))
+    for row in rows:
+        current = best.get(row.recommended_id)
+        if current is None or row.score > current.score:
+            best[row.recommended_id] = row
+    return [row.recommended for row in sorted(best.values(), key=lambda row: -row.score)[:limit]]
+
+
+def attach_recommendations(products, per_product=3):
+    """Проставить product.bought_together — до per_product активных соседей, одним запросом на страницу"""
+    products = list(products)
+    by_product = defaultdict(list)
+    rows = (ProductRecommendation.objects
+            .filter(product_id__in=[product.pk for product in products], rank__lt=per_product * 2,
+                    recommended__is_active=True)
+            .select_related('recommended'))
+    for row in rows:
+        by_product[row.product_id].append(row.recommended)
+    for product in products:
+        product.bought_together = by_product[product.pk][:per_product]
+    return products
@@ -0,0 +1,95 @@
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Cart, CartItem
+
+# Корзина без изменений дольше этого срока считается брошенной
+CART_RETENTION_DAYS = getattr(settings, 'CART_RETENTION_DAYS', 90)
+# Строк за одну транзакцию: блокировка записи держится миллисекунды, оформление заказа ее не ждет
+RETENTION_BATCH_SIZE = getattr(settings, 'RETENTION_BATCH_SIZE', 500)
+# Пауза между пачками, чтобы запросы сайта успевали занять блокировку
+RETENTION_BATCH_PAUSE = getattr(settings, 'RETENTION_BATCH_PAUSE', 0.05)
+
+
+@dataclass
+class PurgeResult:
+    deleted: dict = field(default_factory=dict)  # таблица -> удалено строк
+    batches: int = 0
+    longest_batch: float = 0.0  # сек, самая долгая транзакция
+
+    def add(self, table, count):
+        self.deleted[table] = self.deleted.get(table, 0) + count
+
+
+def run_in_batches(result, delete_batch, batch_size, pause):
+    """Вызывать delete_batch(batch_size) в отдельных транзакциях, пока он что-то удаляет"""
+    while True:
+        start = time.perf_counter()
+        with transaction.atomic():
+            removed = delete_batch(batch_size)
+        result.longest_batch = max(result.longest_batch, time.perf_counter() - start)
+        if not removed:
+            return
+        result.batches += 1
+        if pause:
+            time.sleep(pause)
+
+
+def purge_stale_carts(days=CART_RETENTION_DAYS, batch_size=RETENTION_BATCH_SIZE,
+                      pause=RETENTION_BATCH_PAUSE, result=None):
+    """Удалить корзины, не менявшиеся days дней, вместе с позициями"""
+    result = result or PurgeResult()
+    cutoff = timezone.now() - timedelta(days=days)
+
+    def delete_batch(size):
+        cart_ids = list(
+            Cart.objects.filter(updated_at__lt=cutoff).order_by('pk').values_list('pk', flat=True)[:size]
+        )
+        if not cart_ids:
+            return 0
+        # Удаление идет в обход сборщика каскада (без загрузки объектов). Первый DELETE
+        # берет блокировку записи и перепроверяет срок: корзину могли оживить после выборки.
+        # Внешние ключи отложенные, поэтому позиции можно удалить следом.
+        removed = Cart.objects.filter(pk__in=cart_ids, updated_at__lt=cutoff)._raw_delete(connection.alias)
+        alive = set(Cart.objects.filter(pk__in=cart_ids).values_list('pk', flat=True))
+        gone = [pk for pk in cart_ids if pk not in alive]
+        result.add(Cart._meta.db_table, removed)
+        result.add(CartItem._meta.db_table, CartItem.objects.filter(cart_id__in=gone)._raw_delete(connection.alias))
+        return len(cart_ids)
+
+    run_in_batches(result, delete_batch, batch_size, pause)
+    return result
+
+
+def purge_expired_sessions(batch_size=RETENTION_BATCH_SIZE, pause=RETENTION_BATCH_PAUSE, result=None):
+    """Удалить истекшие сессии (clearsessions делает это одним DELETE на всю таблицу)"""
+    result = result or PurgeResult()
+    now = timezone.now()
+
+    def delete_batch(size):
+        keys = list(Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:size])
+        if not keys:
+            return 0
+        removed = Session.objects.filter(session_key__in=keys)._raw_delete(connection.alias)
+        result.add(Session._meta.db_table, removed)
+        return removed
+
+    run_in_batches(result, delete_batch, batch_size, pause)
+    return result
+
+
+def sqlite_space():
+    """(размер файла, свободные страницы) в байтах для SQLite; None для других баз"""
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        page_size = cursor.execute('PRAGMA page_size').fetchone()[0]
+        page_count = cursor.execute('PRAGMA page_count').fetchone()[0]
+        freelist = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+    return page_count * page_size, freelist * page_size
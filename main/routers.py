@@ -0,0 +1,99 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Модели каталога: читаются с реплик
+CATALOG_MODELS = {'main.honeyproduct', 'main.waxcandle'}
+# Записи в эти приложения не привязывают запрос к основной базе (сессия пишется на каждом входе)
+UNPINNED_APPS = {'sessions'}
+
+# Cookie, по которой следующие запросы после записи читают с основной базы
+REPLICA_PIN_COOKIE = 'pin_primary'
+REPLICA_PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 15)
+
+# Запрос читает только с основной базы (писал сам или недавно писал по cookie)
+_pinned = ContextVar('db_pinned_to_primary', default=False)
+# Запрос (или поток вне запроса) писал в основную базу
+_wrote = ContextVar('db_wrote_to_primary', default=False)
+# Внутри reporting_reads() все чтения идут на реплику
+_reporting = ContextVar('db_reporting_reads', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', []) if alias in settings.DATABASES]
+
+
+def replica_alias():
+    """Случайная реплика или 'default', если реплик нет либо запрос привязан к основной базе"""
+    if _pinned.get():
+        return 'default'
+    return reporting_alias()
+
+
+def reporting_alias():
+    """База для тяжелых отчетов: реплика без учета привязки — отставание для отчетов не критично"""
+    replicas = replica_aliases()
+    return random.choice(replicas) if replicas else 'default'
+
+
+@contextmanager
+def reporting_reads():
+    """Отчеты: все чтения внутри блока — с реплики (допустимо небольшое отставание)"""
+    token = _reporting.set(True)
+    try:
+        yield
+    finally:
+        _reporting.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Чтение каталога и отчетов — с реплик из DATABASE_REPLICAS, все записи — в default.
+
+    После первой записи запрос до конца читает с основной базы, чтобы покупатель
+    видел свои изменения; ReplicaPinningMiddleware продлевает это на несколько
+    секунд через cookie, чтобы пережить redirect после POST.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _reporting.get():
+            return reporting_alias()
+        if model._meta.label_lower in CATALOG_MODELS:
+            return replica_alias()
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in UNPINNED_APPS:
+            _pinned.set(True)
+            _wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replica_aliases()
+
+
+class ReplicaPinningMiddleware:
+    """Сбрасывает привязку к основной базе на каждый запрос и ставит cookie после записи"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned_token = _pinned.set(REPLICA_PIN_COOKIE in request.COOKIES)
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(
+                    REPLICA_PIN_COOKIE, '1', max_age=REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+                )
+        finally:
+            _wrote.reset(wrote_token)
+            _pinned.reset(pinned_token)
+        return response
@@ -0,0 +1,72 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_login_failed
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .conditional import invalidate_catalog_version
+from .delivery import invalidate_delivery_index
+from .excursions import invalidate_slot_listing
+from .metrics import LOGIN_FAILURES
+from .models import Cart, DeliveryTariff, DeliveryZone, ExcursionSlot, HoneyProduct, UserProfile, WaxCandle, recalculate_cart_totals
+from .productcache import invalidate_product
+
+
+@receiver([post_save, post_delete], sender=HoneyProduct)
+@receiver([post_save, post_delete], sender=WaxCandle)
+def catalog_changed(sender, **kwargs):
+    """Сбросить версию каталога для ETag/Last-Modified"""
+    invalidate_catalog_version(sender)
+
+
+@receiver([post_save, post_delete], sender=HoneyProduct)
+def product_changed(sender, instance, **kwargs):
+    """Сбросить товар в кеше корзины и оформления заказа"""
+    invalidate_product(instance.pk)
+
+
+@receiver(post_save, sender=HoneyProduct)
+def product_price_changed(sender, instance, created, update_fields=None, **kwargs):
+    """Пересчитать итоги корзин с этим товаром: цена могла измениться"""
+    if created or (update_fields is not None and 'price' not in update_fields):
+        return
+    recalculate_cart_totals(Cart.objects.filter(items__product_id=instance.pk))
+
+
+@receiver(pre_delete, sender=HoneyProduct)
+def remember_product_carts(sender, instance, **kwargs):
+    # Позиции удалятся каскадом, корзины нужно запомнить заранее
+    instance._affected_cart_ids = list(Cart.objects.filter(items__product_id=instance.pk).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=HoneyProduct)
+def product_deleted(sender, instance, **kwargs):
+    recalculate_cart_totals(Cart.objects.filter(pk__in=getattr(instance, '_affected_cart_ids', [])))
+
+
+@receiver([post_save, post_delete], sender=DeliveryZone)
+@receiver([post_save, post_delete], sender=DeliveryTariff)
+def delivery_changed(sender, **kwargs):
+    """Перестроить индекс зон доставки при следующем расчете"""
+    invalidate_delivery_index()
+
+
+@receiver([post_save, post_delete], sender=ExcursionSlot)
+def excursion_slot_changed(sender, **kwargs):
+    """Расписание правят в админке; запись и отмена сбрасывают кеш сами"""
+    # И после коммита: до него список мог перечитать и закешировать другой запрос
+    invalidate_slot_listing()
+    transaction.on_commit(invalidate_slot_listing)
+
+
+@receiver(user_login_failed)
+def login_failed(sender, **kwargs):
+    LOGIN_FAILURES.inc()
+
+
+@receiver(post_save, sender=User)
+def create_user_profile_and_cart(sender, instance, created, raw=False, **kwargs):
+    """Профиль и корзина создаются один раз вместе с пользователем, а не при каждом запросе"""
+    if created and not raw:
+        UserProfile.objects.get_or_create(user=instance)
+        Cart.objects.get_or_create(user=instance)
@@ -0,0 +1,281 @@
+import atexit
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, router, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_ENABLED = getattr(settings, 'SLOW_QUERY_ENABLED', True)
+# Запрос медленнее этого (мс) попадает в журнал
+SLOW_QUERY_THRESHOLD_MS = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100)
+# Один отпечаток пишется в лог и базу не чаще раза в столько секунд;
+# повторы между записями копятся в памяти и добавляются к счетчикам позже
+SLOW_QUERY_LOG_INTERVAL = getattr(settings, 'SLOW_QUERY_LOG_INTERVAL', 60)
+SLOW_QUERY_STACK_DEPTH = 6
+
+_PROJECT_ROOT = os.path.join(str(settings.BASE_DIR), '')
+_THIS_FILE = os.path.abspath(__file__)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w"])\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_ROWS_RE = re.compile(r'(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+')
+_SPACE_RE = re.compile(r'\s+')
+# Управление транзакциями идет через тот же cursor.execute (SQLite: BEGIN), но запросом не является
+_TRANSACTION_RE = re.compile(r'\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    """Текст без литералов: запросы, отличающиеся только значениями и длиной IN (...), совпадают"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _LIST_RE.sub('(...)', sql)
+    sql = _ROWS_RE.sub(r'\1, ...', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(alias, normalized):
+    return hashlib.sha1(f'{alias}\n{normalized}'.encode(), usedforsecurity=False).hexdigest()
+
+
+def params_shape(params):
+    """Типы параметров без значений: «int×250, str» — значения могут быть персональными данными"""
+    if params is None:
+        return ''
+    if isinstance(params, dict):
+        return ', '.join(f'{key}: {type(value).__name__}' for key, value in params.items())[:255]
+    groups = []
+    for value in params:
+        name = type(value).__name__
+        if groups and groups[-1][0] == name:
+            groups[-1][1] += 1
+        else:
+            groups.append([name, 1])
+    return ', '.join(name if count == 1 else f'{name}×{count}' for name, count in groups)[:255]
+
+
+def _app_stack(skip_codes=()):
+    """Кадры кода проекта (без Django, библиотек и оберток запросов), от места вызова вверх"""
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None and len(frames) < SLOW_QUERY_STACK_DEPTH:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (filename.startswith(_PROJECT_ROOT) and filename != _THIS_FILE and 'site-packages' not in filename
+                and frame.f_code not in skip_codes):
+            frames.append(f'{os.path.relpath(filename, _PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return frames
+
+
+def explain(connection, sql, params):
+    """План запроса (EXPLAIN QUERY PLAN в SQLite, EXPLAIN в остальных базах) или текст ошибки"""
+    prefix = connection.ops.explain_query_prefix()
+    # Внутри транзакции — точка сохранения: ошибка EXPLAIN не ломает транзакцию
+    context = transaction.atomic(using=connection.alias) if connection.in_atomic_block else nullcontext()
+    try:
+        with context, connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError as e:
+        return f'EXPLAIN не выполнен: {e}'
+    if connection.vendor == 'sqlite':
+        # Строки (id, parent, _, detail): отступ по глубине вложенности
+        depth = {0: -1}
+        lines = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node] + detail)
+        return '\n'.join(lines)
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+# --------------------------- журнал ---------------------------
+# Обертка запроса только копит данные в памяти: писать в базу из нее нельзя,
+# соединение занято незавершенным запросом (INSERT ... RETURNING еще не прочитан).
+# В базу и лог все уходит в flush() — после ответа, между задачами воркера и при выходе.
+_state = threading.local()
+_lock = threading.Lock()
+_entries = []  # новые записи журнала: поля строки, текст и параметры для EXPLAIN
+_pending = {}  # отпечаток -> [вызовов, мс, максимум мс] с последней записи
+_logged_at = {}  # отпечаток -> время последней записи (monotonic)
+_explained = set()  # отпечатки, план которых этот процесс уже снял
+_flushed_at = [0.0]
+
+# Текущий HTTP-запрос, чтобы назвать view медленного запроса
+_current_request = contextvars.ContextVar('hive_slowlog_request', default=None)
+
+
+def _current_view():
+    request = _current_request.get()
+    if request is None:
+        return ''
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else request.path_info
+
+
+def _add(counters, calls, total_ms, max_ms):
+    counters[0] += calls
+    counters[1] += total_ms
+    counters[2] = max(counters[2], max_ms)
+
+
+def record(connection, sql, params, many, duration_ms):
+    """Учесть медленный запрос; в лог и базу — не чаще SLOW_QUERY_LOG_INTERVAL на отпечаток"""
+    normalized = normalize_sql(sql)
+    fp = fingerprint(connection.alias, normalized)
+    now = time.monotonic()
+    with _lock:
+        _add(_pending.setdefault(fp, [0, 0.0, 0.0]), 1, duration_ms, duration_ms)
+        if now - _logged_at.get(fp, -SLOW_QUERY_LOG_INTERVAL) < SLOW_QUERY_LOG_INTERVAL:
+            return
+        _logged_at[fp] = now
+        counters = _pending.pop(fp)
+
+    # Другие обертки execute (метрики) тоже лежат в проекте, но местом вызова не являются
+    stack = _app_stack({getattr(wrapper, '__code__', None) for wrapper in connection.execute_wrappers})
+    # План снимается для нового отпечатка (и раз за жизнь процесса — после добавления индекса он меняется)
+    needs_plan = fp not in _explained and not many and normalized.split(' ', 1)[0].upper() in ('SELECT', 'WITH')
+    _explained.add(fp)
+    entry = {
+        'fingerprint': fp,
+        'counters': counters,
+        'explain': (connection.alias, sql, params) if needs_plan else None,
+        'fields': {
+            'sql': normalized,
+            'database': connection.alias,
+            'last_ms': duration_ms,
+            'params_shape': params_shape(params) if not many else 'executemany',
+            'view': _current_view()[:200],
+            'origin': (stack[0] if stack else '')[:255],
+            'stack': '\n'.join(stack),
+            'last_seen': timezone.now(),
+        },
+    }
+    with _lock:
+        _entries.append(entry)
+
+
+def _save(fp, fields, calls, total_ms, max_ms):
+    from .models import SlowQuery
+
+    updates = dict(fields, calls=F('calls') + calls, total_ms=F('total_ms') + total_ms,
+                   max_ms=Greatest(F('max_ms'), max_ms))
+    if SlowQuery.objects.filter(fingerprint=fp).update(**updates) or not fields:
+        # Без полей — досылка повторов: если строку удалили (сброс статистики), не создаем пустую
+        return
+    try:
+        with transaction.atomic():
+            SlowQuery.objects.create(fingerprint=fp, calls=calls, total_ms=total_ms, max_ms=max_ms, **fields)
+    except IntegrityError:
+        # Ту же строку только что создал другой процесс
+        SlowQuery.objects.filter(fingerprint=fp).update(**updates)
+
+
+def flush(force=False):
+    """
+    Снять планы, записать новые медленные запросы в лог и базу.
+
+    Повторы, подавленные ограничением частоты, досылаются не чаще SLOW_QUERY_LOG_INTERVAL
+    (или сразу при force). Вызывается вне транзакций: иначе запись откладывается.
+    """
+    from .models import SlowQuery
+
+    connection = connections[router.db_for_write(SlowQuery)]
+    if connection.in_atomic_block or not connection.get_autocommit():
+        return
+    now = time.monotonic()
+    with _lock:
+        entries = _entries[:]
+        _entries.clear()
+        pending = {}
+        if force or now - _flushed_at[0] >= SLOW_QUERY_LOG_INTERVAL:
+            _flushed_at[0] = now
+            pending = {fp: counters for fp, counters in _pending.items() if counters[0]}
+            _pending.clear()
+    if not entries and not pending:
+        return
+
+    busy = getattr(_state, 'busy', False)
+    _state.busy = True
+    try:
+        for entry in entries:
+            fields = entry['fields']
+            if entry['explain'] is not None:
+                alias, sql, params = entry['explain']
+                fields['plan'] = explain(connections[alias], sql, params)
+            calls, total_ms, max_ms = entry['counters']
+            logger.warning(
+                'Медленный запрос %.1f мс (повторов с прошлой записи: %s) view=%s origin=%s params=[%s]: %s%s',
+                fields['last_ms'], calls - 1, fields['view'] or '-', fields['origin'] or '-',
+                fields['params_shape'], fields['sql'], f"\n{fields['plan']}" if 'plan' in fields else '',
+            )
+            _save(entry['fingerprint'], fields, calls, total_ms, max_ms)
+        for fp, (calls, total_ms, max_ms) in pending.items():
+            _save(fp, {}, calls, total_ms, max_ms)
+    except DatabaseError:
+        logger.exception('Не удалось сохранить медленные запросы')
+    finally:
+        _state.busy = busy
+
+
+def _flush_at_exit():
+    try:
+        flush(force=True)
+    except Exception:  # интерпретатор завершается: соединения может уже не быть
+        pass
+
+
+atexit.register(_flush_at_exit)
+
+
+def _observe_query(execute, sql, params, many, context):
+    if getattr(_state, 'busy', False):
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms >= SLOW_QUERY_THRESHOLD_MS and not _TRANSACTION_RE.match(sql):
+        record(context['connection'], sql, params, many, duration_ms)
+    return result
+
+
+def _install_query_wrapper(sender, connection, **kwargs):
+    if SLOW_QUERY_ENABLED and _observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_observe_query)
+
+
+connection_created.connect(_install_query_wrapper)
+
+
+class SlowQueryMiddleware:
+    """Запоминает текущий запрос (для имени view) и после ответа сбрасывает журнал в базу"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not SLOW_QUERY_ENABLED:
+            return self.get_response(request)
+        token = _current_request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        if _entries or _pending:
+            flush()
+        return response
@@ -0,0 +1,183 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+# Имя файла после ManifestStaticFilesStorage: name.<12 hex>.ext — такой URL никогда не меняет содержимое
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+STATIC_CACHE_CONTROL = getattr(settings, 'STATIC_CACHE_CONTROL', 'public, max-age=3600')
+MEDIA_CACHE_CONTROL = getattr(settings, 'MEDIA_CACHE_CONTROL', 'public, max-age=86400')
+
+# Передать отдачу файла фронтовому серверу: None, 'x-accel-redirect' (nginx) или 'x-sendfile' (Apache/lighttpd)
+STATIC_SENDFILE = getattr(settings, 'STATIC_SENDFILE', None)
+# Для X-Accel-Redirect: URL-префикс internal location в nginx -> корень на диске
+STATIC_ACCEL_REDIRECT_PREFIXES = getattr(settings, 'STATIC_ACCEL_REDIRECT_PREFIXES', {})
+
+STREAM_BLOCK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _url_prefix(url):
+    if not url:
+        return None
+    return url if url.startswith('/') else '/' + url
+
+
+def _file_etag(st):
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def _iter_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def parse_range(header, size):
+    """(начало, длина) для одиночного диапазона bytes=; None — отдать файл целиком; False — 416"""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Несколько диапазонов и прочие единицы не поддерживаем — RFC разрешает отдать целиком
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = min(int(last), size)
+        return (size - length, length) if length else False
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end - start + 1
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        client_etags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+        return etag in client_etags or '*' in client_etags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def _sendfile(path, response):
+    if STATIC_SENDFILE == 'x-sendfile':
+        response['X-Sendfile'] = path
+        return True
+    if STATIC_SENDFILE == 'x-accel-redirect':
+        for prefix, prefix_root in STATIC_ACCEL_REDIRECT_PREFIXES.items():
+            prefix_root = os.path.abspath(prefix_root)
+            if path.startswith(prefix_root + os.sep):
+                response['X-Accel-Redirect'] = prefix.rstrip('/') + path[len(prefix_root):].replace(os.sep, '/')
+                return True
+    return False
+
+
+def serve_file(request, path, cache_control):
+    """Ответ с файлом: условные запросы, Range, потоковая отдача или X-Accel/X-Sendfile"""
+    st = os.stat(path)
+    etag = _file_etag(st)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(st.st_mtime),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+    }
+    if _not_modified(request, etag, st.st_mtime):
+        response = HttpResponseNotModified()
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    content_type, encoding = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+    size = st.st_size
+
+    if STATIC_SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        if _sendfile(path, response):
+            # Диапазоны и Content-Length выставит фронтовой сервер
+            if encoding:
+                response['Content-Encoding'] = encoding
+            for name, value in headers.items():
+                response[name] = value
+            return response
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.META.get('HTTP_IF_RANGE', etag) in (etag, headers['Last-Modified']):
+        byte_range = parse_range(range_header, size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range:
+        start, length = byte_range
+        response = StreamingHttpResponse(_iter_range(path, start, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{start + length - 1}/{size}'
+        response['Content-Length'] = str(length)
+    else:
+        # FileResponse читает блоками и умеет wsgi.file_wrapper (sendfile в самом WSGI-сервере)
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+class StaticMediaMiddleware:
+    """
+    Отдача STATIC_URL из STATIC_ROOT и MEDIA_URL из MEDIA_ROOT при любом DEBUG.
+
+    Файлы с хешем содержимого в имени (после collectstatic с манифестом) кешируются
+    навсегда (immutable), остальные — с ETag/Last-Modified и коротким max-age.
+    Если файла нет, запрос идет дальше по стеку.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.mounts = []
+        for url, root, cache_control in (
+            (settings.STATIC_URL, settings.STATIC_ROOT, STATIC_CACHE_CONTROL),
+            (settings.MEDIA_URL, settings.MEDIA_ROOT, MEDIA_CACHE_CONTROL),
+        ):
+            prefix = _url_prefix(url)
+            if prefix and root:
+                self.mounts.append((prefix, os.path.abspath(root), cache_control))
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD'):
+            for prefix, root, cache_control in self.mounts:
+                if request.path_info.startswith(prefix):
+                    response = self.serve(request, request.path_info[len(prefix):], root, cache_control)
+                    if response is not None:
+                        return response
+        return self.get_response(request)
+
+    def serve(self, request, relative_path, root, cache_control):
+        try:
+            path = safe_join(root, relative_path)
+            st = os.stat(path)
+        except (SuspiciousFileOperation, OSError, ValueError):
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        if HASHED_NAME.search(relative_path):
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        return serve_file(request, path, cache_control)
@@ -0,0 +1,193 @@
+import logging
+import os
+import socket
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+from .slowlog import flush as flush_slow_queries
+
+logger = logging.getLogger(__name__)
+
+# Зарегистрированные задачи: имя -> TaskFunction
+registry = {}
+
+# Потолок задержки между повторами
+MAX_RETRY_DELAY = 3600
+# Задача в статусе running дольше этого считается брошенной (воркер упал)
+STALE_TASK_TIMEOUT = timedelta(minutes=15)
+
+
+class TaskFunction:
+    """Обертка над функцией-задачей: вызов напрямую или постановка в очередь"""
+
+    def __init__(self, func, name, priority=0, max_attempts=3, retry_delay=10):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<task {self.name}>'
+
+    def build(self, args=(), kwargs=None, priority=None, delay=None):
+        """Несохраненная задача — для Task.objects.bulk_create"""
+        return Task(
+            name=self.name,
+            args=list(args),
+            kwargs=kwargs or {},
+            priority=self.priority if priority is None else priority,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=delay or 0),
+        )
+
+    def enqueue(self, args=(), kwargs=None, priority=None, delay=None):
+        task = self.build(args, kwargs, priority, delay)
+        task.save()
+        return task
+
+    def delay(self, *args, **kwargs):
+        """Поставить в очередь с параметрами по умолчанию (одна вставка)"""
+        return self.enqueue(args, kwargs)
+
+    def retry_delay_for(self, attempts):
+        """Экспоненциальная задержка: retry_delay, 2*retry_delay, 4*retry_delay..."""
+        return min(self.retry_delay * 2 ** max(attempts - 1, 0), MAX_RETRY_DELAY)
+
+
+def task(func=None, *, name=None, priority=0, max_attempts=3, retry_delay=10):
+    """
+    Объявить фоновую задачу.
+
+        @task(priority=10)
+        def send_email(order_id): ...
+
+        send_email.delay(order.id)
+
+    Аргументы сохраняются в JSON, поэтому передавайте id, а не объекты моделей.
+    """
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        wrapper = TaskFunction(func, task_name, priority, max_attempts, retry_delay)
+        registry[task_name] = wrapper
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker_id, limit=10):
+    """
+    Взять до limit готовых задач.
+
+    Кандидаты выбираются без блокировок, а захват — один условный UPDATE
+    (status = queued), помеченный уникальным токеном. Строку, которую уже забрал
+    другой воркер, UPDATE просто не затронет, поэтому одну задачу два воркера не получат.
+    """
+    now = timezone.now()
+    candidates = list(
+        Task.objects.filter(status=Task.STATUS_QUEUED, run_at__lte=now)
+        .order_by('-priority', 'run_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not candidates:
+        return []
+
+    token = f'{worker_id}:{uuid.uuid4().hex[:12]}'
+    claimed = Task.objects.filter(pk__in=candidates, status=Task.STATUS_QUEUED).update(
+        status=Task.STATUS_RUNNING,
+        locked_by=token,
+        locked_at=now,
+        attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return []
+    return list(Task.objects.filter(locked_by=token).order_by('-priority', 'run_at', 'id'))
+
+
+def run_task(task_obj):
+    """Выполнить захваченную задачу и записать результат; True при успехе"""
+    owned = Task.objects.filter(pk=task_obj.pk, locked_by=task_obj.locked_by)
+    func = registry.get(task_obj.name)
+    try:
+        if func is None:
+            raise LookupError(f'Задача {task_obj.name} не зарегистрирована')
+        func.func(*task_obj.args, **task_obj.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Задача %s #%s упала (попытка %s)', task_obj.name, task_obj.pk, task_obj.attempts)
+        if func is not None and task_obj.attempts < task_obj.max_attempts:
+            owned.update(
+                status=Task.STATUS_QUEUED,
+                run_at=timezone.now() + timedelta(seconds=func.retry_delay_for(task_obj.attempts)),
+                locked_by='',
+                locked_at=None,
+                last_error=error,
+            )
+        else:
+            owned.update(status=Task.STATUS_FAILED, finished_at=timezone.now(), last_error=error)
+        return False
+
+    owned.update(status=Task.STATUS_DONE, finished_at=timezone.now())
+    return True
+
+
+def requeue_stale(timeout=STALE_TASK_TIMEOUT):
+    """Вернуть в очередь задачи, зависшие в running (воркер был убит)"""
+    stale = Task.objects.filter(status=Task.STATUS_RUNNING, locked_at__lt=timezone.now() - timeout)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.STATUS_FAILED, finished_at=timezone.now(), last_error='Воркер не завершил задачу',
+    )
+    requeued = stale.update(status=Task.STATUS_QUEUED, locked_by='', locked_at=None)
+    return requeued + failed
+
+
+def work(worker_id=None, batch_size=10, poll_interval=1.0, burst=False, should_stop=lambda: False):
+    """
+    Цикл воркера: брать пачки задач и выполнять их.
+
+    burst=True — выйти, как только очередь опустеет. Возвращает число выполненных задач.
+    """
+    worker_id = worker_id or default_worker_id()
+    processed = 0
+    while not should_stop():
+        tasks = claim(worker_id, batch_size)
+        if not tasks:
+            if burst:
+                break
+            # Пока очередь пуста — закрыть устаревшие соединения, как в конце запроса
+            close_old_connections()
+            time.sleep(poll_interval)
+            continue
+        for position, task_obj in enumerate(tasks):
+            if should_stop():
+                release([t.pk for t in tasks[position:]], task_obj.locked_by)
+                return processed
+            run_task(task_obj)
+            # Медленные запросы задачи — в журнал, пока соединение свободно
+            flush_slow_queries()
+            processed += 1
+    return processed
+
+
+def release(task_ids, token):
+    """Вернуть в очередь захваченные, но не начатые задачи (попытка не засчитывается)"""
+    return Task.objects.filter(pk__in=task_ids, locked_by=token, status=Task.STATUS_RUNNING).update(
+        status=Task.STATUS_QUEUED, locked_by='', locked_at=None, attempts=F('attempts') - 1,
+    )
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+
+from .forecast import build_restock_report
+from .models import Cart, Order
+from .productcache import products
+from .taskqueue import task
+
+
+@task(priority=10, max_attempts=5, retry_delay=30)
+def send_order_confirmation(order_id):
+    """Письмо покупателю о принятом заказе"""
+    order = Order.objects.prefetch_related('items__product').get(pk=order_id)
+    lines = [
+        f"{item.product.title} x{item.quantity} — {item.line_total}₽"
+        for item in order.items.all()
+    ]
+    send_mail(
+        subject=f"Заказ #{order.order_number} принят",
+        message="\n".join([
+            "Спасибо за заказ!",
+            "",
+            *lines,
+            "",
+            f"Доставка: {order.delivery_cost}₽ ({order.delivery_zone}, {order.delivery_eta})"
+            if order.delivery_zone else "Доставка: стоимость сообщит менеджер",
+            f"Итого: {order.total_amount}₽",
+            f"Адрес доставки: {order.city}, {order.address}",
+            "",
+            "Мы свяжемся с вами в ближайшее время.",
+        ]),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[order.email],
+    )
+
+
+@task(priority=5)
+def migrate_session_cart(user_id, session_cart):
+    """Перенести корзину из сессии ({product_id: qty}) в корзину пользователя"""
+    user = User.objects.get(pk=user_id)
+    cart, created = Cart.objects.get_or_create(user=user)
+
+    quantities = {}
+    for product_id_str, qty in session_cart.items():
+        try:
+            quantities[int(product_id_str)] = int(qty)
+        except ValueError:
+            continue
+    active_ids = products.get_many_active(quantities)
+
+    for product_id in active_ids:
+        cart.set_quantity(product_id, quantities[product_id])
+
+
+@task(max_attempts=1)
+def benchmark_noop(n=0):
+    """Пустая задача для замера пропускной способности очереди"""
+    return n
+
+
+@task(max_attempts=1)
+def refresh_restock_report():
+    """Пересчитать отчет о заготовке (например, раз в сутки ночью)"""
+    _, rows = build_restock_report()
+    return rows
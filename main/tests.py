@@ -1,3 +1,201 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import Client, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import slowlog
+from .archive import archive_orders
+from .excursions import BookingError, book_slot, cancel_booking
+from .exports import export_querysets, iter_orders_jsonl
+from .fulfillment import transition
+from .models import (
+    ArchivedOrder, ExcursionBooking, ExcursionSlot, HoneyProduct, Order, OrderItem, ProductPairCount,
+)
+from .recommendations import update_recommendations
+
+
+class ExcursionBookingConcurrencyTests(TransactionTestCase):
+    """Одновременная запись многих покупателей на последние места одного времени"""
+
+    BOOKERS = 16
+
+    def setUp(self):
+        self.slot = ExcursionSlot.objects.create(
+            title='Пасека', starts_at=timezone.now() + timedelta(days=2), capacity=10,
+        )
+        self.users = [User.objects.create(username=f'booker-{n}') for n in range(self.BOOKERS)]
+
+    def tearDown(self):
+        # Медленные запросы потоков — в тестовую базу; при выходе они записались бы уже в рабочую
+        slowlog.flush(force=True)
+
+    def _book_concurrently(self, seats_for):
+        """Все потоки стартуют одновременно; вернуть {пользователь: мест} и отказы"""
+        barrier = threading.Barrier(len(self.users))
+        booked, refusals, lock = {}, [], threading.Lock()
+
+        def booker(user):
+            try:
+                barrier.wait()
+                while True:
+                    try:
+                        book_slot(user, self.slot.pk, seats_for(user), '+70000000000')
+                        with lock:
+                            booked[user.pk] = seats_for(user)
+                    except BookingError as e:
+                        with lock:
+                            refusals.append(str(e))
+                    except OperationalError:
+                        # SQLite: таблица занята другим потоком — повторяем, как повторил бы пользователь
+                        continue
+                    break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=booker, args=(user,)) for user in self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return booked, refusals
+
+    def assertSeatsConsistent(self, booked):
+        self.slot.refresh_from_db()
+        confirmed = (ExcursionBooking.objects.filter(slot=self.slot, status=ExcursionBooking.STATUS_CONFIRMED)
+                     .aggregate(seats=Sum('seats'))['seats'] or 0)
+        self.assertLessEqual(self.slot.seats_booked, self.slot.capacity)
+        self.assertEqual(self.slot.seats_booked, confirmed)
+        self.assertEqual(sum(booked.values()), confirmed)
+
+    def test_last_seats_are_not_overbooked(self):
+        ExcursionSlot.objects.filter(pk=self.slot.pk).update(seats_booked=6)
+        ExcursionBooking.objects.create(slot=self.slot, user=User.objects.create(username='early'), seats=6,
+                                        phone='+70000000000')
+
+        booked, refusals = self._book_concurrently(lambda user: 1 + user.pk % 2)
+
+        self.assertSeatsConsistent({'early': 6, **booked})
+        self.assertTrue(refusals)
+        self.assertEqual(len(booked) + len(refusals), self.BOOKERS)
+        # Отказ — из-за мест, а не из-за сработавшего ограничения базы
+        self.assertNotIn('Вы уже записаны на это время; чтобы изменить число мест, отмените запись', refusals)
+
+    def test_concurrent_bookings_fill_slot_exactly(self):
+        booked, refusals = self._book_concurrently(lambda user: 1)
+
+        self.assertSeatsConsistent(booked)
+        self.assertEqual(self.slot.seats_booked, self.slot.capacity)
+        self.assertEqual(len(refusals), self.BOOKERS - self.slot.capacity)
+
+    def test_cancel_returns_seats_once(self):
+        booking = book_slot(self.users[0], self.slot.pk, 3, '+70000000000')
+
+        self.assertTrue(cancel_booking(booking))
+        self.assertFalse(cancel_booking(booking))
+
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.seats_booked, 0)
+
+
+def create_order(user, products, status='pending', **fields):
+    order = Order.objects.create(user=user, phone='+70000000000', email='buyer@example.com',
+                                 address='ул. Полевая, 1', city='Тула', postal_code='300000',
+                                 status=status, total_amount=Decimal('1000.00'), **fields)
+    for product in products:
+        OrderItem.objects.create(order=order, product=product, quantity=2, price=product.price)
+    return order
+
+
+class OrderExportTests(TestCase):
+    """Выгрузка заказов за период вместе с перенесенными в архив"""
+
+    def setUp(self):
+        user = User.objects.create(username='buyer')
+        product = HoneyProduct.objects.create(title='Липовый мед', price=Decimal('500.00'))
+        self.orders = [create_order(user, [product], status) for status in ('delivered', 'pending')]
+        Order.objects.filter(pk=self.orders[0].pk).update(updated_at=timezone.now() - timedelta(days=365))
+        archive_orders(pause=0)
+
+    def _export(self, **filters):
+        return [json.loads(line) for chunk in iter_orders_jsonl(export_querysets(**filters))
+                for line in chunk.splitlines()]
+
+    def test_archived_orders_are_exported_with_items(self):
+        self.assertTrue(ArchivedOrder.objects.filter(pk=self.orders[0].pk).exists())
+
+        records = self._export(date_from=timezone.localdate() - timedelta(days=1))
+
+        self.assertEqual([record['order_number'] for record in records],
+                         [order.order_number for order in self.orders])
+        self.assertEqual([len(record['items']) for record in records], [1, 1])
+
+    def test_no_archived_exports_active_orders_only(self):
+        records = self._export(archived=False)
+
+        self.assertEqual([record['order_number'] for record in records], [self.orders[1].order_number])
+
+
+class RecommendationCountsTests(TestCase):
+    """Инкрементальный пересчет совместных покупок совпадает с полным"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='buyer')
+        self.honey, self.candle = [HoneyProduct.objects.create(title=title, price=Decimal('500.00'))
+                                   for title in ('Липовый мед', 'Гречишный мед')]
+
+    def pair_counts(self):
+        return {(a, b): orders for a, b, orders in ProductPairCount.objects.values_list('product_id', 'other_id', 'orders')}
+
+    def test_order_committed_below_counted_id_is_not_skipped(self):
+        create_order(self.user, [self.honey, self.candle], pk=20)
+        update_recommendations()
+        # Транзакция этого заказа зафиксировалась позже, чем заказа с большим id
+        create_order(self.user, [self.honey, self.candle], pk=10)
+
+        update_recommendations()
+
+        self.assertEqual(self.pair_counts()[self.honey.pk, self.candle.pk], 2)
+
+    def test_order_cancelled_after_counting_is_subtracted(self):
+        orders = [create_order(self.user, [self.honey, self.candle]) for _ in range(3)]
+        update_recommendations()
+
+        transition(orders[0], 'cancelled')
+        stats = update_recommendations()
+
+        self.assertEqual(stats['cancelled'], 1)
+        incremental = self.pair_counts()
+        self.assertEqual(incremental[self.honey.pk, self.candle.pk], 2)
+        update_recommendations(full=True)
+        self.assertEqual(self.pair_counts(), incremental)
+
+
+class CatalogApiETagTests(TestCase):
+    """ETag каталога в JSON со сжатием и без"""
+
+    def setUp(self):
+        for n in range(20):
+            HoneyProduct.objects.create(title=f'Мед №{n}', price=Decimal('500.00'))
+        self.client = Client(HTTP_HOST='localhost')
+
+    def test_compressed_response_has_weak_etag_and_revalidates(self):
+        response = self.client.get('/api/v1/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        again = self.client.get('/api/v1/products/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+
+    def test_identity_response_keeps_strong_etag(self):
+        etag = self.client.get('/api/v1/products/')['ETag']
+        self.assertTrue(etag.startswith('"'))
+
+        again = self.client.get('/api/v1/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
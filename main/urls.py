@@ -5,6 +5,8 @@ urlpatterns = [
     path('', views.index, name='home'),
     path('about/', views.about, name='about'),
     path('excursions/', views.excursions, name='excursions'),
+    path('excursions/book/<int:slot_id>/', views.book_excursion, name='book_excursion'),
+    path('excursions/bookings/<int:booking_id>/cancel/', views.cancel_excursion_booking, name='cancel_excursion_booking'),
     path('delivery/', views.delivery, name='delivery'),
     path('products/', views.products, name='products'),
     path('candles/', views.candles, name='candles'),
@@ -18,6 +20,16 @@ urlpatterns = [
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/remove/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('cart/qty/<str:op>/<int:product_id>/', views.change_qty, name='change_qty'),
+    path('delivery/quote/', views.delivery_quote_view, name='delivery_quote'),
     # order ops
     path('order/create/', views.create_order, name='create_order'),
+    # api
+    path('api/orders/bulk/', views.api_bulk_orders, name='api_bulk_orders'),
+    path('api/fulfillment/claim/', views.api_fulfillment_claim, name='api_fulfillment_claim'),
+    path('api/fulfillment/release/', views.api_fulfillment_release, name='api_fulfillment_release'),
+    path('api/fulfillment/orders/<str:order_number>/status/', views.api_fulfillment_status, name='api_fulfillment_status'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('api/v1/products/', views.api_v1_products, name='api_v1_products'),
+    path('api/v1/candles/', views.api_v1_candles, name='api_v1_candles'),
+    path('images/<int:width>/<path:name>', views.image_derivative, name='image_derivative'),
 ]
\ No newline at end of file
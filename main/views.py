@@ -1,13 +1,50 @@
+import base64
+import binascii
+import hmac
+import json
+import os
+from decimal import Decimal, InvalidOperation
+
 from django.shortcuts import render, redirect
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, prefetch_related_objects
 from django.contrib.auth.models import User
-from django.http import HttpRequest, HttpResponse
-from .models import HoneyProduct, WaxCandle, UserProfile, Cart, CartItem, Order, OrderItem
-from .forms import UserRegistrationForm, UserLoginForm, UserProfileForm, OrderForm
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_safe
+from PIL import Image
+from .archive import user_orders
+from .catalog_api import (
+    CATALOG_API_CACHE_CONTROL, ApiError, catalog_page, encode, page_etag, parse_params,
+)
+from .conditional import catalog_version, conditional_page
+from .delivery import order_weight_grams, quote as delivery_quote
+from .excursions import EXCURSION_MAX_SEATS_PER_BOOKING, BookingError, book_slot, cancel_booking, upcoming_slots
+from .facets import facet_context, filter_queryset, parse_selection
+from .fulfillment import (
+    FULFILLMENT_CLAIM_LIMIT, FULFILLMENT_CLAIM_LIMIT_MAX, InvalidTransition, claim_orders, release_orders, transition,
+)
+from .images import IMAGE_DERIVATIVE_WIDTHS, ensure_derivative, source_name
+from . import metrics
+from .ingest import BatchValidationError, ingest_orders
+from .productcache import attach_products, products as product_cache
+from .recommendations import attach_recommendations, recommendations_for_cart
+from .staticserve import MEDIA_CACHE_CONTROL, serve_file
+from .tasks import migrate_session_cart, send_order_confirmation
+from .models import (
+    HoneyProduct, WaxCandle, UserProfile, Cart, CartItem, Order, OrderItem, ProductRecommendation, ExcursionBooking,
+)
+from .forms import UserRegistrationForm, UserLoginForm, UserProfileForm, OrderForm, ExcursionBookingForm
 
 # Для админки - карточки товаров
 @staff_member_required
@@ -18,27 +55,106 @@ def product_cards(request):
     })
 
 # Для основного сайта
+@conditional_page('main/index.html')
 def index(request):
     return render(request, 'main/index.html')
 
+@conditional_page('main/about.html')
 def about(request):
     return render(request, 'main/about.html')
 
 def excursions(request):
-    return render(request, 'main/excursions.html')
+    """Описание экскурсий, расписание со свободными местами и записи пользователя"""
+    context = {'slots': upcoming_slots(), 'max_seats': EXCURSION_MAX_SEATS_PER_BOOKING}
+    if request.user.is_authenticated:
+        context['bookings'] = (ExcursionBooking.objects
+                               .filter(user=request.user, status=ExcursionBooking.STATUS_CONFIRMED,
+                                       slot__starts_at__gt=timezone.now())
+                               .select_related('slot').order_by('slot__starts_at'))
+        context['form'] = ExcursionBookingForm(initial={'phone': _get_profile(request.user).phone or ''})
+    return render(request, 'main/excursions.html', context)
+
+@login_required
+@require_POST
+def book_excursion(request, slot_id):
+    """Записаться на экскурсию: места занимаются атомарно, без перебронирования"""
+    form = ExcursionBookingForm(request.POST)
+    if not form.is_valid():
+        for errors in form.errors.values():
+            messages.error(request, errors[0])
+        return redirect('excursions')
+    try:
+        booking = book_slot(request.user, slot_id, form.cleaned_data['seats'], form.cleaned_data['phone'],
+                            form.cleaned_data['comment'])
+    except BookingError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, f'Вы записаны: {booking.slot}, мест: {booking.seats}. Ждем вас!')
+    return redirect('excursions')
 
+@login_required
+@require_POST
+def cancel_excursion_booking(request, booking_id):
+    """Отменить свою запись на экскурсию"""
+    booking = ExcursionBooking.objects.filter(pk=booking_id, user=request.user).select_related('slot').first()
+    if booking is None:
+        raise Http404
+    try:
+        if cancel_booking(booking):
+            messages.success(request, 'Запись отменена')
+        else:
+            messages.info(request, 'Запись уже отменена')
+    except BookingError as e:
+        messages.error(request, str(e))
+    return redirect('excursions')
+
+@conditional_page('main/delivery.html')
 def delivery(request):
     return render(request, 'main/delivery.html')
 
+# Сортировки витрины: значение ?sort= -> (подпись, порядок). Порядки по весу и цене за кг
+# обслуживают индексы (is_active, weight_grams) и (is_active, price_per_kg)
+CATALOG_SORTS = {
+    '': ('Сначала новые', ['-created_at']),
+    'weight': ('Сначала легкие', ['weight_grams', 'id']),
+    '-weight': ('Сначала тяжелые', ['-weight_grams', '-id']),
+    'price_per_kg': ('Дешевле за кг', ['price_per_kg', 'id']),
+    '-price_per_kg': ('Дороже за кг', ['-price_per_kg', '-id']),
+}
+
+def _catalog(request, model):
+    """
+    Активные товары с сортировкой и фильтром по фасетам; счетчики фасетов — из индекса в памяти.
+
+    «Найдено» страницы считают по самой выдаче (len списка), а не по индексу:
+    индекс перестраивается по версии каталога и может на мгновение отстать от
+    базы, а число должно совпадать с показанными карточками.
+    """
+    sort = request.GET.get('sort', '')
+    if sort not in CATALOG_SORTS:
+        sort = ''
+    selection = parse_selection(model, request.GET)
+    items = filter_queryset(model.objects.filter(is_active=True), model, selection).order_by(*CATALOG_SORTS[sort][1])
+    return items, {
+        'sort': sort,
+        'sort_options': [(value, label) for value, (label, _) in CATALOG_SORTS.items()],
+        'facets': facet_context(model, selection),
+        'filtered': bool(selection),
+    }
+
+@conditional_page('main/products.html', HoneyProduct, ProductRecommendation)
 def products(request):
     # Здесь можно тоже выводить товары, но для обычных пользователей
-    products = HoneyProduct.objects.filter(is_active=True)
-    return render(request, 'main/products.html', {'products': products})
+    products, context = _catalog(request, HoneyProduct)
+    products = attach_recommendations(products)
+    return render(request, 'main/products.html', {'products': products, 'found': len(products), **context})
 
+@conditional_page('main/candles.html', WaxCandle)
 def candles(request):
     # Страница восковых свечей
-    candles = WaxCandle.objects.filter(is_active=True)
-    return render(request, 'main/candles.html', {'candles': candles})
+    candles, context = _catalog(request, WaxCandle)
+    candles = list(candles)
+    return render(request, 'main/candles.html', {'candles': candles, 'found': len(candles), **context})
 
 # --------------------------- CART (user based) ---------------------------
 def _get_cart(session):
@@ -47,61 +163,45 @@ def _get_cart(session):
     return cart
 
 def _get_or_create_cart(user):
-    """Получить или создать корзину для пользователя"""
-    cart, created = Cart.objects.get_or_create(user=user)
-    return cart
+    """Корзина пользователя: обычно уже загружена вместе с ним (ProfileModelBackend)"""
+    try:
+        return user.cart
+    except Cart.DoesNotExist:
+        # Корзину могла удалить очистка брошенных корзин
+        cart, created = Cart.objects.get_or_create(user=user)
+        return cart
+
+def _get_profile(user):
+    """Профиль пользователя: создан сигналом при регистрации и загружен вместе с пользователем"""
+    try:
+        return user.userprofile
+    except UserProfile.DoesNotExist:
+        profile, created = UserProfile.objects.get_or_create(user=user)
+        return profile
 
 def _migrate_session_cart_to_user_cart(user, session):
-    """Перенести корзину из сессии в корзину пользователя"""
+    """Перенести корзину из сессии в корзину пользователя (в фоновой задаче)"""
     session_cart = session.get('cart', {})
     if not session_cart:
         return
     
-    cart = _get_or_create_cart(user)
+    migrate_session_cart.delay(user.id, dict(session_cart))
     
-    for product_id_str, qty in session_cart.items():
-        try:
-            product_id = int(product_id_str)
-            product = HoneyProduct.objects.get(id=product_id, is_active=True)
-            
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart,
-                product=product,
-                defaults={'quantity': int(qty)}
-            )
-            
-            if not created:
-                cart_item.quantity = int(qty)
-                cart_item.save()
-                
-        except (ValueError, HoneyProduct.DoesNotExist):
-            continue
-    
-    # Очищаем корзину из сессии после переноса
-    if 'cart' in session:
-        del session['cart']
-        session.modified = True
+    # Очищаем корзину из сессии сразу: перенос уже в очереди
+    del session['cart']
+    session.modified = True
 
 @login_required
 def add_to_cart(request: HttpRequest, product_id: int):
     """Добавить товар в корзину пользователя"""
-    try:
-        product = HoneyProduct.objects.get(id=product_id, is_active=True)
+    product = product_cache.get_active(product_id)
+    if product is None:
+        messages.error(request, 'Товар не найден')
+    else:
         cart = _get_or_create_cart(request.user)
-        
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': 1}
-        )
-        
-        if not created:
-            cart_item.quantity += 1
-            cart_item.save()
-        
+        cart.add_product(product.id)
+        metrics.CART_ADDS.inc()
         messages.success(request, 'Товар добавлен в корзину')
-    except HoneyProduct.DoesNotExist:
-        messages.error(request, 'Товар не найден')
     
     return redirect(request.META.get('HTTP_REFERER', 'cart'))
 
@@ -110,7 +210,7 @@ def remove_from_cart(request: HttpRequest, product_id: int):
     """Удалить товар из корзины пользователя"""
     try:
         cart = _get_or_create_cart(request.user)
-        CartItem.objects.filter(cart=cart, product_id=product_id).delete()
+        cart.remove_product(product_id)
         messages.success(request, 'Товар удален из корзины')
     except Exception as e:
         messages.error(request, 'Ошибка при удалении товара')
@@ -122,16 +222,10 @@ def change_qty(request: HttpRequest, product_id: int, op: str):
     """Изменить количество товара в корзине"""
     try:
         cart = _get_or_create_cart(request.user)
-        cart_item = CartItem.objects.get(cart=cart, product_id=product_id)
+        delta = {'inc': 1, 'dec': -1}.get(op, 0)
         
-        if op == 'inc':
-            cart_item.quantity += 1
-        elif op == 'dec':
-            cart_item.quantity = max(1, cart_item.quantity - 1)
-        
-        cart_item.save()
-    except CartItem.DoesNotExist:
-        messages.error(request, 'Товар не найден в корзине')
+        if not cart.change_quantity(product_id, delta):
+            messages.error(request, 'Товар не найден в корзине')
     except Exception as e:
         messages.error(request, 'Ошибка при изменении количества')
     
@@ -209,8 +303,7 @@ def logout_view(request):
 @login_required
 def profile(request):
     """Личный кабинет пользователя"""
-    # Получаем или создаем профиль пользователя
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    profile = _get_profile(request.user)
     
     if request.method == 'POST':
         form = UserProfileForm(request.POST, instance=profile)
@@ -221,8 +314,14 @@ def profile(request):
     else:
         form = UserProfileForm(instance=profile)
     
-    return render(request, 'main/profile.html', {'form': form, 'profile': profile})
+    # История заказов вместе с перенесенными в архив
+    return render(request, 'main/profile.html', {
+        'form': form,
+        'profile': profile,
+        'orders': user_orders(request.user),
+    })
 
+@conditional_page('main/contacts.html')
 def contacts(request):
     return render(request, 'main/contacts.html')
 
@@ -231,21 +330,20 @@ def contacts(request):
 def cart(request):
     """Показать корзину пользователя"""
     cart = _get_or_create_cart(request.user)
-    cart_items = CartItem.objects.filter(cart=cart).select_related('product')
-    
-    items = []
-    total = 0
+    cart_items = attach_products(CartItem.objects.filter(cart=cart))
     
-    for cart_item in cart_items:
-        line_total = cart_item.line_total
-        total += line_total
-        items.append({
-            'product': cart_item.product,
-            'qty': cart_item.quantity,
-            'line_total': line_total,
-        })
+    items = [{
+        'product': cart_item.product,
+        'qty': cart_item.quantity,
+        'line_total': cart_item.line_total,
+    } for cart_item in cart_items]
     
-    return render(request, 'main/cart.html', {'items': items, 'total': total})
+    # Итог хранится в корзине, суммировать позиции не нужно
+    return render(request, 'main/cart.html', {
+        'items': items,
+        'total': cart.subtotal,
+        'recommendations': recommendations_for_cart(cart_item.product_id for cart_item in cart_items),
+    })
 
 @login_required
 def create_order(request):
@@ -255,38 +353,57 @@ def create_order(request):
         if form.is_valid():
             # Получаем корзину пользователя
             cart = _get_or_create_cart(request.user)
-            cart_items = CartItem.objects.filter(cart=cart).select_related('product')
+            cart_items = attach_products(CartItem.objects.filter(cart=cart))
             
-            if not cart_items.exists():
+            if not cart_items:
                 messages.error(request, 'Корзина пуста')
                 return redirect('cart')
             
-            # Создаем заказ
-            order = form.save(commit=False)
-            order.user = request.user
-            
-            # Вычисляем общую сумму
-            total_amount = sum(item.line_total for item in cart_items)
-            order.total_amount = total_amount
-            order.save()
+            # Итог хранится в корзине; если цены в кеше с ним расходятся,
+            # цена только что изменилась — показываем пользователю новую сумму
+            if sum(item.line_total for item in cart_items) != cart.subtotal:
+                cart.recalculate()
+                for cart_item in cart_items:
+                    product_cache.invalidate(cart_item.product_id)
+                messages.warning(request, 'Цены в корзине изменились, проверьте сумму заказа')
+                return redirect('cart')
             
-            # Создаем элементы заказа
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.price
-                )
+            with transaction.atomic():
+                # Создаем заказ
+                order = form.save(commit=False)
+                order.user = request.user
+                # Тариф берется из индекса в памяти; без зоны доставку посчитает менеджер
+                shipping = delivery_quote(order.postal_code, cart.subtotal, order_weight_grams(cart_items))
+                if shipping is not None:
+                    order.delivery_cost = shipping.cost
+                    order.delivery_zone = shipping.zone
+                    order.delivery_eta = shipping.eta
+                order.total_amount = cart.subtotal + order.delivery_cost
+                order.save()
+                
+                # Создаем элементы заказа
+                for cart_item in cart_items:
+                    OrderItem.objects.create(
+                        order=order,
+                        product=cart_item.product,
+                        quantity=cart_item.quantity,
+                        price=cart_item.product.price
+                    )
+                
+                # Очищаем корзину
+                cart.remove_items([cart_item.pk for cart_item in cart_items])
             
-            # Очищаем корзину
-            cart_items.delete()
+            # Письмо отправит воркер, ответ пользователю не ждет SMTP
+            transaction.on_commit(lambda: send_order_confirmation.delay(order.id))
+            transaction.on_commit(lambda: metrics.ORDERS_CREATED.inc(('checkout',)))
             
             messages.success(request, f'Заказ #{order.order_number} успешно оформлен! Мы свяжемся с вами в ближайшее время.')
+            if shipping is None:
+                messages.info(request, 'Стоимость доставки по вашему индексу сообщит менеджер')
             return redirect('cart')
     else:
         # Предзаполняем форму данными из профиля пользователя
-        profile, created = UserProfile.objects.get_or_create(user=request.user)
+        profile = _get_profile(request.user)
         initial_data = {
             'phone': profile.phone or '',
             'email': request.user.email or '',
@@ -298,3 +415,227 @@ def create_order(request):
     
     return render(request, 'main/order_form.html', {'form': form})
 
+
+# Верхняя граница subtotal для расчета без входа: как у Cart.subtotal (12 знаков, 2 после запятой)
+QUOTE_MAX_SUBTOTAL = Decimal(10) ** 10
+
+@require_safe
+def delivery_quote_view(request):
+    """
+    Стоимость и срок доставки по индексу: для вошедшего — по его корзине,
+    иначе по параметрам subtotal и weight (граммы)
+    """
+    postal_code = request.GET.get('postal_code', '')
+    if request.user.is_authenticated:
+        cart = _get_or_create_cart(request.user)
+        subtotal = cart.subtotal
+        grams = order_weight_grams(attach_products(CartItem.objects.filter(cart=cart)))
+    else:
+        try:
+            subtotal = Decimal(request.GET.get('subtotal', '0'))
+            grams = int(request.GET.get('weight', '0'))
+        except (InvalidOperation, ValueError):
+            return JsonResponse({'error': 'subtotal и weight должны быть числами'}, status=400)
+        # NaN, Infinity и 1e999999999 — тоже Decimal, но сравнение и сложение с ними падают
+        if not (subtotal.is_finite() and 0 <= subtotal < QUOTE_MAX_SUBTOTAL) or grams < 0:
+            return JsonResponse({'error': 'subtotal и weight должны быть неотрицательными числами'}, status=400)
+    shipping = delivery_quote(postal_code, subtotal, grams)
+    if shipping is None:
+        return JsonResponse({'available': False, 'total': str(subtotal)})
+    return JsonResponse({
+        'available': True,
+        'zone': shipping.zone,
+        'cost': str(shipping.cost),
+        'eta': shipping.eta,
+        'eta_min_days': shipping.eta_min_days,
+        'eta_max_days': shipping.eta_max_days,
+        'free_from': str(shipping.free_from) if shipping.free_from is not None else None,
+        'total': str(subtotal + shipping.cost),
+    })
+
+
+# --------------------------- API ---------------------------
+def _basic_auth_user(request):
+    """Пользователь из заголовка Authorization: Basic (без сессии и cookie)"""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, credentials = header.partition(' ')
+    if scheme.lower() != 'basic' or not credentials:
+        return None
+    try:
+        username, _, password = base64.b64decode(credentials).decode('utf-8').partition(':')
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    return authenticate(request, username=username, password=password)
+
+def _api_user(request, perm):
+    """(пользователь, None) или (None, ответ с ошибкой) для API с HTTP Basic"""
+    user = _basic_auth_user(request)
+    if user is None:
+        response = JsonResponse({'error': 'Требуется авторизация'}, status=401)
+        response['WWW-Authenticate'] = 'Basic realm="orders"'
+        return None, response
+    if not user.has_perm(perm):
+        return None, JsonResponse({'error': 'Недостаточно прав'}, status=403)
+    return user, None
+
+def _json_body(request):
+    """Разобранное тело запроса или None; пустое тело — пустой объект"""
+    if not request.body:
+        return {}
+    try:
+        return json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+@csrf_exempt
+@require_POST
+def api_bulk_orders(request):
+    """Пакетная загрузка оптовых и маркетплейс-заказов"""
+    user, error = _api_user(request, 'main.add_order')
+    if error:
+        return error
+
+    payload = _json_body(request)
+    if payload is None:
+        return JsonResponse({'error': 'Некорректный JSON'}, status=400)
+    batch = payload.get('orders') if isinstance(payload, dict) else payload
+
+    try:
+        orders = ingest_orders(batch, user)
+    except BatchValidationError as e:
+        return JsonResponse({'error': str(e), 'errors': e.errors}, status=400)
+
+    metrics.ORDERS_CREATED.inc(('api',), len(orders))
+    return JsonResponse({
+        'created': len(orders),
+        'order_numbers': [order.order_number for order in orders],
+    }, status=201)
+
+
+def _packing_json(order):
+    return {
+        'order_number': order.order_number,
+        'status': order.status,
+        'packer': order.packer,
+        'created_at': order.created_at.isoformat(),
+        'city': order.city,
+        'address': order.address,
+        'postal_code': order.postal_code,
+        'comment': order.comment,
+        'items': [
+            {'product_id': item.product_id, 'title': item.product.title, 'quantity': item.quantity}
+            for item in order.items.all()
+        ],
+    }
+
+@csrf_exempt
+@require_POST
+def api_fulfillment_claim(request):
+    """Упаковщик берет следующие заказы из очереди сборки: {"limit": 5}"""
+    user, error = _api_user(request, 'main.change_order')
+    if error:
+        return error
+    payload = _json_body(request)
+    try:
+        limit = int(payload.get('limit', FULFILLMENT_CLAIM_LIMIT))
+    except (AttributeError, TypeError, ValueError):
+        return JsonResponse({'error': 'limit должен быть целым числом'}, status=400)
+    if not 1 <= limit <= FULFILLMENT_CLAIM_LIMIT_MAX:
+        return JsonResponse({'error': f'limit — от 1 до {FULFILLMENT_CLAIM_LIMIT_MAX}'}, status=400)
+
+    claimed = claim_orders(user.username, limit)
+    prefetch_related_objects(claimed, 'items__product')
+    return JsonResponse({'orders': [_packing_json(order) for order in claimed]})
+
+@csrf_exempt
+@require_POST
+def api_fulfillment_status(request, order_number):
+    """Сменить статус заказа: {"status": "shipped", "comment": "..."}"""
+    user, error = _api_user(request, 'main.change_order')
+    if error:
+        return error
+    payload = _json_body(request)
+    if not isinstance(payload, dict) or 'status' not in payload:
+        return JsonResponse({'error': 'Укажите status'}, status=400)
+    try:
+        order = Order.objects.get(order_number=order_number)
+    except Order.DoesNotExist:
+        return JsonResponse({'error': 'Заказ не найден'}, status=404)
+    if order.status == 'processing' and order.packer and order.packer != user.username:
+        return JsonResponse({'error': f'Заказ собирает {order.packer}'}, status=409)
+
+    try:
+        transition(order, payload['status'], user=user, comment=str(payload.get('comment', ''))[:255])
+    except InvalidTransition as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    return JsonResponse({'order_number': order.order_number, 'status': order.status})
+
+@csrf_exempt
+@require_POST
+def api_fulfillment_release(request):
+    """Вернуть в очередь все незавершенные заказы упаковщика"""
+    user, error = _api_user(request, 'main.change_order')
+    if error:
+        return error
+    return JsonResponse({'released': release_orders(user.username, user=user)})
+
+
+# --------------------------- CATALOG API (v1) ---------------------------
+def _catalog_api(request, model):
+    """Страница каталога в JSON: ?cursor=, ?limit=, ?fields=; 304 по If-None-Match без выборки товаров"""
+    try:
+        fields, after, limit = parse_params(request.GET)
+    except ApiError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    etag = f'"{page_etag(model, fields, after, limit)}"'
+    last_modified = catalog_version(model)[0]
+    last_modified = last_modified.timestamp() if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(encode(catalog_page(model, fields, after, limit)), content_type='application/json')
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = CATALOG_API_CACHE_CONTROL
+    return response
+
+@require_safe
+def api_v1_products(request):
+    return _catalog_api(request, HoneyProduct)
+
+@require_safe
+def api_v1_candles(request):
+    return _catalog_api(request, WaxCandle)
+
+@require_safe
+def image_derivative(request, width, name):
+    """Уменьшенная копия изображения из media; создается при первом запросе"""
+    name = source_name(name)
+    if width not in IMAGE_DERIVATIVE_WIDTHS or name is None:
+        raise Http404
+    try:
+        source = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(source):
+        raise Http404
+    try:
+        path = ensure_derivative(source, name, width)
+    except (OSError, Image.UnidentifiedImageError, Image.DecompressionBombError):
+        raise Http404
+    return serve_file(request, path, MEDIA_CACHE_CONTROL)
+
+@require_safe
+def metrics_view(request):
+    """Метрики в формате Prometheus: с токеном или с явно разрешенных адресов"""
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    allowed = request.META.get('REMOTE_ADDR') in metrics.METRICS_ALLOWED_IPS or bool(
+        metrics.METRICS_TOKEN
+        and hmac.compare_digest(authorization.encode(), f'Bearer {metrics.METRICS_TOKEN}'.encode())
+    )
+    if not allowed:
+        return HttpResponse('Доступ запрещен', status=403, content_type='text/plain; charset=utf-8')
+    response = HttpResponse(metrics.exposition(), content_type=metrics.CONTENT_TYPE)
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,125 @@
+import logging
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.urls import NoReverseMatch, get_resolver, reverse
+
+logger = logging.getLogger(__name__)
+
+
+def warm_templates():
+    """Скомпилировать все шаблоны из каталогов DIRS: дальше их отдает кеширующий загрузчик"""
+    count = 0
+    for engine in engines.all():
+        for directory in engine.dirs:
+            directory = Path(directory)
+            for path in sorted(directory.rglob('*.html')):
+                engine.get_template(path.relative_to(directory).as_posix())
+                count += 1
+    return f'шаблонов: {count}'
+
+
+def warm_urls():
+    """Построить таблицы резолвера и развернуть все именованные URL без аргументов"""
+    resolver = get_resolver()
+    names = [name for name in resolver.reverse_dict if isinstance(name, str)]
+    reversed_count = 0
+    for name in names:
+        try:
+            reverse(name)
+            reversed_count += 1
+        except NoReverseMatch:
+            # URL с параметрами: таблица для них уже построена, этого достаточно
+            pass
+    return f'имен: {len(names)}, без аргументов: {reversed_count}'
+
+
+def warm_orm():
+    """Заполнить кеши _meta и скомпилировать простой запрос для каждой модели"""
+    models = apps.get_models()
+    for model in models:
+        model._meta.get_fields()
+        model._meta.fields_map
+        str(model._default_manager.all()[:1].query)
+    return f'моделей: {len(models)}'
+
+
+def warm_database():
+    """Открыть соединения со всеми базами (настройка соединения выполняется при открытии)"""
+    for connection in connections.all():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    return f"баз: {', '.join(connections)}"
+
+
+def warm_catalog():
+    """Версии каталога для ETag, индексы фасетов и активные товары в кеше корзины"""
+    from .conditional import catalog_version
+    from .facets import facet_index
+    from .models import HoneyProduct, WaxCandle
+    from .productcache import PRODUCT_LOCAL_CACHE_SIZE, products
+
+    for model in (HoneyProduct, WaxCandle):
+        catalog_version(model)
+        facet_index(model)
+    ids = list(
+        HoneyProduct.objects.filter(is_active=True)
+        .order_by('-is_featured', '-updated_at')
+        .values_list('pk', flat=True)[:PRODUCT_LOCAL_CACHE_SIZE]
+    )
+    products.get_many(ids)
+    return f'товаров в кеше: {len(ids)}'
+
+
+def warm_static():
+    """Загрузить манифест хешированных имен статики (иначе его читает первый рендер страницы)"""
+    from django.contrib.staticfiles.storage import staticfiles_storage
+
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', None)
+    return f'файлов в манифесте: {len(hashed_files)}' if hashed_files is not None else 'без манифеста'
+
+
+WARMUP_STAGES = [
+    ('templates', warm_templates),
+    ('urls', warm_urls),
+    ('orm', warm_orm),
+    ('database', warm_database),
+    ('catalog', warm_catalog),
+    ('static', warm_static),
+]
+
+
+def warm_up(pre_fork=False):
+    """
+    Прогреть процесс перед первым запросом.
+
+    Вызывать из post_worker_init сервера (gunicorn) или, при загрузке приложения
+    до fork (--preload), с pre_fork=True: тогда соединения с базой закрываются,
+    чтобы дочерние процессы не унаследовали общий сокет. Возвращает
+    [(этап, секунды, подробности)]; ошибка этапа не мешает запуску.
+    """
+    report = []
+    for name, stage in WARMUP_STAGES:
+        start = time.perf_counter()
+        try:
+            detail = stage()
+        except Exception as e:
+            logger.exception('Прогрев: этап %s завершился ошибкой', name)
+            detail = f'ошибка: {e}'
+        report.append((name, time.perf_counter() - start, detail))
+    if pre_fork:
+        connections.close_all()
+
+    logger.info('Прогрев за %.0f мс: %s', sum(row[1] for row in report) * 1000,
+                ', '.join(f'{name} {seconds * 1000:.0f} мс' for name, seconds, _ in report))
+    return report
+
+
+def warm_up_if_enabled(pre_fork=False):
+    if getattr(settings, 'WARMUP_ON_STARTUP', False):
+        return warm_up(pre_fork=pre_fork)
+    return None
@@ -0,0 +1,36 @@
+import re
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+# Единица -> граммов в единице. «P» — старое значение по умолчанию («1000P»), это граммы
+WEIGHT_UNITS = {
+    '': 1,
+    'г': 1, 'гр': 1, 'грамм': 1, 'граммов': 1, 'g': 1, 'gr': 1, 'p': 1, 'р': 1,
+    'кг': 1000, 'килограмм': 1000, 'kg': 1000,
+}
+
+WEIGHT_RE = re.compile(r'^\s*(\d+(?:[.,]\d+)?)\s*([a-zа-яё]*)\.?\s*$', re.IGNORECASE)
+
+
+def parse_weight_grams(text):
+    """Вес в граммах из строки вида «500г», «1 кг», «0,5кг», «1000P»; None, если разобрать нельзя"""
+    match = WEIGHT_RE.match(text or '')
+    if not match:
+        return None
+    number, unit = match.groups()
+    multiplier = WEIGHT_UNITS.get(unit.lower())
+    if multiplier is None:
+        return None
+    try:
+        grams = Decimal(number.replace(',', '.')) * multiplier
+    except InvalidOperation:
+        return None
+    grams = int(grams.to_integral_value(ROUND_HALF_UP))
+    return grams or None
+
+
+def price_per_kg(price, grams):
+    """Цена за килограмм с точностью до копейки; None без веса"""
+    if price is None or not grams:
+        return None
+    return (Decimal(price) * 1000 / grams).quantize(Decimal('0.01'), ROUND_HALF_UP)
+